@@ -28,6 +28,11 @@ app.conf.beat_schedule = {
         'task': 'payments.tasks.cleanup_old_logs',
         'schedule': crontab(day_of_week=0, hour=2, minute=0),  # Domingos a las 2 AM
     },
+    # Eliminar archivos de exportaciones expiradas
+    'purge-expired-exports': {
+        'task': 'payments.tasks.purge_expired_exports_async',
+        'schedule': crontab(minute=0),  # Cada hora
+    },
 }
 
 @app.task(bind=True)
@@ -1,20 +1,46 @@
 """
-Custom middleware to disable caching for API responses
+Custom middleware for API response cache headers and audit flushing
 """
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
 
 class NoCacheMiddleware(MiddlewareMixin):
     """
-    Middleware to add cache-control headers to all responses
-    preventing browser caching of API responses
+    Middleware to set the browser caching policy of API responses
+    
+    - Paths in NO_STORE_PATH_PREFIXES (auth tokens) are never stored.
+    - Responses with an ETag or Last-Modified may be stored but must be
+      revalidated on every use (private, no-cache), so the browser sends
+      If-None-Match and gets a 304 when nothing changed.
+    - Anything else keeps the headers set by the view.
     """
     
     def process_response(self, request, response):
-        # Add cache-control headers to prevent caching
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0, public'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-        response['ETag'] = ''
+        if response.has_header('Cache-Control'):
+            return response
+        
+        no_store_prefixes = getattr(settings, 'NO_STORE_PATH_PREFIXES', ['/api/auth/'])
+        if any(request.path.startswith(prefix) for prefix in no_store_prefixes):
+            response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0, private'
+            response['Pragma'] = 'no-cache'
+            response['Expires'] = '0'
+        elif response.has_header('ETag') or response.has_header('Last-Modified'):
+            response['Cache-Control'] = 'private, no-cache'
         
         return response
+
+
+class AuditFlushMiddleware:
+    """
+    Middleware to write the audit events buffered during a request
+    (payments.audit.log_audit) in a single batch once the response is ready
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        from payments.audit import audit_request_scope
+        with audit_request_scope():
+            return self.get_response(request)
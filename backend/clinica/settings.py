@@ -49,8 +49,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'clinica.middleware.NoCacheMiddleware',
+    'clinica.middleware.AuditFlushMiddleware',
 ]
 
+# Rutas cuyas respuestas nunca se guardan en el navegador (tokens de sesión)
+NO_STORE_PATH_PREFIXES = ['/api/auth/']
+
 ROOT_URLCONF = 'clinica.urls'
 
 TEMPLATES = [
@@ -155,13 +160,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Exportaciones en segundo plano (archivos bajo MEDIA_ROOT/exports/)
+EXPORT_JOB_TTL_HOURS = config('EXPORT_JOB_TTL_HOURS', default=24, cast=int)  # Vigencia del archivo
+EXPORT_JOB_STALE_MINUTES = config('EXPORT_JOB_STALE_MINUTES', default=30, cast=int)  # Tras esto no se reutiliza un job en curso
+PDF_CACHE_DIR = config('PDF_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'pdf'))  # PDFs de liquidaciones ya renderizados
+PDF_CACHE_MAX_BYTES = config('PDF_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+PDF_EXPORT_WORKERS = config('PDF_EXPORT_WORKERS', default=0, cast=int)  # Procesos para PDFs masivos (0 = según CPUs)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'payments.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -177,13 +189,70 @@ REST_FRAMEWORK = {
 
 # Cache Configuration - Deshabilitado en Render (plan gratuito)
 ENABLE_CACHE = config('ENABLE_CACHE', default=False, cast=bool)
+# 'redis' (docker-compose) o 'locmem' (memoria del proceso, para tests y desarrollo)
+CACHE_BACKEND = config('CACHE_BACKEND', default='redis')
+REDIS_HOST = config('REDIS_HOST', default='redis')
+REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
 
-# Caché deshabilitado (por defecto en desarrollo y Render)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+if ENABLE_CACHE and CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': config('REDIS_CACHE_URL', default=f'redis://{REDIS_HOST}:{REDIS_PORT}/1'),
+            'KEY_PREFIX': 'clinica',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                # Si Redis no responde se sigue atendiendo desde la base de datos
+                'IGNORE_EXCEPTIONS': True,
+                'SOCKET_CONNECT_TIMEOUT': 2,
+                'SOCKET_TIMEOUT': 2,
+            },
         }
     }
+elif ENABLE_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'clinica',
+        }
+    }
+else:
+    # Caché deshabilitado (por defecto en desarrollo y Render)
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            }
+        }
+
+# Segundos que se cachean las lecturas de catálogos (servicios, descuentos, aseguradoras)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Segundos que se cachea el resumen del dashboard por usuario
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=60, cast=int)
+
+# Auditoría: los eventos se acumulan en memoria y se escriben en lote
+AUDIT_BATCH_SIZE = config('AUDIT_BATCH_SIZE', default=100, cast=int)
+AUDIT_BUFFER_MAX_SIZE = config('AUDIT_BUFFER_MAX_SIZE', default=1000, cast=int)  # Máximo en memoria si la escritura falla
+AUDIT_ASYNC = config('AUDIT_ASYNC', default=True, cast=bool)  # Escribir con Celery cuando CELERY_ENABLED=True
+
+# Retención de auditoría (cleanup_old_logs)
+AUDIT_RETENTION_BATCH_SIZE = config('AUDIT_RETENTION_BATCH_SIZE', default=5000, cast=int)
+AUDIT_RETENTION_TIME_BUDGET = config('AUDIT_RETENTION_TIME_BUDGET', default=300, cast=int)  # Segundos por ejecución
+AUDIT_ARCHIVE_ENABLED = config('AUDIT_ARCHIVE_ENABLED', default=False, cast=bool)  # Archivar en .jsonl.gz antes de borrar
+AUDIT_ARCHIVE_DIR = config('AUDIT_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archive', 'audit'))
+
+# Almacenamiento por meses (payments.audit_storage): los meses fuera de la
+# ventana en caliente se archivan en .jsonl.gz en vez de eliminarse
+AUDIT_STORAGE_TIERING = config('AUDIT_STORAGE_TIERING', default=False, cast=bool)
+AUDIT_HOT_MONTHS = config('AUDIT_HOT_MONTHS', default=6, cast=int)
+# Particionado mensual en PostgreSQL: sin verificar contra un servidor real,
+# desactivado salvo que se habilite explícitamente
+AUDIT_PARTITIONING_ENABLED = config('AUDIT_PARTITIONING_ENABLED', default=False, cast=bool)
+AUDIT_PARTITION_MONTHS_AHEAD = config('AUDIT_PARTITION_MONTHS_AHEAD', default=3, cast=int)  # Solo PostgreSQL particionado
+
+# Importación masiva de atenciones (payments.attention_import)
+ATTENTION_IMPORT_BATCH_SIZE = config('ATTENTION_IMPORT_BATCH_SIZE', default=1000, cast=int)
+ATTENTION_IMPORT_MAX_ERRORS = config('ATTENTION_IMPORT_MAX_ERRORS', default=1000, cast=int)  # Errores detallados en la respuesta
 
 # CORS Configuration
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
@@ -331,6 +400,10 @@ if CELERY_ENABLED:
             'schedule': crontab(hour=2, minute=0, day_of_week=0),  # Domingo 2 AM
             'args': (30,)  # Limpiar logs > 30 días
         },
+        'purge-expired-exports': {
+            'task': 'payments.tasks.purge_expired_exports_async',
+            'schedule': crontab(minute=0),  # Cada hora
+        },
     }
 else:
     # Sin Celery (por defecto, no invasivo)
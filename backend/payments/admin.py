@@ -65,10 +65,10 @@ class ServiceAdmin(admin.ModelAdmin):
 
 @admin.register(Attention)
 class AttentionAdmin(admin.ModelAdmin):
-    list_display = ['professional', 'patient_name', 'service', 'date', 'amount_charged', 'status']
+    list_display = ['professional', 'patient_name', 'service', 'date', 'amount_charged', 'commission_amount', 'status']
     list_filter = ['status', 'date', 'professional', 'service']
     search_fields = ['patient_name', 'patient_id', 'professional__user__first_name']
-    readonly_fields = ['id', 'created_at', 'updated_at']
+    readonly_fields = ['id', 'effective_commission_percentage', 'commission_amount', 'created_at', 'updated_at']
     date_hierarchy = 'date'
 
 
@@ -0,0 +1,387 @@
+"""
+Importación masiva de atenciones desde CSV o XLSX
+
+El archivo se recorre fila por fila (csv.reader sobre el archivo binario u
+hojas read-only de openpyxl), sin cargarlo completo en memoria. Las filas se
+validan en lotes: los profesionales y servicios que aparecen por primera vez
+en un lote se buscan con una consulta por modelo y quedan en caché para el
+resto del archivo. Cada lote válido se inserta con bulk_create dentro de su
+propia transacción (savepoint si ya hay una abierta), junto con la comisión
+guardada y los totales diarios, que bulk_create no actualiza por sí solo.
+Si el lote falla en la base de datos se reintenta fila por fila para
+reportar exactamente cuáles no se pudieron insertar.
+
+Columnas (encabezado en la primera fila):
+    professional     id o número de licencia (obligatorio)
+    service          id o código del servicio (obligatorio)
+    patient_name     (obligatorio)
+    date             AAAA-MM-DD[ HH:MM[:SS]] o DD/MM/AAAA[ HH:MM] (obligatorio)
+    amount_charged   (obligatorio)
+    patient_id, health_insurance, insurance_discount_percentage,
+    commission_percentage, notes, status (pending, completed, cancelled)
+"""
+import codecs
+import csv
+import itertools
+import os
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from openpyxl import load_workbook
+
+from payments.models import Attention, Professional, Service
+from payments.money import CENT
+from payments.rollups import record_created_attentions
+
+IMPORT_BATCH_SIZE = getattr(settings, 'ATTENTION_IMPORT_BATCH_SIZE', 1000)
+IMPORT_MAX_ERRORS = getattr(settings, 'ATTENTION_IMPORT_MAX_ERRORS', 1000)
+
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+REQUIRED_COLUMNS = ('professional', 'service', 'patient_name', 'date', 'amount_charged')
+
+TEXT_LIMITS = {
+    'patient_name': Attention._meta.get_field('patient_name').max_length,
+    'patient_id': Attention._meta.get_field('patient_id').max_length,
+    'health_insurance': Attention._meta.get_field('health_insurance').max_length,
+}
+
+# Estados por clave o por nombre ('completed' o 'Completado')
+STATUSES = {
+    **{label.lower(): key for key, label in Attention.STATUS_CHOICES},
+    **{key: key for key, _ in Attention.STATUS_CHOICES},
+}
+
+DATE_FORMATS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+class ImportFileError(ValueError):
+    """El archivo no se puede importar (formato, codificación o encabezados)"""
+
+
+def import_format(filename):
+    """Formato de importación según la extensión del archivo"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in IMPORT_FORMATS:
+        raise ImportFileError(f"Formato no soportado: use {' o '.join(IMPORT_FORMATS)}")
+    return extension
+
+
+def cell_text(value):
+    """Texto de una celda (los números enteros de Excel llegan como float)"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def check_columns(header):
+    """Nombres de columna normalizados; valida que estén las obligatorias"""
+    columns = [cell_text(name).lower() for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ImportFileError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+    return columns
+
+
+def csv_rows(fileobj):
+    """
+    Filas de un CSV en UTF-8 (con o sin BOM), separado por comas o punto y
+    coma, leído línea por línea.
+
+    Yields:
+        (número de fila, dict columna -> valor)
+    """
+    lines = codecs.iterdecode(fileobj, 'utf-8-sig')
+    try:
+        first = next(lines, '')
+        delimiter = ';' if first.count(';') > first.count(',') else ','
+        reader = csv.reader(itertools.chain([first], lines), delimiter=delimiter)
+        columns = check_columns(next(reader, []))
+        for number, values in enumerate(reader, start=2):
+            yield number, dict(zip(columns, values))
+    except UnicodeDecodeError:
+        raise ImportFileError('El archivo CSV debe estar codificado en UTF-8')
+    except csv.Error as e:
+        raise ImportFileError(f'CSV inválido: {e}')
+
+
+def xlsx_rows(fileobj):
+    """
+    Filas de la primera hoja de un XLSX, leída en modo read-only.
+
+    Yields:
+        (número de fila, dict columna -> valor)
+    """
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError('El archivo no es un XLSX válido')
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        columns = check_columns(next(rows, ()))
+        for number, values in enumerate(rows, start=2):
+            yield number, dict(zip(columns, values))
+    finally:
+        wb.close()
+
+
+def read_rows(fileobj, file_format):
+    if file_format == 'xlsx':
+        return xlsx_rows(fileobj)
+    return csv_rows(fileobj)
+
+
+class ImportLookups:
+    """
+    Profesionales y servicios ya resueltos durante la importación, por id o
+    por número de licencia / código. Se consultan solo las claves nuevas de
+    cada lote.
+    """
+
+    def __init__(self):
+        self.professionals = {}
+        self.services = {}
+
+    def load(self, rows):
+        professional_keys = {cell_text(row.get('professional')) for row in rows} - set(self.professionals)
+        service_keys = {cell_text(row.get('service')) for row in rows} - set(self.services)
+        self._resolve(
+            self.professionals, professional_keys,
+            Professional.objects.only('id', 'license_number'), 'license_number'
+        )
+        self._resolve(
+            self.services, service_keys,
+            Service.objects.only('id', 'code', 'commission_percentage'), 'code'
+        )
+
+    @staticmethod
+    def _resolve(cache, keys, queryset, code_field):
+        keys.discard('')
+        if not keys:
+            return
+        ids = {}
+        for key in keys:
+            try:
+                ids[key] = uuid.UUID(key)
+            except ValueError:
+                pass
+        found = queryset.filter(Q(id__in=ids.values()) | Q(**{f'{code_field}__in': keys}))
+        by_id = {obj.id: obj for obj in found}
+        by_code = {getattr(obj, code_field): obj for obj in by_id.values()}
+        # Las claves sin resultado quedan en None para no volver a consultarlas
+        for key in keys:
+            cache[key] = by_id.get(ids.get(key)) or by_code.get(key)
+
+
+def parse_decimal(value, minimum=None, maximum=None):
+    """Decimal con hasta 2 decimales dentro de [minimum, maximum]"""
+    if isinstance(value, float):
+        value = repr(value)
+    try:
+        number = Decimal(cell_text(value).replace(',', '.'))
+        if not number.is_finite():
+            raise ValueError('Debe ser un número')
+        if number != number.quantize(CENT):
+            raise ValueError('Máximo 2 decimales')
+    except InvalidOperation:
+        raise ValueError('Debe ser un número')
+    if minimum is not None and number < minimum:
+        raise ValueError(f'Debe ser mayor o igual a {minimum}')
+    if maximum is not None and number > maximum:
+        raise ValueError(f'Debe ser menor o igual a {maximum}')
+    return number
+
+
+def parse_attention_date(value):
+    """Fecha/hora de la atención (consciente de zona horaria; sin hora = 00:00 local)"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time.min)
+    else:
+        text = cell_text(value)
+        try:
+            parsed = parse_datetime(text)
+            if parsed is None:
+                day = parse_date(text)
+                parsed = datetime.combine(day, time.min) if day else None
+        except ValueError:
+            parsed = None
+        for date_format in DATE_FORMATS:
+            if parsed is not None:
+                break
+            try:
+                parsed = datetime.strptime(text, date_format)
+            except ValueError:
+                pass
+        if parsed is None:
+            raise ValueError('Fecha inválida (use AAAA-MM-DD o DD/MM/AAAA)')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def build_attention(row, lookups):
+    """
+    Valida una fila y arma la atención con su comisión sellada.
+
+    Returns:
+        (Attention, None) o (None, dict campo -> [errores])
+    """
+    errors = {}
+    values = {}
+
+    for field in ('professional', 'service'):
+        key = cell_text(row.get(field))
+        cache = lookups.professionals if field == 'professional' else lookups.services
+        if not key:
+            errors[field] = ['Este campo es obligatorio']
+        elif cache.get(key) is None:
+            errors[field] = [f'No existe: {key}']
+        else:
+            values[field] = cache[key]
+
+    for field in ('patient_name', 'patient_id', 'health_insurance'):
+        text = cell_text(row.get(field))
+        if field == 'patient_name' and not text:
+            errors[field] = ['Este campo es obligatorio']
+        elif len(text) > TEXT_LIMITS[field]:
+            errors[field] = [f'Máximo {TEXT_LIMITS[field]} caracteres']
+        else:
+            values[field] = text
+    values['notes'] = cell_text(row.get('notes'))
+
+    if cell_text(row.get('date')):
+        try:
+            values['date'] = parse_attention_date(row.get('date'))
+        except ValueError as e:
+            errors['date'] = [str(e)]
+    else:
+        errors['date'] = ['Este campo es obligatorio']
+
+    numbers = (
+        ('amount_charged', True, Decimal('99999999.99')),
+        ('insurance_discount_percentage', False, Decimal('100')),
+        ('commission_percentage', False, Decimal('100')),
+    )
+    for field, required, maximum in numbers:
+        if not cell_text(row.get(field)):
+            if required:
+                errors[field] = ['Este campo es obligatorio']
+            continue
+        try:
+            values[field] = parse_decimal(row.get(field), minimum=Decimal('0'), maximum=maximum)
+        except ValueError as e:
+            errors[field] = [str(e)]
+
+    status = cell_text(row.get('status')).lower() or 'completed'
+    if status not in STATUSES:
+        errors['status'] = [f"Estado inválido: use {', '.join(key for key, _ in Attention.STATUS_CHOICES)}"]
+    else:
+        values['status'] = STATUSES[status]
+
+    if errors:
+        return None, errors
+
+    attention = Attention(**values)
+    attention.stamp_commission()
+    return attention, None
+
+
+def insert_attentions(attentions):
+    """bulk_create más los totales diarios, en una transacción o savepoint"""
+    with transaction.atomic():
+        Attention.objects.bulk_create(attentions)
+        record_created_attentions(attentions)
+
+
+def import_attentions(fileobj, file_format, batch_size=None, dry_run=False,
+                      max_errors=None, on_error=None):
+    """
+    Importa atenciones desde un archivo CSV o XLSX.
+
+    Args:
+        fileobj: Archivo binario (para XLSX debe admitir seek)
+        file_format: 'csv' o 'xlsx' (ver import_format)
+        batch_size: Filas por lote (ATTENTION_IMPORT_BATCH_SIZE)
+        dry_run: Solo validar, sin insertar
+        max_errors: Errores que se guardan en el reporte (ATTENTION_IMPORT_MAX_ERRORS);
+            el resto solo se cuenta
+        on_error: Función (row, errors) que recibe cada error en lugar de
+            guardarlo en el reporte
+
+    Returns:
+        dict con 'total_rows', 'valid', 'created', 'failed', 'errors'
+        ([{'row', 'errors'}]) y 'errors_truncated'
+
+    Raises:
+        ImportFileError: Si el archivo o sus encabezados no son válidos. Un
+            error de lectura a mitad del archivo (por ejemplo, codificación)
+            deja guardados los lotes ya insertados.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    max_errors = IMPORT_MAX_ERRORS if max_errors is None else max_errors
+    report = {
+        'dry_run': dry_run,
+        'total_rows': 0,
+        'valid': 0,
+        'created': 0,
+        'failed': 0,
+        'errors': [],
+        'errors_truncated': False,
+    }
+
+    def fail(number, errors):
+        report['failed'] += 1
+        if on_error is not None:
+            on_error(number, errors)
+        elif len(report['errors']) < max_errors:
+            report['errors'].append({'row': number, 'errors': errors})
+        else:
+            report['errors_truncated'] = True
+
+    lookups = ImportLookups()
+    rows = (
+        (number, row) for number, row in read_rows(fileobj, file_format)
+        if any(cell_text(value) for value in row.values())
+    )
+    while True:
+        chunk = list(itertools.islice(rows, batch_size))
+        if not chunk:
+            break
+        report['total_rows'] += len(chunk)
+        lookups.load([row for _, row in chunk])
+
+        valid = []
+        for number, row in chunk:
+            attention, errors = build_attention(row, lookups)
+            if errors:
+                fail(number, errors)
+            else:
+                valid.append((number, attention))
+
+        report['valid'] += len(valid)
+        if dry_run or not valid:
+            continue
+
+        try:
+            insert_attentions([attention for _, attention in valid])
+            report['created'] += len(valid)
+        except DatabaseError:
+            # Reintento fila por fila para identificar las que fallan
+            for number, attention in valid:
+                try:
+                    insert_attentions([attention])
+                    report['created'] += 1
+                except DatabaseError as e:
+                    fail(number, {'non_field_errors': [str(e)]})
+
+    return report
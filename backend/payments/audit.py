@@ -1,9 +1,171 @@
 """
 Utilidades para auditoría y registro de cambios en el sistema OdontAll
 """
-from payments.models import AuditLog
-from django.contrib.auth.models import User
+import atexit
 import json
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from payments.models import AuditLog
+from payments.audit_summary import count_events, increment_daily_counts
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = getattr(settings, 'AUDIT_BATCH_SIZE', 100)
+AUDIT_BUFFER_MAX_SIZE = getattr(settings, 'AUDIT_BUFFER_MAX_SIZE', 1000)
+
+AUDIT_EVENT_FIELDS = [
+    'user_id', 'action', 'model_name', 'object_id', 'object_description',
+    'old_values', 'new_values', 'changes', 'ip_address', 'user_agent',
+]
+
+# Buffer acotado: si se llena (por ejemplo porque la base no responde) se
+# descartan los eventos más antiguos en lugar de crecer sin límite
+_buffer = deque(maxlen=AUDIT_BUFFER_MAX_SIZE)
+_buffer_lock = threading.Lock()
+
+# Peticiones en curso en este hilo (audit_request_scope)
+_request_scope = threading.local()
+
+
+def json_safe(value):
+    """
+    Valor apto para un JSONField (Decimal, UUID y fechas como texto).
+
+    Los dicts se guardan como objetos JSON, no como un string con JSON adentro.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+
+def request_client(request):
+    """IP real (considerando proxies) y User-Agent de una petición"""
+    if not request:
+        return None, ''
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip_address = x_forwarded_for.split(',')[0]
+    else:
+        ip_address = request.META.get('REMOTE_ADDR')
+    return ip_address, request.META.get('HTTP_USER_AGENT', '')
+
+
+def audit_async_enabled():
+    return getattr(settings, 'AUDIT_ASYNC', False) and getattr(settings, 'CELERY_ENABLED', False)
+
+
+def event_time(event):
+    """Momento en que se registró el evento (texto ISO para poder pasar por Celery)"""
+    created_at = event.get('created_at')
+    if isinstance(created_at, str):
+        created_at = parse_datetime(created_at)
+    return created_at or timezone.now()
+
+
+def write_audit_events(events):
+    """
+    Inserta eventos de auditoría (dicts con AUDIT_EVENT_FIELDS) con bulk_create
+    y suma el lote a los contadores diarios del resumen, en una transacción.
+
+    Returns:
+        int: Cantidad de registros insertados
+    """
+    if not events:
+        return 0
+    logs = [
+        AuditLog(created_at=event_time(event), **{field: event.get(field) for field in AUDIT_EVENT_FIELDS})
+        for event in events
+    ]
+    with transaction.atomic():
+        AuditLog.objects.bulk_create(logs, batch_size=AUDIT_BATCH_SIZE)
+        increment_daily_counts(count_events(logs))
+    return len(events)
+
+
+def flush_audit_buffer():
+    """
+    Vacía el buffer de auditoría.
+
+    Con AUDIT_ASYNC (y Celery habilitado) los eventos se envían a un worker
+    en lotes de AUDIT_BATCH_SIZE; si no, o si el envío falla, se insertan
+    aquí mismo con bulk_create. Si la inserción falla los eventos vuelven al
+    buffer para el próximo intento.
+
+    Returns:
+        int: Cantidad de eventos vaciados
+    """
+    with _buffer_lock:
+        events = list(_buffer)
+        _buffer.clear()
+    if not events:
+        return 0
+    total = len(events)
+
+    if audit_async_enabled():
+        from payments.tasks import write_audit_events_async
+        while events:
+            try:
+                write_audit_events_async.delay(events[:AUDIT_BATCH_SIZE])
+            except Exception as e:
+                logger.warning(f"No se pudo encolar la auditoría, se escribe directo: {e}")
+                break
+            events = events[AUDIT_BATCH_SIZE:]
+
+    try:
+        write_audit_events(events)
+    except Exception as e:
+        logger.error(f"Error guardando {len(events)} registros de auditoría, se reintentarán: {e}")
+        with _buffer_lock:
+            _buffer.extendleft(reversed(events))
+        return 0
+    return total
+
+
+def in_request_scope():
+    return getattr(_request_scope, 'depth', 0) > 0
+
+
+@contextmanager
+def audit_request_scope():
+    """
+    Acumula los eventos registrados dentro del bloque y los escribe juntos
+    al salir (AuditFlushMiddleware lo usa para cada petición).
+    """
+    depth = getattr(_request_scope, 'depth', 0)
+    _request_scope.depth = depth + 1
+    try:
+        yield
+    finally:
+        _request_scope.depth = depth
+        if not depth:
+            flush_audit_buffer()
+
+
+def enqueue_audit_event(event):
+    """
+    Agrega un evento al buffer. Se vacía al alcanzar AUDIT_BATCH_SIZE eventos
+    o de inmediato si no hay una petición en curso que lo vacíe al terminar
+    (tareas de Celery, comandos de manage.py).
+    """
+    with _buffer_lock:
+        _buffer.append(event)
+        size = len(_buffer)
+    if size >= AUDIT_BATCH_SIZE or not in_request_scope():
+        flush_audit_buffer()
+
+
+# Lo que quede en el buffer (por ejemplo, eventos que fallaron al escribirse)
+# se intenta escribir al terminar el proceso
+atexit.register(flush_audit_buffer)
 
 
 def log_audit(user, action, model_name, object_id, object_description='', 
@@ -11,6 +173,13 @@ def log_audit(user, action, model_name, object_id, object_description='',
     """
     Registra una acción en el log de auditoría
     
+    El evento se agrega a un buffer en memoria que se escribe en lote
+    (bulk_create o tarea de Celery) al terminar la petición
+    (AuditFlushMiddleware) o al llegar a AUDIT_BATCH_SIZE eventos; fuera de
+    una petición se escribe enseguida. Dentro de una transacción el evento se
+    encola recién al hacer commit, así un rollback no deja auditoría de
+    cambios que no ocurrieron. created_at guarda el momento de esta llamada.
+    
     Args:
         user: Usuario que realiza la acción
         action: Tipo de acción ('create', 'update', 'delete', 'status_change', 'payment', 'settlement_generated')
@@ -21,42 +190,35 @@ def log_audit(user, action, model_name, object_id, object_description='',
         new_values: Valores nuevos (dict)
         changes: Cambios específicos (dict)
         request: Request object para obtener IP y User-Agent
+    
+    Returns:
+        dict con el evento encolado, o None si no se pudo registrar
     """
     try:
-        ip_address = None
-        user_agent = ''
-        
-        if request:
-            # Obtener IP real (considerando proxies)
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip_address = x_forwarded_for.split(',')[0]
-            else:
-                ip_address = request.META.get('REMOTE_ADDR')
-            
-            user_agent = request.META.get('HTTP_USER_AGENT', '')
+        ip_address, user_agent = request_client(request)
         
-        # Convertir dicts a JSON si es necesario
-        old_values_json = json.dumps(old_values) if old_values and isinstance(old_values, dict) else old_values
-        new_values_json = json.dumps(new_values) if new_values and isinstance(new_values, dict) else new_values
-        changes_json = json.dumps(changes) if changes and isinstance(changes, dict) else changes
+        event = {
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'action': action,
+            'model_name': model_name,
+            'object_id': str(object_id),
+            'object_description': object_description,
+            'old_values': json_safe(old_values),
+            'new_values': json_safe(new_values),
+            'changes': json_safe(changes),
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': timezone.now().isoformat(),
+        }
         
-        audit_log = AuditLog.objects.create(
-            user=user,
-            action=action,
-            model_name=model_name,
-            object_id=str(object_id),
-            object_description=object_description,
-            old_values=old_values_json,
-            new_values=new_values_json,
-            changes=changes_json,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: enqueue_audit_event(event))
+        else:
+            enqueue_audit_event(event)
         
-        return audit_log
+        return event
     except Exception as e:
-        print(f"Error logging audit: {e}")
+        logger.error(f"Error logging audit: {e}")
         return None
 
 
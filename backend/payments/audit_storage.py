@@ -0,0 +1,557 @@
+"""
+Almacenamiento de auditoría por meses: tabla en caliente y archivo comprimido
+
+La tabla de auditoría conserva solo los meses recientes (AUDIT_HOT_MONTHS).
+Los meses anteriores se mueven a un archivo .jsonl.gz por mes, registrado en
+AuditArchiveSegment, que sigue consultable desde AuditLogViewSet con
+?tier=archive y los mismos filtros (user, action, model_name, search).
+
+En PostgreSQL, con AUDIT_PARTITIONING_ENABLED=True, la tabla puede
+convertirse en una tabla particionada por rango mensual de created_at
+(manage.py audit_storage partition): las consultas por fecha solo recorren
+las particiones del rango y la partición de un mes archivado se desvincula y
+elimina cuando queda vacía. Esta ruta NO está verificada contra un servidor
+PostgreSQL real (las pruebas corren en SQLite), por eso está desactivada por
+defecto. Sin ella la tabla no se particiona.
+
+Del mes archivado solo se eliminan, por lotes de PKs, las filas que se
+escribieron en el segmento. Los eventos pueden llegar tarde (buffer, Celery,
+reintentos) con su created_at original: una fila del mes insertada durante
+el archivado queda en la tabla y se archiva en la siguiente rotación.
+
+Los meses se delimitan en UTC y solo se archivan meses fuera de la ventana
+en caliente.
+"""
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import tempfile
+import uuid
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from payments.models import AuditLog, AuditArchiveSegment
+from payments.retention import AUDIT_ARCHIVE_DIR, AUDIT_ARCHIVE_FIELDS, AUDIT_RETENTION_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+AUDIT_HOT_MONTHS = getattr(settings, 'AUDIT_HOT_MONTHS', 6)
+AUDIT_PARTITIONING_ENABLED = getattr(settings, 'AUDIT_PARTITIONING_ENABLED', False)
+AUDIT_PARTITION_MONTHS_AHEAD = getattr(settings, 'AUDIT_PARTITION_MONTHS_AHEAD', 3)
+
+AUDIT_TABLE = AuditLog._meta.db_table
+DEFAULT_PARTITION = f"{AUDIT_TABLE}_default"
+PARTITION_PATTERN = re.compile(rf'^{re.escape(AUDIT_TABLE)}_p(\d{{4}})(\d{{2}})$')
+
+
+# ---------------------------------------------------------------------------
+# Meses
+# ---------------------------------------------------------------------------
+
+def month_start(value):
+    """Primer día del mes (date) de una fecha o fecha/hora, en UTC"""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = value.astimezone(dt_timezone.utc)
+        value = value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Rango [inicio, fin) del mes como fechas/hora UTC"""
+    end_month = add_months(month, 1)
+    return (
+        datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc),
+        datetime(end_month.year, end_month.month, 1, tzinfo=dt_timezone.utc),
+    )
+
+
+def hot_cutoff_month(hot_months=None, now=None):
+    """Primer mes que se conserva en la tabla; los anteriores se archivan"""
+    hot_months = AUDIT_HOT_MONTHS if hot_months is None else hot_months
+    return add_months(month_start(now or timezone.now()), -(max(hot_months, 1) - 1))
+
+
+# ---------------------------------------------------------------------------
+# Particiones (PostgreSQL)
+# ---------------------------------------------------------------------------
+
+def partitioning_supported():
+    """Particionado habilitado explícitamente (sin verificar) y motor PostgreSQL"""
+    return AUDIT_PARTITIONING_ENABLED and connection.vendor == 'postgresql'
+
+
+def partition_name(month):
+    return f"{AUDIT_TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    """True si la tabla de auditoría es una tabla particionada de PostgreSQL"""
+    if not partitioning_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [AUDIT_TABLE])
+        return cursor.fetchone() is not None
+
+
+def existing_partitions():
+    """Particiones mensuales existentes: {mes: nombre} (sin la partición por defecto)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [AUDIT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def _create_partition(cursor, month):
+    """
+    Crea la partición de un mes. Si la partición por defecto ya tiene filas
+    de ese rango (PostgreSQL no permite crearla así), se mueven a la nueva.
+    """
+    start, end = month_bounds(month)
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+    cursor.execute(
+        f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s LIMIT 1',
+        [start, end]
+    )
+    if cursor.fetchone() is None:
+        cursor.execute(f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{AUDIT_TABLE}" {bounds}')
+        return
+
+    cursor.execute(f'ALTER TABLE "{AUDIT_TABLE}" DETACH PARTITION "{DEFAULT_PARTITION}"')
+    cursor.execute(f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{AUDIT_TABLE}" {bounds}')
+    cursor.execute(
+        f'INSERT INTO "{AUDIT_TABLE}" SELECT * FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s',
+        [start, end]
+    )
+    cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= %s AND created_at < %s', [start, end])
+    cursor.execute(f'ALTER TABLE "{AUDIT_TABLE}" ATTACH PARTITION "{DEFAULT_PARTITION}" DEFAULT')
+
+
+def partition_audit_table(months_ahead=None, now=None):
+    """
+    Convierte la tabla de auditoría en una tabla particionada por mes.
+
+    Copia las filas existentes a la nueva estructura dentro de una sola
+    transacción, por lo que conviene ejecutarla en una ventana de
+    mantenimiento. Se conservan los índices y la llave foránea de la tabla
+    original; la clave primaria pasa a ser (id, created_at) porque PostgreSQL
+    exige que incluya la columna de partición.
+
+    Returns:
+        bool: False si la tabla ya estaba particionada
+
+    Sin verificar contra un servidor PostgreSQL real: ensayarla antes en una
+    copia de la base.
+
+    Raises:
+        ValueError: Si el particionado no está habilitado o la base de datos
+            no es PostgreSQL
+    """
+    if not partitioning_supported():
+        raise ValueError(
+            'El particionado de auditoría requiere PostgreSQL y AUDIT_PARTITIONING_ENABLED=True'
+        )
+    if is_partitioned():
+        return False
+
+    months_ahead = AUDIT_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    legacy = f"{AUDIT_TABLE}_legacy"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Índices y llaves foráneas a recrear (sin la clave primaria)
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p')",
+            [AUDIT_TABLE, AUDIT_TABLE]
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [AUDIT_TABLE]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f'SELECT MIN(created_at) FROM "{AUDIT_TABLE}"')
+        first_created_at = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{AUDIT_TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{AUDIT_TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'ALTER TABLE "{AUDIT_TABLE}" ADD PRIMARY KEY (id, created_at)')
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{AUDIT_TABLE}" DEFAULT')
+
+        current = month_start(now or timezone.now())
+        month = month_start(first_created_at) if first_created_at else current
+        while month <= add_months(current, months_ahead):
+            _create_partition(cursor, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{AUDIT_TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+        # Las definiciones se leyeron antes del cambio de nombre y apuntan a la tabla nueva
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{AUDIT_TABLE}" ADD CONSTRAINT "{name}" {definition}')
+
+    logger.info("Tabla de auditoría particionada por mes")
+    return True
+
+
+def ensure_partitions(months_ahead=None, now=None):
+    """
+    Crea las particiones del mes actual y de los próximos meses.
+
+    Returns:
+        list: Meses creados (vacía si la tabla no está particionada)
+    """
+    if not is_partitioned():
+        return []
+
+    months_ahead = AUDIT_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    existing = existing_partitions()
+    current = month_start(now or timezone.now())
+    missing = [
+        add_months(current, offset) for offset in range(months_ahead + 1)
+        if add_months(current, offset) not in existing
+    ]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for month in missing:
+            _create_partition(cursor, month)
+    return missing
+
+
+def drop_partition(month):
+    """Desvincula y elimina la partición de un mes, si existe"""
+    name = existing_partitions().get(month)
+    if name is None:
+        return False
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{AUDIT_TABLE}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Archivo
+# ---------------------------------------------------------------------------
+
+def segment_path(month, archive_dir=None):
+    return os.path.join(archive_dir or AUDIT_ARCHIVE_DIR, f"audit_{month:%Y%m}.jsonl.gz")
+
+
+def read_segment(segment):
+    """Eventos de un segmento (dicts), del más reciente al más antiguo"""
+    with gzip.open(segment.path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _table_entries(queryset, read_ids):
+    """
+    (clave, línea JSON, evento) de la tabla, del más reciente al más antiguo.
+    La clave usa created_at truncado a milisegundos, la precisión con que
+    DjangoJSONEncoder lo escribe en el segmento. Agrega a read_ids la PK de
+    cada fila entregada.
+    """
+    for row in queryset.order_by('-created_at', '-id').values(*AUDIT_ARCHIVE_FIELDS).iterator():
+        created_at = row['created_at']
+        created_at = created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+        read_ids.append(row['id'])
+        yield (created_at, str(row['id'])), json.dumps(row, cls=DjangoJSONEncoder), row
+
+
+def _segment_entries(segment):
+    for event in read_segment(segment):
+        yield (parse_datetime(event['created_at']), event['id']), json.dumps(event), event
+
+
+def delete_archived_rows(ids, batch_size=None):
+    """Elimina de la tabla, por lotes de PKs, las filas ya escritas en un segmento"""
+    batch_size = batch_size or AUDIT_RETENTION_BATCH_SIZE
+    deleted = 0
+    for offset in range(0, len(ids), batch_size):
+        batch_deleted, _ = AuditLog.objects.filter(id__in=ids[offset:offset + batch_size]).delete()
+        deleted += batch_deleted
+    return deleted
+
+
+def archive_month(month, archive_dir=None):
+    """
+    Mueve un mes de la tabla de auditoría a su segmento comprimido.
+
+    El archivo se escribe completo (temporal y reemplazo atómico) y se
+    registra antes de eliminar las filas, de modo que una interrupción nunca
+    pierde registros. Si el mes ya tenía segmento, sus eventos se combinan
+    en streaming con las filas de la tabla, sin cargarlo en memoria. Un
+    mismo evento (en la tabla y en el segmento tras una ejecución
+    interrumpida) sale consecutivo en el mismo milisegundo de la mezcla y se
+    escribe una sola vez.
+
+    Luego se eliminan solo las filas leídas para el segmento (por PK, no por
+    rango de fechas): un evento atrasado del mes insertado mientras tanto se
+    conserva para la siguiente rotación.
+
+    Returns:
+        AuditArchiveSegment, o None si el mes no tenía registros
+    """
+    archive_dir = archive_dir or AUDIT_ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+
+    start, end = month_bounds(month)
+    rows = AuditLog.objects.filter(created_at__gte=start, created_at__lt=end)
+    segment = AuditArchiveSegment.objects.filter(month=month).first()
+
+    if segment is None and not rows.exists():
+        if is_partitioned():
+            drop_partition(month)
+        return None
+
+    # PKs de las filas de la tabla leídas para el segmento
+    archived_ids = []
+    sources = [_table_entries(rows, archived_ids)]
+    if segment is not None:
+        sources.append(_segment_entries(segment))
+
+    count = 0
+    user_ids, actions, model_names = set(), set(), set()
+    first_created_at = last_created_at = None
+    # Ids ya escritos en el milisegundo actual, para no duplicar eventos
+    current_time, current_ids = None, set()
+
+    fd, tmp_path = tempfile.mkstemp(dir=archive_dir, suffix='.tmp')
+    os.close(fd)
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+            for key, line, event in heapq.merge(*sources, key=lambda entry: entry[0], reverse=True):
+                if key[0] != current_time:
+                    current_time, current_ids = key[0], set()
+                if key[1] in current_ids:
+                    continue
+                current_ids.add(key[1])
+                archive.write(line)
+                archive.write('\n')
+                count += 1
+                user_ids.add(event['user_id'])
+                actions.add(event['action'])
+                model_names.add(event['model_name'])
+                last_created_at = last_created_at or key[0]
+                first_created_at = key[0]
+        path = segment_path(month, archive_dir)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    segment, _ = AuditArchiveSegment.objects.update_or_create(
+        month=month,
+        defaults={
+            'path': path,
+            'file_size': os.path.getsize(path),
+            'row_count': count,
+            'first_created_at': first_created_at,
+            'last_created_at': last_created_at,
+            'user_ids': sorted(user_ids, key=lambda value: (value is None, value)),
+            'actions': sorted(actions),
+            'model_names': sorted(model_names),
+        }
+    )
+
+    delete_archived_rows(archived_ids)
+    # La partición se elimina solo si no llegaron filas del mes durante el archivado
+    if is_partitioned() and not rows.exists():
+        drop_partition(month)
+
+    logger.info(f"Auditoría de {month:%m/%Y} archivada: {count} registros en {path}")
+    return segment
+
+
+def rotate_audit_storage(hot_months=None, now=None, archive_dir=None):
+    """
+    Archiva los meses anteriores a la ventana en caliente y, con particiones,
+    crea las de los próximos meses y elimina las antiguas vacías.
+
+    Returns:
+        list: Segmentos creados o actualizados
+    """
+    cutoff_month = hot_cutoff_month(hot_months, now)
+    cutoff, _ = month_bounds(cutoff_month)
+
+    segments = []
+    while True:
+        oldest = (
+            AuditLog.objects.filter(created_at__lt=cutoff)
+            .order_by('created_at').values_list('created_at', flat=True).first()
+        )
+        if oldest is None:
+            break
+        segment = archive_month(month_start(oldest), archive_dir)
+        if segment is not None:
+            segments.append(segment)
+
+    if is_partitioned():
+        for month in existing_partitions():
+            if month < cutoff_month:
+                drop_partition(month)
+        ensure_partitions(now=now)
+
+    return segments
+
+
+# ---------------------------------------------------------------------------
+# Consultas sobre el archivo
+# ---------------------------------------------------------------------------
+
+def archive_filters(params):
+    """
+    Filtros del listado de auditoría aplicables al archivo, desde los
+    query params (user, action, model_name, search, month=AAAA-MM).
+
+    Raises:
+        ValueError: Si user o month no son válidos
+    """
+    filters = {
+        'action': params.get('action') or None,
+        'model_name': params.get('model_name') or None,
+        'search': params.get('search') or None,
+        'user': None,
+        'month': None,
+    }
+    if params.get('user'):
+        filters['user'] = int(params['user'])
+    if params.get('month'):
+        filters['month'] = datetime.strptime(params['month'], '%Y-%m').date()
+    return filters
+
+
+def search_matcher(search):
+    """
+    Función que indica si un evento coincide con la búsqueda, con la misma
+    semántica que SearchFilter del ViewSet: cada término debe aparecer en
+    object_id, object_description o el username del usuario.
+    """
+    terms = search.split()
+    term_user_ids = []
+    for term in terms:
+        term_user_ids.append(set(User.objects.filter(username__icontains=term).values_list('id', flat=True)))
+
+    def matches(event):
+        for term, user_ids in zip(terms, term_user_ids):
+            term = term.lower()
+            if (
+                term not in (event.get('object_id') or '').lower()
+                and term not in (event.get('object_description') or '').lower()
+                and event.get('user_id') not in user_ids
+            ):
+                return False
+        return True
+
+    return matches
+
+
+def archived_instance(event):
+    """AuditLog (sin guardar) a partir de un evento archivado"""
+    values = dict(event)
+    values['id'] = uuid.UUID(values['id'])
+    values['created_at'] = parse_datetime(values['created_at'])
+    return AuditLog(**values)
+
+
+def archived_page(page_size, position=None, user=None, action=None, model_name=None, search=None, month=None):
+    """
+    Página de eventos archivados, del más reciente al más antiguo.
+
+    Solo se abren los segmentos cuyo mes y valores registrados pueden
+    contener coincidencias; con un cursor (created_at, id) se omiten además
+    los segmentos posteriores a esa posición.
+
+    Args:
+        page_size: Cantidad de eventos
+        position: [created_at, id] del último evento entregado, o None
+
+    Returns:
+        (lista de AuditLog sin guardar con el usuario cargado, hay_más)
+    """
+    segments = AuditArchiveSegment.objects.order_by('-month')
+    if month is not None:
+        segments = segments.filter(month=month)
+
+    after = None
+    if position is not None:
+        created_at, event_id = position
+        if isinstance(created_at, str):
+            created_at = parse_datetime(created_at)
+        after = (created_at, str(event_id))
+        if after[0] is None:
+            raise ValueError('Cursor inválido')
+        segments = segments.filter(month__lte=month_start(after[0]))
+
+    if user is not None:
+        segments = [segment for segment in segments if user in segment.user_ids]
+    if action is not None:
+        segments = [segment for segment in segments if action in segment.actions]
+    if model_name is not None:
+        segments = [segment for segment in segments if model_name in segment.model_names]
+
+    matches = search_matcher(search) if search else None
+
+    events = []
+    for segment in segments:
+        for event in read_segment(segment):
+            if after is not None and (parse_datetime(event['created_at']), event['id']) >= after:
+                continue
+            if user is not None and event['user_id'] != user:
+                continue
+            if action is not None and event['action'] != action:
+                continue
+            if model_name is not None and event['model_name'] != model_name:
+                continue
+            if matches is not None and not matches(event):
+                continue
+            events.append(event)
+            if len(events) > page_size:
+                break
+        if len(events) > page_size:
+            break
+
+    has_next = len(events) > page_size
+    instances = [archived_instance(event) for event in events[:page_size]]
+
+    # Usuarios de la página en una sola consulta
+    users = User.objects.in_bulk({instance.user_id for instance in instances if instance.user_id})
+    for instance in instances:
+        if instance.user_id in users:
+            instance.user = users[instance.user_id]
+
+    return instances, has_next
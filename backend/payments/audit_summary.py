@@ -0,0 +1,163 @@
+"""
+Resumen de auditoría a partir de contadores diarios
+
+Cada lote de eventos incrementa AuditDailyCount por (día, usuario, acción,
+modelo) en la misma transacción en que se inserta, y el resumen se arma con
+una sola consulta agrupada sobre esos contadores: su costo depende de los
+días del rango, no de la cantidad de registros de auditoría.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from payments.models import AuditLog, AuditDailyCount
+
+
+def count_events(logs):
+    """Counter {(fecha, user_id, action, model_name): cantidad} de AuditLog ya insertados"""
+    return Counter(
+        (timezone.localdate(log.created_at), log.user_id, log.action, log.model_name)
+        for log in logs
+    )
+
+
+def increment_daily_counts(counts):
+    """
+    Suma counts (ver count_events) a los contadores diarios.
+
+    Una actualización F('count') + n por combinación; si el contador no
+    existe se crea, y si otro proceso lo creó en paralelo se actualiza.
+    """
+    for (day, user_id, action, model_name), amount in counts.items():
+        key = {'date': day, 'user_id': user_id, 'action': action, 'model_name': model_name}
+        pk = AuditDailyCount.objects.filter(**key).values_list('pk', flat=True).first()
+        if pk is None:
+            try:
+                with transaction.atomic():
+                    AuditDailyCount.objects.create(count=amount, **key)
+                continue
+            except IntegrityError:
+                pk = AuditDailyCount.objects.filter(**key).values_list('pk', flat=True).first()
+        AuditDailyCount.objects.filter(pk=pk).update(count=F('count') + amount)
+
+
+def merge_user_daily_counts(user_id):
+    """
+    Suma los contadores de un usuario a los de sin usuario y los elimina,
+    antes de borrar el usuario (on_delete=SET_NULL chocaría con la
+    restricción de los contadores sin usuario).
+    """
+    rows = AuditDailyCount.objects.filter(user_id=user_id)
+    increment_daily_counts(Counter({
+        (row.date, None, row.action, row.model_name): row.count for row in rows
+    }))
+    rows.delete()
+
+
+def day_bounds(start=None, end=None):
+    """Fechas/hora (zona local) que cubren los días [start, end]"""
+    tz = timezone.get_current_timezone()
+    since = timezone.make_aware(datetime.combine(start, time.min), tz) if start else None
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz) if end else None
+    return since, until
+
+
+def rebuild_daily_counts(start=None, end=None):
+    """
+    Recalcula los contadores de los días [start, end] desde la tabla de
+    auditoría, con una consulta agrupada.
+
+    Los días cuyos registros ya se purgaron o archivaron quedan solo con lo
+    que permanezca en la tabla, por lo que conviene limitar el rango.
+
+    Returns:
+        int: Contadores generados
+    """
+    logs = AuditLog.objects.all()
+    since, until = day_bounds(start, end)
+    if since:
+        logs = logs.filter(created_at__gte=since)
+    if until:
+        logs = logs.filter(created_at__lt=until)
+
+    rows = (
+        logs.annotate(day=TruncDate('created_at'))
+        .values('day', 'user_id', 'action', 'model_name')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    counts = [
+        AuditDailyCount(
+            date=row['day'], user_id=row['user_id'], action=row['action'],
+            model_name=row['model_name'], count=row['total']
+        )
+        for row in rows
+    ]
+
+    existing = AuditDailyCount.objects.all()
+    if start:
+        existing = existing.filter(date__gte=start)
+    if end:
+        existing = existing.filter(date__lte=end)
+
+    with transaction.atomic():
+        existing.delete()
+        AuditDailyCount.objects.bulk_create(counts, batch_size=1000)
+    return len(counts)
+
+
+def audit_summary(start=None, end=None):
+    """
+    Totales de auditoría por acción, modelo, día y usuario en [start, end]
+    (todo el historial si no se indican), con una sola consulta.
+    """
+    counts = AuditDailyCount.objects.all()
+    if start:
+        counts = counts.filter(date__gte=start)
+    if end:
+        counts = counts.filter(date__lte=end)
+
+    rows = counts.values(
+        'date', 'user_id', 'user__username', 'user__first_name', 'user__last_name', 'action', 'model_name'
+    ).annotate(total=Sum('count')).order_by()
+
+    total = 0
+    by_action = Counter()
+    by_model = Counter()
+    by_day = Counter()
+    by_user = defaultdict(int)
+    users = {}
+    for row in rows:
+        total += row['total']
+        by_action[row['action']] += row['total']
+        by_model[row['model_name']] += row['total']
+        by_day[row['date']] += row['total']
+        by_user[row['user_id']] += row['total']
+        if row['user_id'] not in users:
+            full_name = f"{row['user__first_name'] or ''} {row['user__last_name'] or ''}".strip()
+            users[row['user_id']] = (row['user__username'], full_name)
+
+    return {
+        'start_date': start,
+        'end_date': end,
+        # Los contadores no se descuentan al purgar o archivar registros
+        'includes_purged': True,
+        'note': 'Los totales incluyen eventos ya purgados o archivados de la tabla de auditoría',
+        'total_logs': total,
+        'by_action': {label: by_action[key] for key, label in AuditLog.ACTION_CHOICES},
+        'by_model': {label: by_model[key] for key, label in AuditLog.MODEL_CHOICES},
+        'by_day': [{'date': day, 'total': by_day[day]} for day in sorted(by_day)],
+        'by_user': [
+            {
+                'user': user_id,
+                'username': users[user_id][0],
+                'user_display': users[user_id][1] or users[user_id][0],
+                'total': count,
+            }
+            for user_id, count in sorted(by_user.items(), key=lambda item: -item[1])
+        ],
+    }
@@ -2,9 +2,11 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from payments.authentication import ClinicaRefreshToken
 from django.contrib.auth.models import User
 from payments.models import UserProfile
+from payments.principal import PROFESSIONAL_ID_CLAIM, ROLE_CLAIM, principal_claims
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -12,6 +14,11 @@ def login_view(request):
     """
     Endpoint para login sin autenticación previa.
     Genera tokens JWT para el usuario.
+    
+    El rol devuelto es el mismo que viaja en los claims (principal_claims):
+    el rol del perfil, sin promover a admin a staff o superusuarios. Un
+    cambio de rol posterior no afecta a las lecturas (GET, HEAD, OPTIONS)
+    hasta que el access token expira (ACCESS_TOKEN_LIFETIME) y se refresca.
     """
     username = request.data.get('username')
     password = request.data.get('password')
@@ -43,25 +50,13 @@ def login_view(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Obtener rol del usuario
-    role = 'professional'
-    professional_id = None
-    if hasattr(user, 'profile'):
-        role = user.profile.role
-    
-    # Obtener professional_id si es profesional
-    from payments.models import Professional
-    try:
-        if user.is_superuser or user.is_staff:
-            role = 'admin'
-        else:
-            professional = Professional.objects.get(user=user)
-            professional_id = str(professional.id)
-    except Professional.DoesNotExist:
-        pass
+    # Rol y professional_id de la respuesta y de los claims salen de la misma
+    # función (una consulta), para que el frontend y ClaimsJWTAuthentication
+    # vean el mismo rol. Un rol sin perfil llega como null.
+    claims = principal_claims(user)
     
-    # Generar tokens JWT
-    refresh = RefreshToken.for_user(user)
+    # Generar tokens JWT (con rol y professional_id como claims)
+    refresh = ClinicaRefreshToken.for_user(user)
     
     return Response({
         'access': str(refresh.access_token),
@@ -72,8 +67,8 @@ def login_view(request):
             'email': user.email,
             'first_name': user.first_name,
             'last_name': user.last_name,
-            'role': role,
-            'professional_id': professional_id,
+            'role': claims[ROLE_CLAIM],
+            'professional_id': claims[PROFESSIONAL_ID_CLAIM],
             'is_active': user.is_active,
         }
     }, status=status.HTTP_200_OK)
@@ -83,6 +78,10 @@ def login_view(request):
 def refresh_token_view(request):
     """
     Endpoint para refrescar el token de acceso.
+    
+    Los claims del nuevo access token (rol, professional_id) se leen de la
+    base de datos y no del refresh token; un usuario desactivado o eliminado
+    ya no puede refrescar.
     """
     refresh_token = request.data.get('refresh')
     
@@ -93,15 +92,25 @@ def refresh_token_view(request):
         )
     
     try:
-        refresh = RefreshToken(refresh_token)
-        return Response({
-            'access': str(refresh.access_token),
-        }, status=status.HTTP_200_OK)
+        refresh = ClinicaRefreshToken(refresh_token)
     except Exception as e:
         return Response(
             {'error': 'Invalid refresh token'},
             status=status.HTTP_401_UNAUTHORIZED
         )
+    
+    user = User.objects.filter(
+        **{jwt_settings.USER_ID_FIELD: refresh.get(jwt_settings.USER_ID_CLAIM)}
+    ).first()
+    if user is None or not user.is_active:
+        return Response(
+            {'error': 'User account is disabled'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    return Response({
+        'access': str(ClinicaRefreshToken.for_user(user).access_token),
+    }, status=status.HTTP_200_OK)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
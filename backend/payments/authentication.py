@@ -0,0 +1,64 @@
+"""
+Tokens JWT con claims de autorización y autenticación basada en ellos
+"""
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from payments.principal import ROLE_CLAIM, principal_claims
+
+
+class ClinicaRefreshToken(RefreshToken):
+    """
+    Refresh token que incluye rol, professional_id y datos básicos del
+    usuario. Los access tokens derivados (refresh.access_token) copian
+    estos claims; refresh_token_view los vuelve a leer de la base de datos
+    con for_user para no arrastrar un rol desactualizado.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in principal_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Autenticación JWT que no consulta la base de datos en lecturas.
+
+    En métodos seguros (GET, HEAD, OPTIONS) con un token que trae los claims
+    de ClinicaRefreshToken, request.user es un TokenUser construido desde el
+    token y el principal (payments.principal) se toma de los claims; solo se
+    verifica con una consulta por clave primaria que el usuario siga activo.
+    Las escrituras y los tokens antiguos sin claims cargan el usuario real.
+
+    La desactivación del usuario rechaza el token de inmediato; un cambio de
+    rol (p. ej. un admin degradado) sigue vigente en las lecturas hasta que
+    el access token expira (ACCESS_TOKEN_LIFETIME) y se refresca. Las
+    escrituras usan siempre el rol de la base de datos.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS and ROLE_CLAIM in validated_token:
+            user = api_settings.TOKEN_USER_CLASS(validated_token)
+            if not get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: user.pk, 'is_active': True}
+            ).exists():
+                raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+            return user, validated_token
+        return self.get_user(validated_token), validated_token
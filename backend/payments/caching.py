@@ -0,0 +1,92 @@
+"""
+Caché de lecturas de catálogos (servicios, descuentos, aseguradoras)
+
+Las respuestas se guardan bajo una versión por catálogo. Al guardar o
+eliminar un registro del catálogo (signals, al confirmar la transacción) la
+versión cambia y todas las respuestas anteriores quedan inalcanzables de una
+vez, sin tener que buscar y borrar claves una por una; expiran solas con su
+timeout.
+
+QuerySet.update() y bulk_update() no disparan señales: quien los use sobre
+Service, Discount o InsuranceDiscount debe llamar a bump_catalog_version
+con el catálogo correspondiente.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from rest_framework.response import Response
+
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+
+def catalog_cache_enabled():
+    """False con DummyCache (ENABLE_CACHE=False): no hay versiones que leer"""
+    return not isinstance(caches['default'], DummyCache)
+
+
+def catalog_version_key(namespace):
+    return f"catalog:{namespace}:version"
+
+
+def get_catalog_version(namespace):
+    """Versión vigente del catálogo (se crea si no existe o fue desalojada)"""
+    key = catalog_version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # add no pisa la versión si otro proceso la creó en paralelo
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_catalog_version(namespace):
+    """Invalida todas las respuestas cacheadas de un catálogo"""
+    cache.set(catalog_version_key(namespace), time.time_ns(), None)
+
+
+def catalog_cache_key(namespace, action, request):
+    """Clave por catálogo, versión, acción y URL completa (incluye filtros y página)"""
+    path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return f"catalog:{namespace}:{get_catalog_version(namespace)}:{action}:{path}"
+
+
+class CatalogCacheMixin:
+    """
+    Cachea las lecturas de un ViewSet de catálogo.
+
+    La respuesta no depende del usuario (los permisos se validan antes de
+    llegar al handler), por lo que se comparte entre usuarios. Las acciones
+    extra de lectura pueden usar cached_response directamente.
+
+    Atributos:
+        cache_namespace: Nombre del catálogo; debe coincidir con el usado
+            en payments.signals para invalidarlo
+        cache_timeout: Segundos de vigencia (CATALOG_CACHE_TIMEOUT por defecto)
+    """
+    cache_namespace = None
+    cache_timeout = None
+
+    def cached_response(self, request, build):
+        """
+        Respuesta cacheada de la acción actual, o la construida por build()
+        (solo se guardan respuestas 200).
+        """
+        key = catalog_cache_key(self.cache_namespace, self.action, request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = build()
+        if response.status_code == 200:
+            cache.set(key, response.data, self.cache_timeout or CATALOG_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CatalogCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs))
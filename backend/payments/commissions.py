@@ -0,0 +1,77 @@
+"""
+Comisión efectiva guardada en cada atención
+
+Attention guarda el porcentaje efectivo (el propio o el del servicio) y la
+comisión redondeada a centavos (Attention.stamp_commission, en cada save).
+Cuando cambia la comisión de un servicio, sus atenciones sin porcentaje
+propio se vuelven a sellar por lotes con bulk_update, sin pasar por save()
+ni por las señales, y luego se reconstruyen sus totales diarios.
+"""
+from django.db import transaction
+
+from payments.models import Attention, Service
+from payments.money import commission_amount, quantize_money
+from payments.rollups import rebuild_attention_rollups
+
+RESTAMP_BATCH_SIZE = 1000
+
+STAMP_FIELDS = ('effective_commission_percentage', 'commission_amount')
+
+
+def restamp_attentions(attentions, batch_size=RESTAMP_BATCH_SIZE):
+    """
+    Vuelve a calcular la comisión guardada de un conjunto de atenciones.
+    Solo escribe las filas cuyo valor cambió, en lotes de batch_size.
+
+    Returns:
+        int: Atenciones actualizadas
+    """
+    rows = attentions.values_list(
+        'id', 'amount_charged', 'insurance_discount_percentage', 'commission_percentage',
+        'service__commission_percentage', *STAMP_FIELDS
+    ).order_by()
+
+    updated = 0
+    pending = []
+    for (attention_id, amount_charged, insurance_discount_percentage, commission_percentage,
+         service_commission_percentage, stored_percentage, stored_amount) in rows.iterator(chunk_size=batch_size):
+        if commission_percentage is None:
+            commission_percentage = service_commission_percentage
+        amount = quantize_money(commission_amount(
+            amount_charged, insurance_discount_percentage, commission_percentage
+        ))
+        if stored_percentage == commission_percentage and stored_amount == amount:
+            continue
+        pending.append(Attention(
+            id=attention_id, effective_commission_percentage=commission_percentage, commission_amount=amount
+        ))
+        if len(pending) >= batch_size:
+            updated += flush_stamps(pending)
+            pending = []
+    if pending:
+        updated += flush_stamps(pending)
+    return updated
+
+
+def flush_stamps(attentions):
+    with transaction.atomic():
+        Attention.objects.bulk_update(attentions, STAMP_FIELDS)
+    return len(attentions)
+
+
+def restamp_service_commissions(service_id):
+    """
+    Propaga la comisión actual de un servicio a sus atenciones sin
+    porcentaje propio y reconstruye los totales diarios del servicio.
+
+    Returns:
+        int: Atenciones actualizadas (0 si el servicio ya no existe)
+    """
+    if not Service.objects.filter(pk=service_id).exists():
+        return 0
+    updated = restamp_attentions(
+        Attention.objects.filter(service_id=service_id, commission_percentage__isnull=True)
+    )
+    if updated:
+        rebuild_attention_rollups(service_id=service_id)
+    return updated
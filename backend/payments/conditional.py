@@ -0,0 +1,117 @@
+"""
+Peticiones condicionales (ETag / If-None-Match) para listados y detalles
+
+El ETag se calcula con una consulta agregada (COUNT y MAX(updated_at)) sobre
+el mismo QuerySet filtrado que usaría la vista, sin serializar nada. Si el
+cliente ya tiene esa versión se responde 304 sin cuerpo.
+
+Los catálogos cacheados (payments.caching) usan en cambio la versión del
+catálogo en caché, sin consultar la base de datos.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+
+from payments.caching import catalog_cache_enabled, get_catalog_version
+
+
+def weak_etag(*parts):
+    """ETag débil (W/"...") a partir de las partes que identifican la versión"""
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+class ConditionalGetMixin:
+    """
+    Agrega ETag a list y retrieve de un ViewSet y responde 304 cuando el
+    cliente envía un If-None-Match vigente.
+
+    Listado: COUNT y MAX(etag_timestamp_field) del QuerySet filtrado (con
+    búsqueda, filtros y ordenamiento de la petición), más la URL completa
+    (página y parámetros) y el usuario, porque el alcance depende del rol.
+    Detalle: etag_timestamp_field del objeto.
+
+    Atributos:
+        etag_timestamp_field: Campo que cambia en cada modificación
+    """
+    etag_timestamp_field = 'updated_at'
+
+    def list_etag(self, request):
+        versions = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            count=Count('pk'), last_change=Max(self.etag_timestamp_field)
+        )
+        return weak_etag(
+            self.__class__.__name__, request.user.pk, request.get_full_path(),
+            versions['count'], versions['last_change']
+        )
+
+    def object_etag(self, request, instance):
+        return weak_etag(
+            self.__class__.__name__, request.user.pk, request.get_full_path(),
+            instance.pk, getattr(instance, self.etag_timestamp_field)
+        )
+
+    def conditional_response(self, request, etag, build):
+        """304 si el ETag coincide con If-None-Match; si no, build() con el ETag agregado"""
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        response = build()
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.list_etag(request),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        # El objeto leído para el ETag se reutiliza en get_object (una sola consulta)
+        self._etag_instance = self.get_object()
+        return self.conditional_response(
+            request, self.object_etag(request, self._etag_instance),
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    def get_object(self):
+        instance = getattr(self, '_etag_instance', None)
+        if instance is not None:
+            return instance
+        return super().get_object()
+
+
+class CatalogConditionalGetMixin(ConditionalGetMixin):
+    """
+    ConditionalGetMixin para los ViewSets con CatalogCacheMixin.
+
+    El ETag sale de la versión del catálogo en caché (cambia con cada
+    escritura, ver payments.signals) y de la URL completa, sin consultar la
+    base de datos: un 304 no toca la BD y un 200 se sirve desde la caché.
+    Como la respuesta cacheada, no depende del usuario. Sin caché
+    (DummyCache) se usa el ETag por consulta de ConditionalGetMixin.
+
+    Debe ir antes de CatalogCacheMixin en la lista de bases.
+    """
+
+    def catalog_etag(self, request):
+        return weak_etag(
+            self.__class__.__name__, request.get_full_path(), get_catalog_version(self.cache_namespace)
+        )
+
+    def list_etag(self, request):
+        if not catalog_cache_enabled():
+            return super().list_etag(request)
+        return self.catalog_etag(request)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not catalog_cache_enabled():
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            request, self.catalog_etag(request),
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
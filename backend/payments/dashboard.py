@@ -0,0 +1,149 @@
+"""
+Agregaciones del dashboard calculadas en la base de datos
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+from payments.models import Attention, AttentionDailyRollup, Professional, Settlement
+from payments.money import ZERO, quantize_money, sum_money
+from payments.principal import get_principal
+from payments.rollups import money_sum
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+
+
+def dashboard_cache_key(user):
+    return f"dashboard_summary:{user.pk}"
+
+
+def scoped_querysets(user, token=None):
+    """
+    Liquidaciones, atenciones y totales diarios de atenciones visibles para
+    el usuario, con el mismo criterio que AttentionViewSet.get_queryset:
+    admin ve todo, profesional solo lo suyo.
+
+    Returns:
+        tuple (settlements, attentions, rollups, es_admin)
+    """
+    principal = get_principal(user, token)
+    if principal.is_admin:
+        return Settlement.objects.all(), Attention.objects.all(), AttentionDailyRollup.objects.all(), True
+
+    if not principal.professional_id:
+        return Settlement.objects.none(), Attention.objects.none(), AttentionDailyRollup.objects.none(), False
+    return (
+        Settlement.objects.filter(professional_id=principal.professional_id),
+        Attention.objects.filter(professional_id=principal.professional_id),
+        AttentionDailyRollup.objects.filter(professional_id=principal.professional_id),
+        False
+    )
+
+
+def build_dashboard_summary(user, token=None):
+    """
+    Resumen del dashboard con consultas agrupadas de costo independiente del
+    volumen de datos devuelto (una fila por estado / profesional).
+
+    Returns:
+        dict con totales de liquidaciones, conteos por estado, atenciones,
+        cifras por profesional (solo admin) y las últimas liquidaciones
+    """
+    from payments.serializers import SettlementListSerializer, AttentionSerializer
+
+    settlements, attentions, rollups, is_admin = scoped_querysets(user, token)
+
+    by_status = {
+        key: {'label': label, 'count': 0, 'total': ZERO}
+        for key, label in Settlement.STATUS_CHOICES
+    }
+    for row in settlements.order_by().values('status').annotate(
+        count=Count('id'), total=money_sum('net_amount')
+    ):
+        by_status[row['status']]['count'] = row['count']
+        by_status[row['status']]['total'] = row['total']
+
+    total_settlements = sum(bucket['count'] for bucket in by_status.values())
+    total_amount = sum_money(bucket['total'] for bucket in by_status.values())
+
+    # Atenciones desde los totales diarios (payments.rollups), sin recorrer las atenciones
+    attention_totals = rollups.order_by().aggregate(
+        total=Coalesce(Sum('attention_count'), 0),
+        completed=Coalesce(Sum('attention_count', filter=Q(status='completed')), 0),
+        pending=Coalesce(Sum('attention_count', filter=Q(status='pending')), 0),
+        cancelled=Coalesce(Sum('attention_count', filter=Q(status='cancelled')), 0),
+        total_charged=money_sum('amount_charged', filter=Q(status='completed')),
+    )
+    attention_totals['total_charged'] = quantize_money(attention_totals['total_charged'])
+
+    summary = {
+        'settlements': {
+            'total': total_settlements,
+            'total_amount': total_amount,
+            'pending': total_settlements - by_status['paid']['count'],
+            'by_status': by_status,
+        },
+        'attentions': attention_totals,
+        'professionals': {'active': 0},
+        'by_professional': [],
+        'recent_settlements': SettlementListSerializer(
+            settlements.select_related('professional__user').order_by('-period_end')[:10],
+            many=True
+        ).data,
+        'recent_attentions': [],
+    }
+
+    if is_admin:
+        summary['professionals']['active'] = Professional.objects.filter(status='active').count()
+
+        per_professional = {}
+        for row in settlements.order_by().values(
+            'professional_id', 'professional__user__first_name', 'professional__user__last_name'
+        ).annotate(
+            settlement_count=Count('id'),
+            total_net=money_sum('net_amount'),
+            total_paid=money_sum('net_amount', filter=Q(status='paid')),
+        ):
+            per_professional[row['professional_id']] = {
+                'professional': str(row['professional_id']),
+                'professional_name': f"{row['professional__user__first_name']} {row['professional__user__last_name']}".strip(),
+                'settlements': row['settlement_count'],
+                'net_amount': row['total_net'],
+                'paid_amount': row['total_paid'],
+                'attentions': 0,
+                'total_charged': ZERO,
+            }
+        for row in rollups.filter(status='completed').order_by().values(
+            'professional_id', 'professional__user__first_name', 'professional__user__last_name'
+        ).annotate(attention_count=Sum('attention_count'), charged=money_sum('amount_charged')):
+            entry = per_professional.setdefault(row['professional_id'], {
+                'professional': str(row['professional_id']),
+                'professional_name': f"{row['professional__user__first_name']} {row['professional__user__last_name']}".strip(),
+                'settlements': 0,
+                'net_amount': ZERO,
+                'paid_amount': ZERO,
+            })
+            entry['attentions'] = row['attention_count']
+            entry['total_charged'] = quantize_money(row['charged'])
+
+        summary['by_professional'] = sorted(
+            per_professional.values(), key=lambda entry: entry['net_amount'], reverse=True
+        )
+    else:
+        summary['recent_attentions'] = AttentionSerializer(
+            attentions.select_related('professional__user', 'service').order_by('-date')[:5],
+            many=True
+        ).data
+
+    return summary
+
+
+def get_dashboard_summary(user, token=None):
+    """Resumen del dashboard cacheado por usuario (DASHBOARD_CACHE_TIMEOUT segundos)"""
+    key = dashboard_cache_key(user)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_dashboard_summary(user, token)
+        cache.set(key, summary, DASHBOARD_CACHE_TIMEOUT)
+    return summary
@@ -0,0 +1,166 @@
+"""
+Exportaciones en segundo plano con archivo persistido
+
+Una exportación se registra como ExportJob, la genera un worker de Celery y el
+archivo queda en MEDIA_ROOT/exports/ hasta su expiración. Las peticiones
+idénticas (mismo formato, filtros y alcance) mientras un job sigue en curso
+reutilizan ese job en lugar de generar otro archivo.
+"""
+import hashlib
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from payments.exports import write_settlements
+from payments.models import ExportJob, Settlement
+
+EXPORT_JOB_TTL_HOURS = getattr(settings, 'EXPORT_JOB_TTL_HOURS', 24)
+EXPORT_JOB_STALE_MINUTES = getattr(settings, 'EXPORT_JOB_STALE_MINUTES', 30)
+
+EXPORT_EXTENSIONS = {
+    'xlsx': 'xlsx',
+    'csv': 'csv',
+    'pdf_zip': 'zip',
+}
+
+IN_FLIGHT_STATUSES = ['pending', 'running']
+
+
+def normalize_export_filters(data):
+    """
+    Filtros de exportación válidos y en forma canónica (fechas ISO, sin vacíos).
+
+    Acepta start_date, end_date, status y professional.
+
+    Raises:
+        ValueError: Si alguna fecha no tiene formato ISO
+    """
+    filters = {}
+    for key in ('start_date', 'end_date'):
+        value = data.get(key)
+        if value:
+            filters[key] = datetime.fromisoformat(str(value)).date().isoformat()
+    for key in ('status', 'professional'):
+        value = data.get(key)
+        if value:
+            filters[key] = str(value)
+    return filters
+
+
+def export_fingerprint(export_format, filters, created_by_id=None):
+    """
+    Hash estable de formato + filtros + solicitante, usado para deduplicar
+    exportaciones. Incluye al solicitante porque cada usuario solo ve sus
+    propios jobs (ExportJobViewSet).
+    """
+    payload = json.dumps(
+        {'format': export_format, 'filters': filters, 'created_by': created_by_id}, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def export_queryset(filters):
+    """Liquidaciones que corresponden a los filtros (ya normalizados) de un job"""
+    conditions = Q()
+    if 'start_date' in filters:
+        conditions &= Q(period_start__gte=filters['start_date'])
+    if 'end_date' in filters:
+        conditions &= Q(period_end__lte=filters['end_date'])
+    if 'status' in filters:
+        conditions &= Q(status=filters['status'])
+    if 'professional' in filters:
+        conditions &= Q(professional_id=filters['professional'])
+    return Settlement.objects.filter(conditions).order_by('-period_end', 'id')
+
+
+def enqueue_export(export_format, filters, created_by=None):
+    """
+    Registra una exportación o reutiliza una idéntica del mismo usuario que
+    siga en curso.
+
+    Un job pendiente o en proceso deja de reutilizarse después de
+    EXPORT_JOB_STALE_MINUTES (por ejemplo si su worker murió).
+
+    Returns:
+        tuple (job, creado)
+    """
+    fingerprint = export_fingerprint(export_format, filters, getattr(created_by, 'pk', None))
+    stale_before = timezone.now() - timedelta(minutes=EXPORT_JOB_STALE_MINUTES)
+
+    job = ExportJob.objects.filter(
+        fingerprint=fingerprint,
+        status__in=IN_FLIGHT_STATUSES,
+        created_at__gte=stale_before,
+    ).order_by('-created_at').first()
+    if job is not None:
+        return job, False
+
+    job = ExportJob.objects.create(
+        format=export_format,
+        filters=filters,
+        fingerprint=fingerprint,
+        created_by=created_by,
+    )
+    return job, True
+
+
+def run_export_job(job_id):
+    """
+    Genera el archivo de un job y lo guarda en el storage por defecto.
+
+    El paso de 'pending' a 'running' es un UPDATE condicional, así un job
+    entregado dos veces por el broker solo se procesa una vez.
+
+    Returns:
+        ExportJob actualizado, o None si otro worker ya lo tomó
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', updated_at=timezone.now()
+    )
+    if not claimed:
+        return None
+
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        filename = f"liquidaciones_{timezone.localtime().strftime('%Y%m%d_%H%M%S')}.{EXPORT_EXTENSIONS[job.format]}"
+        with tempfile.TemporaryFile() as tmp:
+            job.row_count = write_settlements(job.format, export_queryset(job.filters), tmp)
+            job.file_size = tmp.tell()
+            tmp.seek(0)
+            job.file.save(filename, File(tmp), save=False)
+
+        now = timezone.now()
+        job.status = 'completed'
+        job.finished_at = now
+        job.expires_at = now + timedelta(hours=EXPORT_JOB_TTL_HOURS)
+        job.error = ''
+    except Exception as e:
+        job.status = 'failed'
+        job.finished_at = timezone.now()
+        job.error = str(e)
+
+    job.save()
+    return job
+
+
+def purge_expired_exports(now=None):
+    """
+    Elimina los archivos de exportaciones vencidas y las marca como expiradas.
+
+    Returns:
+        int: Cantidad de jobs expirados
+    """
+    now = now or timezone.now()
+    expired = 0
+    for job in ExportJob.objects.filter(status='completed', expires_at__lte=now).iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.status = 'expired'
+        job.save(update_fields=['file', 'status', 'updated_at'])
+        expired += 1
+    return expired
@@ -0,0 +1,274 @@
+"""
+Motor de exportación de liquidaciones a Excel en modo streaming
+
+Usa hojas write-only de openpyxl (las filas se escriben a disco a medida que
+se generan, sin mantener el libro en memoria) alimentadas por un iterador
+sobre una sola consulta con el profesional y su usuario ya unidos.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+STREAM_CHUNK_SIZE = 64 * 1024
+QUERY_CHUNK_SIZE = 2000
+PDF_RENDER_CHUNK_SIZE = 50
+
+SETTLEMENT_EXPORT_FIELDS = [
+    'id', 'period_start', 'period_end', 'total_attended', 'total_commission',
+    'total_discounts', 'total_retentions', 'net_amount', 'status',
+    'payment_date', 'created_at',
+    'professional__user__first_name', 'professional__user__last_name',
+    'professional__user__username',
+]
+
+THIN_SIDE = Side(style='thin')
+BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+HEADER_FONT = Font(bold=True, color="FFFFFF", size=11)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+LEFT = Alignment(horizontal='left')
+RIGHT = Alignment(horizontal='right')
+MONEY_FORMAT = '$#,##0.00'
+
+
+def professional_name(row):
+    """Equivalente a user.get_full_name() or user.username sobre una fila de values()"""
+    full_name = f"{row['professional__user__first_name']} {row['professional__user__last_name']}".strip()
+    return full_name or row['professional__user__username']
+
+
+def local_datetime(value):
+    """Fecha/hora en la zona horaria local y sin tzinfo (Excel no soporta tz)"""
+    if value is None:
+        return None
+    return timezone.localtime(value).replace(tzinfo=None)
+
+
+class Column:
+    """Definición de una columna del Excel: encabezado, ancho, valor y formato"""
+
+    def __init__(self, header, width, value, number_format=None, alignment=RIGHT):
+        self.header = header
+        self.width = width
+        self.value = value
+        self.number_format = number_format
+        self.alignment = alignment
+
+
+# Columnas de la exportación de la API (SettlementViewSet.export_excel y tareas)
+SETTLEMENT_COLUMNS = [
+    Column('ID', 10, lambda row: str(row['id']), alignment=LEFT),
+    Column('Profesional', 20, professional_name),
+    Column('Período Inicio', 15, lambda row: row['period_start'].strftime('%d/%m/%Y')),
+    Column('Período Fin', 15, lambda row: row['period_end'].strftime('%d/%m/%Y')),
+    Column('Comisión Total', 15, lambda row: row['total_commission']),
+    Column('Descuentos', 12, lambda row: row['total_discounts'] or 0),
+    Column('Monto Neto', 15, lambda row: row['net_amount']),
+    Column('Estado', 12, lambda row: row['status'].upper()),
+    Column('Fecha Creación', 15, lambda row: row['created_at'].strftime('%d/%m/%Y %H:%M')),
+]
+
+
+def settlement_rows(settlements):
+    """
+    Itera las liquidaciones como dicts con una sola consulta (profesional y
+    usuario unidos), leyendo por bloques para no cargar todo en memoria.
+    """
+    return settlements.values(*SETTLEMENT_EXPORT_FIELDS).iterator(chunk_size=QUERY_CHUNK_SIZE)
+
+
+def write_workbook(rows, columns, fileobj, title="Liquidaciones", header_color="5B6EF5", row_style=None):
+    """
+    Escribe un libro Excel write-only en fileobj.
+
+    Los estilos se crean una sola vez y se comparten entre celdas; cada fila
+    se vuelca a disco en cuanto se agrega.
+
+    Args:
+        rows: Iterable de filas (dicts)
+        columns: Lista de Column
+        fileobj: Archivo (o ruta) donde guardar el .xlsx
+        title: Nombre de la hoja
+        header_color: Color de fondo de los encabezados
+        row_style: Función opcional row -> dict(fill=..., font=...) para resaltar filas
+
+    Returns:
+        int: Cantidad de filas de datos escritas
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+
+    for index, column in enumerate(columns, 1):
+        ws.column_dimensions[get_column_letter(index)].width = column.width
+
+    header_fill = PatternFill(start_color=header_color, end_color=header_color, fill_type="solid")
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(ws, value=column.header)
+        cell.fill = header_fill
+        cell.font = HEADER_FONT
+        cell.alignment = HEADER_ALIGNMENT
+        cell.border = BORDER
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for row in rows:
+        extra = row_style(row) if row_style else None
+        cells = []
+        for column in columns:
+            cell = WriteOnlyCell(ws, value=column.value(row))
+            cell.border = BORDER
+            if column.alignment:
+                cell.alignment = column.alignment
+            if column.number_format:
+                cell.number_format = column.number_format
+            if extra:
+                for attribute, style in extra.items():
+                    setattr(cell, attribute, style)
+            cells.append(cell)
+        ws.append(cells)
+        count += 1
+
+    wb.save(fileobj)
+    return count
+
+
+def write_csv(rows, columns, fileobj):
+    """
+    Escribe las filas como CSV (UTF-8 con BOM para que Excel respete los acentos).
+
+    Returns:
+        int: Cantidad de filas de datos escritas
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    writer = csv.writer(text)
+    writer.writerow([column.header for column in columns])
+
+    count = 0
+    for row in rows:
+        writer.writerow([column.value(row) for column in columns])
+        count += 1
+
+    text.flush()
+    text.detach()
+    return count
+
+
+def pdf_workers():
+    """
+    Procesos para renderizar PDFs (PDF_EXPORT_WORKERS; 0 = según CPUs, máximo 4).
+
+    Un proceso daemon (por ejemplo un worker prefork de Celery) no puede
+    crear procesos hijos, así que en ese caso se renderiza en el mismo proceso.
+    """
+    if multiprocessing.current_process().daemon:
+        return 1
+    workers = getattr(settings, 'PDF_EXPORT_WORKERS', 0)
+    if workers <= 0:
+        workers = min(4, os.cpu_count() or 1)
+    return workers
+
+
+def render_pdf_chunks(settlements, workers):
+    """
+    Genera (nombre, bytes) por liquidación en el orden del QuerySet.
+
+    Los datos se leen por bloques de PDF_RENDER_CHUNK_SIZE (con ítems y
+    descuentos precargados) y cada bloque se renderiza en el pool.
+    """
+    from payments.reports import prefetch_settlements_for_pdf, settlement_pdf_data, render_settlement_pdf
+
+    rows = prefetch_settlements_for_pdf(settlements).iterator(chunk_size=PDF_RENDER_CHUNK_SIZE)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            chunk = [settlement_pdf_data(settlement) for settlement in islice(rows, PDF_RENDER_CHUNK_SIZE)]
+            if not chunk:
+                break
+            rendered = pool.map(render_settlement_pdf, chunk) if pool else map(render_settlement_pdf, chunk)
+            for data, pdf in zip(chunk, rendered):
+                yield f"liquidacion_{data['id']}.pdf", pdf
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def write_pdf_bundle(settlements, fileobj, workers=None):
+    """
+    Escribe un ZIP con el PDF de cada liquidación.
+
+    Los PDFs se renderizan en un pool de procesos y se agregan al ZIP a medida
+    que cada bloque termina (memoria acotada al tamaño del bloque).
+
+    Returns:
+        int: Cantidad de PDFs incluidos
+    """
+    workers = workers or pdf_workers()
+
+    count = 0
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for name, pdf in render_pdf_chunks(settlements, workers):
+            bundle.writestr(name, pdf)
+            count += 1
+    return count
+
+
+def write_settlements(export_format, settlements, fileobj):
+    """
+    Escribe las liquidaciones en el formato pedido ('xlsx', 'csv' o 'pdf_zip').
+
+    Returns:
+        int: Cantidad de registros exportados
+    """
+    if export_format == 'xlsx':
+        return write_workbook(settlement_rows(settlements), SETTLEMENT_COLUMNS, fileobj)
+    if export_format == 'csv':
+        return write_csv(settlement_rows(settlements), SETTLEMENT_COLUMNS, fileobj)
+    if export_format == 'pdf_zip':
+        return write_pdf_bundle(settlements, fileobj)
+    raise ValueError(f"Formato de exportación no soportado: {export_format}")
+
+
+def iter_file(fileobj, chunk_size=STREAM_CHUNK_SIZE):
+    """Lee un archivo por bloques y lo cierra al terminar"""
+    try:
+        fileobj.seek(0)
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def settlements_excel_response(settlements, filename, columns=SETTLEMENT_COLUMNS):
+    """
+    Respuesta HTTP en streaming con el Excel de las liquidaciones.
+
+    El libro se escribe en un archivo temporal (memoria constante) y se envía
+    por bloques con StreamingHttpResponse.
+    """
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    write_workbook(settlement_rows(settlements), columns, tmp)
+    size = tmp.tell()
+
+    response = StreamingHttpResponse(iter_file(tmp), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Content-Length'] = str(size)
+    return response
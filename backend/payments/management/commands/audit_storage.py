@@ -0,0 +1,71 @@
+"""
+Administración del almacenamiento de auditoría por meses
+
+    python manage.py audit_storage status
+    python manage.py audit_storage partition        # solo PostgreSQL
+    python manage.py audit_storage ensure
+    python manage.py audit_storage rotate --hot-months 6
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.audit_storage import (
+    AUDIT_HOT_MONTHS, ensure_partitions, existing_partitions, hot_cutoff_month,
+    is_partitioned, partition_audit_table, rotate_audit_storage
+)
+from payments.models import AuditLog, AuditArchiveSegment
+
+
+class Command(BaseCommand):
+    help = 'Particiona, rota y archiva la tabla de auditoría por meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'operation', choices=['status', 'partition', 'ensure', 'rotate'],
+            help='status: resumen; partition: convertir a tabla particionada (PostgreSQL); '
+                 'ensure: crear particiones próximas; rotate: archivar meses fuera de la ventana'
+        )
+        parser.add_argument(
+            '--hot-months', type=int, default=None,
+            help=f'Meses que se conservan en la tabla (por defecto {AUDIT_HOT_MONTHS})'
+        )
+        parser.add_argument('--months-ahead', type=int, default=None, help='Particiones futuras a crear')
+        parser.add_argument('--archive-dir', default=None, help='Directorio de los segmentos archivados')
+
+    def handle(self, *args, **options):
+        operation = options['operation']
+
+        if operation == 'partition':
+            try:
+                converted = partition_audit_table(months_ahead=options['months_ahead'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            if converted:
+                self.stdout.write(self.style.SUCCESS('Tabla de auditoría particionada por mes'))
+            else:
+                self.stdout.write('La tabla de auditoría ya estaba particionada')
+
+        elif operation == 'ensure':
+            created = ensure_partitions(months_ahead=options['months_ahead'])
+            if not is_partitioned():
+                self.stdout.write('La tabla de auditoría no está particionada')
+            for month in created:
+                self.stdout.write(f'Partición creada: {month:%m/%Y}')
+
+        elif operation == 'rotate':
+            segments = rotate_audit_storage(hot_months=options['hot_months'], archive_dir=options['archive_dir'])
+            for segment in segments:
+                self.stdout.write(f'Archivado {segment.month:%m/%Y}: {segment.row_count} registros')
+            self.stdout.write(self.style.SUCCESS(f'{len(segments)} meses archivados'))
+
+        self.show_status(options['hot_months'])
+
+    def show_status(self, hot_months):
+        self.stdout.write(f'Registros en la tabla: {AuditLog.objects.count()}')
+        self.stdout.write(f'Conservados desde: {hot_cutoff_month(hot_months):%m/%Y}')
+        if is_partitioned():
+            months = sorted(existing_partitions())
+            self.stdout.write(f'Particiones: {len(months)} ({", ".join(f"{m:%m/%Y}" for m in months)})')
+        for segment in AuditArchiveSegment.objects.order_by('month'):
+            self.stdout.write(
+                f'Archivo {segment.month:%m/%Y}: {segment.row_count} registros, {segment.file_size} bytes'
+            )
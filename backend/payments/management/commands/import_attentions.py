@@ -0,0 +1,62 @@
+"""
+Importa atenciones desde un archivo CSV o XLSX
+
+    python manage.py import_attentions atenciones.csv
+    python manage.py import_attentions historico.xlsx --dry-run --errors errores.csv
+"""
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.attention_import import ImportFileError, import_attentions, import_format
+
+
+class Command(BaseCommand):
+    help = 'Importa atenciones en lotes desde un archivo CSV o XLSX (ver payments.attention_import)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv o .xlsx')
+        parser.add_argument('--dry-run', action='store_true', help='Solo validar, sin insertar')
+        parser.add_argument('--batch-size', type=int, default=None, help='Filas por lote')
+        parser.add_argument('--errors', default=None, help='Escribir los errores por fila en este CSV')
+
+    def handle(self, *args, **options):
+        try:
+            file_format = import_format(options['path'])
+        except ImportFileError as e:
+            raise CommandError(str(e))
+
+        report_file = open(options['errors'], 'w', newline='', encoding='utf-8') if options['errors'] else None
+        try:
+            on_error = None
+            if report_file is not None:
+                writer = csv.writer(report_file)
+                writer.writerow(['row', 'field', 'error'])
+
+                def on_error(number, errors):
+                    for field, messages in errors.items():
+                        for message in messages:
+                            writer.writerow([number, field, message])
+
+            with open(options['path'], 'rb') as fileobj:
+                report = import_attentions(
+                    fileobj, file_format, batch_size=options['batch_size'],
+                    dry_run=options['dry_run'], on_error=on_error
+                )
+        except (ImportFileError, OSError) as e:
+            raise CommandError(str(e))
+        finally:
+            if report_file is not None:
+                report_file.close()
+
+        for error in report['errors']:
+            for field, messages in error['errors'].items():
+                self.stdout.write(f"Fila {error['row']} ({field}): {'; '.join(messages)}")
+        if report['errors_truncated']:
+            self.stdout.write('... (más errores omitidos; use --errors para el detalle completo)')
+
+        created = 'válidas (sin insertar)' if options['dry_run'] else 'creadas'
+        count = report['valid'] if options['dry_run'] else report['created']
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['total_rows']} filas leídas, {count} atenciones {created}, {report['failed']} con errores"
+        ))
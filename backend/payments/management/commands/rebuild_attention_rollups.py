@@ -0,0 +1,33 @@
+"""
+Reconstruye los totales diarios de atenciones (AttentionDailyRollup)
+
+    python manage.py rebuild_attention_rollups
+    python manage.py rebuild_attention_rollups --start 2026-01-01 --end 2026-01-31
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.rollups import rebuild_attention_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los totales diarios de atenciones desde las atenciones registradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Primer día (AAAA-MM-DD); por defecto desde el inicio')
+        parser.add_argument('--end', help='Último día (AAAA-MM-DD); por defecto hasta hoy')
+        parser.add_argument('--professional', help='Limitar a un profesional (id)')
+        parser.add_argument('--service', help='Limitar a un servicio (id)')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError:
+            raise CommandError('Las fechas deben tener formato AAAA-MM-DD')
+
+        created = rebuild_attention_rollups(
+            start, end, service_id=options['service'], professional_id=options['professional']
+        )
+        self.stdout.write(self.style.SUCCESS(f'{created} filas de totales diarios generadas'))
@@ -0,0 +1,28 @@
+"""
+Recalcula los contadores diarios del resumen de auditoría desde la tabla
+
+    python manage.py rebuild_audit_counts --start 2026-01-01 --end 2026-01-31
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.audit_summary import rebuild_daily_counts
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores diarios de auditoría (AuditDailyCount) en un rango de días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Primer día (AAAA-MM-DD); por defecto desde el inicio')
+        parser.add_argument('--end', help='Último día (AAAA-MM-DD); por defecto hasta hoy')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError:
+            raise CommandError('Las fechas deben tener formato AAAA-MM-DD')
+
+        created = rebuild_daily_counts(start, end)
+        self.stdout.write(self.style.SUCCESS(f'{created} contadores diarios generados'))
@@ -0,0 +1,28 @@
+"""
+Vuelve a calcular la comisión guardada en las atenciones
+
+    python manage.py restamp_commissions
+    python manage.py restamp_commissions --service <id>
+"""
+from django.core.management.base import BaseCommand
+
+from payments.commissions import restamp_attentions
+from payments.models import Attention
+from payments.rollups import rebuild_attention_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el porcentaje efectivo y la comisión guardados en las atenciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--service', help='Limitar a un servicio (id)')
+
+    def handle(self, *args, **options):
+        attentions = Attention.objects.all()
+        if options['service']:
+            attentions = attentions.filter(service_id=options['service'])
+
+        updated = restamp_attentions(attentions)
+        if updated:
+            rebuild_attention_rollups(service_id=options['service'])
+        self.stdout.write(self.style.SUCCESS(f'{updated} atenciones actualizadas'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_alter_attention_professional_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='settlementlineitem',
+            name='attention_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
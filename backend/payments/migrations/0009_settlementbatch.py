@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:22
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_settlementlineitem_attention_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('period_start', models.DateField(verbose_name='Fecha Inicio Período')),
+                ('period_end', models.DateField(verbose_name='Fecha Fin Período')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('running', 'En Proceso'), ('completed', 'Completado'), ('failed', 'Fallido')], default='pending', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total de Liquidaciones')),
+                ('done', models.PositiveIntegerField(default=0, verbose_name='Calculadas')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Fallidas')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Errores')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Término')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='settlement_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Cálculo Masivo de Liquidaciones',
+                'verbose_name_plural': 'Cálculos Masivos de Liquidaciones',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
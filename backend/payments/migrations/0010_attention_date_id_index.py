@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_settlementbatch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attention',
+            index=models.Index(fields=['-date', '-id'], name='payments_at_date_ca7051_idx'),
+        ),
+    ]
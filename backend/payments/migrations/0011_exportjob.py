@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:29
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_attention_date_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('format', models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV'), ('pdf_zip', 'PDFs (ZIP)')], max_length=10, verbose_name='Formato')),
+                ('filters', models.JSONField(blank=True, default=dict, verbose_name='Filtros')),
+                ('fingerprint', models.CharField(db_index=True, editable=False, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('running', 'En Proceso'), ('completed', 'Completado'), ('failed', 'Fallido'), ('expired', 'Expirado')], default='pending', max_length=20)),
+                ('file', models.FileField(blank=True, upload_to='exports/%Y/%m/%d/', verbose_name='Archivo')),
+                ('file_size', models.PositiveBigIntegerField(default=0, verbose_name='Tamaño (bytes)')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Registros Exportados')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Término')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Expiración')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Exportación',
+                'verbose_name_plural': 'Exportaciones',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='payments_ex_status_84c982_idx')],
+            },
+        ),
+    ]
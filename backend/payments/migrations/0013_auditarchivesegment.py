@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:41
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_auditlog_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditArchiveSegment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month', models.DateField(unique=True, verbose_name='Mes')),
+                ('path', models.CharField(max_length=500, verbose_name='Archivo')),
+                ('file_size', models.PositiveBigIntegerField(default=0, verbose_name='Tamaño (bytes)')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='Registros')),
+                ('first_created_at', models.DateTimeField(blank=True, null=True, verbose_name='Primer Registro')),
+                ('last_created_at', models.DateTimeField(blank=True, null=True, verbose_name='Último Registro')),
+                ('user_ids', models.JSONField(blank=True, default=list, verbose_name='Usuarios')),
+                ('actions', models.JSONField(blank=True, default=list, verbose_name='Acciones')),
+                ('model_names', models.JSONField(blank=True, default=list, verbose_name='Modelos')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Segmento de Auditoría Archivado',
+                'verbose_name_plural': 'Segmentos de Auditoría Archivados',
+                'ordering': ['-month'],
+            },
+        ),
+    ]
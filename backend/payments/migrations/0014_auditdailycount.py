@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_counts(apps, schema_editor):
+    """Contadores diarios de los registros de auditoría existentes"""
+    AuditLog = apps.get_model('payments', 'AuditLog')
+    AuditDailyCount = apps.get_model('payments', 'AuditDailyCount')
+    rows = (
+        AuditLog.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'user_id', 'action', 'model_name')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    AuditDailyCount.objects.bulk_create(
+        [
+            AuditDailyCount(
+                date=row['day'], user_id=row['user_id'], action=row['action'],
+                model_name=row['model_name'], count=row['total']
+            )
+            for row in rows
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0013_auditarchivesegment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('action', models.CharField(choices=[('create', 'Creado'), ('update', 'Actualizado'), ('delete', 'Eliminado'), ('status_change', 'Cambio de Estado'), ('payment', 'Pago Registrado'), ('settlement_generated', 'Liquidación Generada')], max_length=30)),
+                ('model_name', models.CharField(choices=[('User', 'Usuario'), ('Professional', 'Profesional'), ('Service', 'Servicio'), ('Attention', 'Atención'), ('Settlement', 'Liquidación'), ('Discount', 'Descuento')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Eventos')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_daily_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Conteo Diario de Auditoría',
+                'verbose_name_plural': 'Conteos Diarios de Auditoría',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'user', 'action', 'model_name')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:49
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+HUNDRED = Decimal('100')
+
+
+# Copia congelada de la aritmética de payments.money: la migración no debe
+# cambiar si cambia el código de la aplicación
+def quantize_money(value):
+    return Decimal(value or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def percentage_of(amount, percentage):
+    return Decimal(amount or 0) * Decimal(percentage or 0) / HUNDRED
+
+
+def commission_amount(amount_charged, insurance_discount_percentage, commission_percentage):
+    amount_base = Decimal(amount_charged or 0)
+    if insurance_discount_percentage and insurance_discount_percentage > 0:
+        amount_base = amount_base - percentage_of(amount_base, insurance_discount_percentage)
+    return percentage_of(amount_base, commission_percentage)
+
+
+def backfill_rollups(apps, schema_editor):
+    """Totales diarios de las atenciones existentes (misma regla que payments.rollups)"""
+    Attention = apps.get_model('payments', 'Attention')
+    AttentionDailyRollup = apps.get_model('payments', 'AttentionDailyRollup')
+
+    totals = defaultdict(lambda: [0, ZERO, ZERO, ZERO])
+    rows = Attention.objects.values_list(
+        'date', 'professional_id', 'service_id', 'health_insurance', 'status', 'amount_charged',
+        'insurance_discount_percentage', 'commission_percentage', 'service__commission_percentage'
+    ).iterator(chunk_size=2000)
+    for (date, professional_id, service_id, insurance, status, amount,
+         insurance_pct, commission_pct, service_pct) in rows:
+        if commission_pct is None:
+            commission_pct = service_pct
+        day = timezone.localdate(date) if timezone.is_aware(date) else date.date()
+        entry = totals[(day, professional_id, service_id, insurance or '', status)]
+        entry[0] += 1
+        entry[1] += quantize_money(amount)
+        entry[2] += quantize_money(percentage_of(amount, insurance_pct))
+        entry[3] += quantize_money(commission_amount(amount, insurance_pct, commission_pct))
+
+    AttentionDailyRollup.objects.bulk_create(
+        [
+            AttentionDailyRollup(
+                date=day, professional_id=professional_id, service_id=service_id, health_insurance=insurance,
+                status=status, attention_count=count, amount_charged=charged,
+                insurance_discount_amount=discount, commission_amount=commission
+            )
+            for (day, professional_id, service_id, insurance, status), (count, charged, discount, commission)
+            in totals.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0014_auditdailycount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttentionDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Fecha')),
+                ('health_insurance', models.CharField(blank=True, max_length=100, verbose_name='Aseguradora de Salud')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('completed', 'Completado'), ('cancelled', 'Cancelado')], max_length=20)),
+                ('attention_count', models.IntegerField(default=0, verbose_name='Atenciones')),
+                ('amount_charged', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Monto Cobrado')),
+                ('insurance_discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Descuento por Aseguradora')),
+                ('commission_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Comisión')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('professional', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='payments.professional')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='payments.service')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Atenciones',
+                'verbose_name_plural': 'Resúmenes Diarios de Atenciones',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['professional', 'date'], name='payments_at_profess_260766_idx')],
+                'unique_together': {('date', 'professional', 'service', 'health_insurance', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-17 04:58
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+# Copia congelada de la aritmética de payments.money: la migración no debe
+# cambiar si cambia el código de la aplicación
+def quantize_money(value):
+    return Decimal(value or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def percentage_of(amount, percentage):
+    return Decimal(amount or 0) * Decimal(percentage or 0) / HUNDRED
+
+
+def commission_amount(amount_charged, insurance_discount_percentage, commission_percentage):
+    amount_base = Decimal(amount_charged or 0)
+    if insurance_discount_percentage and insurance_discount_percentage > 0:
+        amount_base = amount_base - percentage_of(amount_base, insurance_discount_percentage)
+    return percentage_of(amount_base, commission_percentage)
+
+
+def stamp_commissions(apps, schema_editor):
+    """Comisión efectiva de las atenciones existentes (misma regla que Attention.stamp_commission)"""
+    Attention = apps.get_model('payments', 'Attention')
+
+    pending = []
+    rows = Attention.objects.values_list(
+        'id', 'amount_charged', 'insurance_discount_percentage', 'commission_percentage',
+        'service__commission_percentage'
+    ).order_by().iterator(chunk_size=2000)
+    for attention_id, amount, insurance_pct, commission_pct, service_pct in rows:
+        if commission_pct is None:
+            commission_pct = service_pct
+        pending.append(Attention(
+            id=attention_id, effective_commission_percentage=commission_pct,
+            commission_amount=quantize_money(commission_amount(amount, insurance_pct, commission_pct))
+        ))
+        if len(pending) >= 1000:
+            Attention.objects.bulk_update(pending, ['effective_commission_percentage', 'commission_amount'])
+            pending = []
+    if pending:
+        Attention.objects.bulk_update(pending, ['effective_commission_percentage', 'commission_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0015_attentiondailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attention',
+            name='commission_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Monto de Comisión'),
+        ),
+        migrations.AddField(
+            model_name='attention',
+            name='effective_commission_percentage',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=5, verbose_name='Porcentaje de Comisión Efectivo (%)'),
+        ),
+        migrations.RunPython(stamp_commissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-17 05:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_counts(apps, schema_editor):
+    """Une los contadores sin usuario duplicados (unique_together no los impedía)"""
+    AuditDailyCount = apps.get_model('payments', 'AuditDailyCount')
+    duplicates = (
+        AuditDailyCount.objects.filter(user__isnull=True)
+        .values('date', 'action', 'model_name')
+        .annotate(rows=Count('id'), total=Sum('count'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        key = {'date': row['date'], 'action': row['action'], 'model_name': row['model_name']}
+        counts = AuditDailyCount.objects.filter(user__isnull=True, **key).order_by('id')
+        keep = counts.first()
+        counts.exclude(pk=keep.pk).delete()
+        AuditDailyCount.objects.filter(pk=keep.pk).update(count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0017_auditlog_event_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_counts, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='auditdailycount',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='auditdailycount',
+            constraint=models.UniqueConstraint(fields=('date', 'user', 'action', 'model_name'), name='unique_audit_daily_count'),
+        ),
+        migrations.AddConstraint(
+            model_name='auditdailycount',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('date', 'action', 'model_name'), name='unique_audit_daily_count_without_user'),
+        ),
+    ]
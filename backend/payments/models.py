@@ -4,6 +4,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import uuid
 
+from payments.money import commission_amount, quantize_money
+
 
 class UserProfile(models.Model):
     """Perfil extendido del usuario con roles"""
@@ -146,6 +148,17 @@ class Attention(models.Model):
         null=True, blank=True
     )
     
+    # Comisión efectiva guardada (stamp_commission): evita resolver el
+    # porcentaje del servicio y recalcular el monto en cada lectura
+    effective_commission_percentage = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0, editable=False,
+        verbose_name='Porcentaje de Comisión Efectivo (%)'
+    )
+    commission_amount = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False,
+        verbose_name='Monto de Comisión'
+    )
+    
     notes = models.TextField(blank=True, verbose_name='Notas')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
     
@@ -159,6 +172,7 @@ class Attention(models.Model):
         indexes = [
             models.Index(fields=['professional', '-date']),
             models.Index(fields=['status', '-date']),
+            models.Index(fields=['-date', '-id']),
         ]
     
     def __str__(self):
@@ -174,7 +188,7 @@ class Attention(models.Model):
         3. Calcula la comisión sobre el monto neto (monto_base - descuento_aseguradora)
         
         Returns:
-            float: Monto de la comisión calculada
+            Decimal: Monto exacto de la comisión calculada (sin redondear)
             
         Ejemplo:
             Atención con $100 cobrado, 20% descuento aseguradora, 30% comisión:
@@ -186,14 +200,66 @@ class Attention(models.Model):
         if commission_pct is None:
             commission_pct = self.service.commission_percentage
         
-        # Aplicar descuento por aseguradora si existe
-        amount_base = self.amount_charged
-        if self.insurance_discount_percentage > 0:
-            discount = (amount_base * self.insurance_discount_percentage) / 100
-            amount_base = amount_base - discount
-        
-        return (amount_base * commission_pct) / 100
+        return commission_amount(self.amount_charged, self.insurance_discount_percentage, commission_pct)
+    
+    def stamp_commission(self):
+        """
+        Guarda en la atención el porcentaje efectivo y la comisión redondeada
+        a centavos. Se llama en cada save(); los cambios de comisión del
+        servicio se propagan con payments.commissions.restamp_service_commissions.
+        """
+        commission_pct = self.commission_percentage
+        if commission_pct is None:
+            commission_pct = self.service.commission_percentage
+        self.effective_commission_percentage = commission_pct
+        self.commission_amount = quantize_money(self.calculate_commission())
+    
+    def save(self, *args, **kwargs):
+        self.stamp_commission()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {
+                *update_fields, 'effective_commission_percentage', 'commission_amount'
+            }
+        super().save(*args, **kwargs)
+
 
+class AttentionDailyRollup(models.Model):
+    """
+    Totales diarios de atenciones por profesional, servicio, aseguradora y
+    estado (payments.rollups).
+    
+    Se actualizan al guardar o eliminar cada atención y permiten armar
+    reportes y el dashboard sumando pocas filas en vez de recorrer las
+    atenciones. Los montos se acumulan ya redondeados a centavos por atención.
+    """
+    
+    date = models.DateField(verbose_name='Fecha')
+    professional = models.ForeignKey(Professional, on_delete=models.CASCADE, related_name='daily_rollups')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='daily_rollups')
+    health_insurance = models.CharField(max_length=100, blank=True, verbose_name='Aseguradora de Salud')
+    status = models.CharField(max_length=20, choices=Attention.STATUS_CHOICES)
+    
+    attention_count = models.IntegerField(default=0, verbose_name='Atenciones')
+    amount_charged = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Monto Cobrado')
+    insurance_discount_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name='Descuento por Aseguradora'
+    )
+    commission_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Comisión')
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Resumen Diario de Atenciones'
+        verbose_name_plural = 'Resúmenes Diarios de Atenciones'
+        ordering = ['-date']
+        unique_together = ['date', 'professional', 'service', 'health_insurance', 'status']
+        indexes = [
+            models.Index(fields=['professional', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date:%d/%m/%Y} - {self.professional} - {self.service}: {self.attention_count}"
 
 class Discount(models.Model):
     """Modelo para gestionar descuentos y retenciones"""
@@ -333,6 +399,93 @@ class Settlement(models.Model):
         return f"Liquidación {self.professional} ({self.period_start} - {self.period_end})"
 
 
+class SettlementBatch(models.Model):
+    """Modelo para seguir el cálculo masivo de liquidaciones de un período (cierre de mes)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En Proceso'),
+        ('completed', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    period_start = models.DateField(verbose_name='Fecha Inicio Período')
+    period_end = models.DateField(verbose_name='Fecha Fin Período')
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Progreso
+    total = models.PositiveIntegerField(default=0, verbose_name='Total de Liquidaciones')
+    done = models.PositiveIntegerField(default=0, verbose_name='Calculadas')
+    failed = models.PositiveIntegerField(default=0, verbose_name='Fallidas')
+    errors = models.JSONField(default=list, blank=True, verbose_name='Errores')
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='settlement_batches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de Término')
+    
+    class Meta:
+        verbose_name = 'Cálculo Masivo de Liquidaciones'
+        verbose_name_plural = 'Cálculos Masivos de Liquidaciones'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Cierre {self.period_start} - {self.period_end} ({self.done + self.failed}/{self.total})"
+
+
+class ExportJob(models.Model):
+    """Modelo para las exportaciones generadas en segundo plano (Excel, CSV o PDFs)"""
+    
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+        ('pdf_zip', 'PDFs (ZIP)'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En Proceso'),
+        ('completed', 'Completado'),
+        ('failed', 'Fallido'),
+        ('expired', 'Expirado'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name='Formato')
+    filters = models.JSONField(default=dict, blank=True, verbose_name='Filtros')
+    # Hash de formato + filtros normalizados para no repetir exportaciones en curso
+    fingerprint = models.CharField(max_length=64, db_index=True, editable=False)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Archivo generado (bajo MEDIA_ROOT)
+    file = models.FileField(upload_to='exports/%Y/%m/%d/', blank=True, verbose_name='Archivo')
+    file_size = models.PositiveBigIntegerField(default=0, verbose_name='Tamaño (bytes)')
+    row_count = models.PositiveIntegerField(default=0, verbose_name='Registros Exportados')
+    error = models.TextField(blank=True, verbose_name='Error')
+    
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de Término')
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de Expiración')
+    
+    class Meta:
+        verbose_name = 'Exportación'
+        verbose_name_plural = 'Exportaciones'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Exportación {self.get_format_display()} ({self.get_status_display()})"
+
+
 class SettlementLineItem(models.Model):
     """Modelo para detallar los ítems de cada liquidación"""
     
@@ -349,6 +502,9 @@ class SettlementLineItem(models.Model):
     commission_percentage = models.DecimalField(max_digits=5, decimal_places=2)
     commission_amount = models.DecimalField(max_digits=10, decimal_places=2)
     
+    # Versión de la atención usada en el cálculo (para recálculo incremental)
+    attention_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -417,7 +573,8 @@ class AuditLog(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='Dirección IP')
     user_agent = models.TextField(blank=True, verbose_name='User Agent')
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Momento del evento (log_audit), no el de la escritura del lote
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         verbose_name = 'Registro de Auditoría'
@@ -427,7 +584,85 @@ class AuditLog(models.Model):
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['model_name', '-created_at']),
             models.Index(fields=['action', '-created_at']),
+            # Retención por fecha de corte (payments.retention)
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.get_action_display()} - {self.get_model_name_display()} ({self.created_at.strftime('%d/%m/%Y %H:%M')})"
+
+
+class AuditDailyCount(models.Model):
+    """
+    Contador diario de eventos de auditoría por usuario, acción y modelo.
+    
+    Se incrementa al insertar cada lote de eventos (payments.audit) y
+    alimenta el resumen de auditoría sin recorrer la tabla de registros.
+    Cuenta los eventos ocurridos: no se descuenta al purgar o archivar.
+    
+    La unicidad se declara en dos restricciones porque un UNIQUE común no
+    compara NULL como igual: los eventos sin usuario tienen su propia
+    restricción parcial. Al eliminar un usuario sus contadores se suman a los
+    de sin usuario (payments.signals).
+    """
+    
+    date = models.DateField(verbose_name='Fecha')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='audit_daily_counts')
+    action = models.CharField(max_length=30, choices=AuditLog.ACTION_CHOICES)
+    model_name = models.CharField(max_length=50, choices=AuditLog.MODEL_CHOICES)
+    count = models.PositiveIntegerField(default=0, verbose_name='Eventos')
+    
+    class Meta:
+        verbose_name = 'Conteo Diario de Auditoría'
+        verbose_name_plural = 'Conteos Diarios de Auditoría'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'user', 'action', 'model_name'],
+                name='unique_audit_daily_count'
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'action', 'model_name'],
+                condition=models.Q(user__isnull=True),
+                name='unique_audit_daily_count_without_user'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.date:%d/%m/%Y} {self.action} {self.model_name}: {self.count}"
+
+
+class AuditArchiveSegment(models.Model):
+    """
+    Mes de auditoría movido al archivo comprimido (payments.audit_storage).
+    
+    Guarda la ubicación del .jsonl.gz y los valores presentes en el mes para
+    descartar segmentos sin abrirlos al consultar el archivo con filtros.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    # Primer día del mes (UTC) que contiene el segmento
+    month = models.DateField(unique=True, verbose_name='Mes')
+    path = models.CharField(max_length=500, verbose_name='Archivo')
+    file_size = models.PositiveBigIntegerField(default=0, verbose_name='Tamaño (bytes)')
+    row_count = models.PositiveIntegerField(default=0, verbose_name='Registros')
+    
+    first_created_at = models.DateTimeField(null=True, blank=True, verbose_name='Primer Registro')
+    last_created_at = models.DateTimeField(null=True, blank=True, verbose_name='Último Registro')
+    
+    # Valores distintos del mes, para filtrar sin leer el archivo
+    user_ids = models.JSONField(default=list, blank=True, verbose_name='Usuarios')
+    actions = models.JSONField(default=list, blank=True, verbose_name='Acciones')
+    model_names = models.JSONField(default=list, blank=True, verbose_name='Modelos')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Segmento de Auditoría Archivado'
+        verbose_name_plural = 'Segmentos de Auditoría Archivados'
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f"Auditoría {self.month:%m/%Y} ({self.row_count} registros)"
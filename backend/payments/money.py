@@ -0,0 +1,60 @@
+"""
+Aritmética monetaria exacta (Decimal) para liquidaciones y reportes
+
+Todas las acumulaciones se hacen en Decimal sin pasar por float. Cada monto
+se redondea a centavos una sola vez (quantize_money) y los totales se obtienen
+sumando montos ya redondeados, por lo que la suma de los ítems coincide
+exactamente con el total guardado.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+HUNDRED = Decimal('100')
+
+
+def to_decimal(value):
+    """
+    Convierte un valor a Decimal sin pérdida de precisión.
+
+    Los float se convierten a través de su representación en texto para no
+    arrastrar los dígitos binarios (Decimal(0.1) != Decimal('0.1')).
+    """
+    if value is None:
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def quantize_money(value):
+    """Redondea un monto a centavos (ROUND_HALF_UP)"""
+    return to_decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def percentage_of(amount, percentage):
+    """Monto exacto (sin redondear) correspondiente a un porcentaje de amount"""
+    return to_decimal(amount) * to_decimal(percentage) / HUNDRED
+
+
+def commission_amount(amount_charged, insurance_discount_percentage, commission_percentage):
+    """
+    Comisión exacta (sin redondear) de una atención.
+
+    Aplica el descuento por aseguradora al monto cobrado y calcula la
+    comisión sobre el monto neto.
+    """
+    amount_base = to_decimal(amount_charged)
+    if insurance_discount_percentage and to_decimal(insurance_discount_percentage) > 0:
+        amount_base = amount_base - percentage_of(amount_base, insurance_discount_percentage)
+    return percentage_of(amount_base, commission_percentage)
+
+
+def sum_money(values):
+    """Suma exacta de montos, redondeando cada uno a centavos antes de acumular"""
+    total = ZERO
+    for value in values:
+        total += quantize_money(value)
+    return total
@@ -0,0 +1,168 @@
+"""
+Paginación por cursor (keyset) para listados que crecen sin límite
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from payments.audit_storage import archived_page
+from payments.models import AuditLog
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación keyset sobre una tupla de columnas ordenadas (por ejemplo
+    ('-date', '-id')).
+
+    En lugar de OFFSET y COUNT(*), cada página filtra las filas posteriores a
+    la última fila entregada (WHERE (date, id) < (:date, :id)), por lo que el
+    costo de una página es constante sin importar qué tan profunda sea.
+
+    Para no romper clientes existentes, si la petición usa ?page= u
+    ?ordering= se delega en PageNumberPagination.
+    """
+    ordering = ('-id',)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    fallback_class = PageNumberPagination
+    invalid_cursor_message = 'Cursor inválido'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.fallback = None
+        if 'page' in request.query_params or 'ordering' in request.query_params:
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                value = int(request.query_params[self.page_size_query_param])
+                if value > 0:
+                    return min(value, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def keyset_filter(self, position):
+        """
+        Construye la condición "fila posterior a position" respetando la
+        dirección de cada columna: (a < x) OR (a = x AND b < y) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, instance):
+        values = [str(getattr(instance, name)) for name in self.field_names()]
+        raw = json.dumps(values).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        """Valores del cursor convertidos con los campos de model (404 si no son válidos)"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise NotFound(self.invalid_cursor_message)
+            position = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.field_names(), values)
+            ]
+        except (TypeError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return [
+            timezone.make_aware(value) if isinstance(value, datetime) and timezone.is_naive(value) else value
+            for value in position
+        ]
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class AttentionPagination(KeysetPagination):
+    """Atenciones por fecha descendente; id desempata atenciones de la misma fecha"""
+    ordering = ('-date', '-id')
+
+
+class AuditLogPagination(KeysetPagination):
+    """Registros de auditoría por fecha descendente; id desempata registros del mismo instante"""
+    ordering = ('-created_at', '-id')
+    max_page_size = 200
+
+
+class AuditArchivePagination(AuditLogPagination):
+    """
+    Cursor sobre los segmentos archivados de auditoría. Mismo formato de
+    cursor y de respuesta que el listado de la tabla, pero la página la arma
+    payments.audit_storage.archived_page leyendo los archivos.
+    """
+
+    def paginate_archive(self, request, filters):
+        self.request = request
+        self.fallback = None
+        position = self.decode_cursor(request, AuditLog)
+        try:
+            self.page, self.has_next = archived_page(self.get_page_size(request), position, **filters)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        return self.page
@@ -0,0 +1,139 @@
+"""
+Caché en disco de los PDF de liquidaciones, direccionada por contenido
+
+Cada archivo se guarda como <settlement_id>-<hash>.pdf, donde el hash cubre
+los totales, el estado, el updated_at y los ítems de la liquidación. Si algo
+cambia el hash cambia y el PDF anterior simplemente deja de usarse; calculate
+además borra las versiones viejas. El directorio se mantiene bajo
+PDF_CACHE_MAX_BYTES eliminando los archivos usados hace más tiempo.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+PDF_CACHE_DIR = getattr(settings, 'PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'pdf'))
+PDF_CACHE_MAX_BYTES = getattr(settings, 'PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+# Cambiar al modificar el diseño del PDF para descartar las versiones cacheadas
+PDF_LAYOUT_VERSION = '1'
+
+
+def settlement_pdf_fingerprint(settlement):
+    """
+    Hash del contenido que determina el PDF de una liquidación.
+
+    Incluye los campos de la liquidación y un resumen de sus ítems (una
+    consulta agregada), de modo que cualquier recálculo produce otro hash.
+    """
+    items = settlement.line_items.aggregate(
+        count=Count('id'),
+        total=Sum('commission_amount'),
+        last_change=Max('attention_updated_at'),
+    )
+    parts = [
+        PDF_LAYOUT_VERSION,
+        settlement.id,
+        settlement.status,
+        settlement.professional_id,
+        settlement.period_start,
+        settlement.period_end,
+        settlement.total_attended,
+        settlement.total_commission,
+        settlement.total_discounts,
+        settlement.total_retentions,
+        settlement.net_amount,
+        settlement.updated_at.isoformat() if settlement.updated_at else '',
+        items['count'],
+        items['total'],
+        items['last_change'].isoformat() if items['last_change'] else '',
+    ]
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def cached_pdf_path(settlement_id, fingerprint):
+    return os.path.join(PDF_CACHE_DIR, f"{settlement_id}-{fingerprint}.pdf")
+
+
+def get_cached_pdf(settlement_id, fingerprint):
+    """
+    Ruta del PDF cacheado, o None si no existe.
+
+    Actualiza la fecha de modificación del archivo para que la evicción
+    elimine primero los menos usados.
+    """
+    path = cached_pdf_path(settlement_id, fingerprint)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store_pdf(settlement_id, fingerprint, content):
+    """
+    Guarda un PDF en la caché (escritura atómica) y aplica la evicción.
+
+    Returns:
+        Ruta del archivo guardado
+    """
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    path = cached_pdf_path(settlement_id, fingerprint)
+
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    evict_pdf_cache()
+    return path
+
+
+def invalidate_settlement_pdf(settlement_id):
+    """Elimina todas las versiones cacheadas del PDF de una liquidación"""
+    for path in glob.glob(os.path.join(PDF_CACHE_DIR, f"{settlement_id}-*.pdf")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def evict_pdf_cache(max_bytes=None):
+    """
+    Mantiene el directorio por debajo de max_bytes eliminando los archivos
+    usados hace más tiempo.
+
+    Returns:
+        int: Cantidad de archivos eliminados
+    """
+    max_bytes = PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    entries = []
+    total = 0
+    with os.scandir(PDF_CACHE_DIR) as scan:
+        for entry in scan:
+            if not entry.name.endswith('.pdf'):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
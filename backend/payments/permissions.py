@@ -1,20 +1,22 @@
 from rest_framework import permissions
 
+from payments.principal import request_principal
+
 
 class IsAdmin(permissions.BasePermission):
     """Permite acceso solo a administradores"""
     def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return False
         # Superusers (Django admin) tienen acceso completo
-        if request.user and request.user.is_superuser:
-            return True
         # También permite usuarios con role 'admin' en el perfil
-        return request.user and request.user.is_authenticated and hasattr(request.user, 'profile') and request.user.profile.role == 'admin'
+        return request_principal(request).is_admin_or_superuser
 
 
 class IsProfessional(permissions.BasePermission):
     """Permite acceso solo a profesionales"""
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and hasattr(request.user, 'profile') and request.user.profile.role == 'professional'
+        return request.user and request.user.is_authenticated and request_principal(request).is_professional
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -22,7 +24,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return request.user and request.user.is_authenticated
-        return request.user and request.user.is_authenticated and hasattr(request.user, 'profile') and request.user.profile.role == 'admin'
+        return request.user and request.user.is_authenticated and request_principal(request).is_admin
 
 
 class IsAdminOrOwnProfessional(permissions.BasePermission):
@@ -31,20 +33,20 @@ class IsAdminOrOwnProfessional(permissions.BasePermission):
         return request.user and request.user.is_authenticated
     
     def has_object_permission(self, request, view, obj):
+        principal = request_principal(request)
+        
         # Admin puede ver todo
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'admin':
+        if principal.is_admin:
             return True
         
         # Si es profesional, solo puede acceder a sus propios datos
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'professional':
+        if principal.is_professional:
             # Para Professional
-            if hasattr(obj, 'user'):
-                return obj.user == request.user
+            if hasattr(obj, 'user_id'):
+                return obj.user_id == request.user.pk
             # Para Attention, Service, etc - verificar si pertenecen a su profesional
-            if hasattr(obj, 'professional'):
-                return obj.professional.user == request.user
             if hasattr(obj, 'professional_id'):
-                return obj.professional_id == request.user.professional_profile.id
+                return str(obj.professional_id) == principal.professional_id
         
         return False
 
@@ -55,12 +57,14 @@ class IsAdminOrOwnAttention(permissions.BasePermission):
         return request.user and request.user.is_authenticated
     
     def has_object_permission(self, request, view, obj):
+        principal = request_principal(request)
+        
         # Admin puede ver todo
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'admin':
+        if principal.is_admin:
             return True
         
         # Profesional solo puede ver sus propias atenciones
-        if hasattr(request.user, 'profile') and request.user.profile.role == 'professional':
-            return obj.professional.user == request.user
+        if principal.is_professional:
+            return str(obj.professional_id) == principal.professional_id
         
         return False
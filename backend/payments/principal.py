@@ -0,0 +1,107 @@
+"""
+Identidad de autorización del usuario de la petición (rol y profesional)
+
+Los permisos y los filtros por rol necesitan el rol del perfil, el id del
+profesional asociado y si es superusuario. Se resuelven una sola vez por
+petición y quedan guardados en el objeto user: desde los claims del token JWT
+si los trae, o con una única consulta (perfil y profesional unidos).
+"""
+from django.contrib.auth.models import User
+
+ROLE_CLAIM = 'role'
+PROFESSIONAL_ID_CLAIM = 'professional_id'
+
+
+class Principal:
+    """Rol, profesional y superusuario de un usuario autenticado"""
+
+    __slots__ = ('user_id', 'role', 'professional_id', 'is_superuser')
+
+    def __init__(self, user_id, role=None, professional_id=None, is_superuser=False):
+        self.user_id = user_id
+        self.role = role
+        self.professional_id = professional_id
+        self.is_superuser = is_superuser
+
+    @property
+    def is_admin(self):
+        """Rol 'admin' en el perfil (no incluye superusuarios sin perfil admin)"""
+        return self.role == 'admin'
+
+    @property
+    def is_professional(self):
+        return self.role == 'professional'
+
+    @property
+    def is_admin_or_superuser(self):
+        return self.is_superuser or self.is_admin
+
+    def __repr__(self):
+        return f"Principal(user_id={self.user_id!r}, role={self.role!r}, professional_id={self.professional_id!r})"
+
+
+ANONYMOUS = Principal(None)
+
+
+def principal_from_claims(user, token):
+    """Principal construido con los claims del token, o None si no los trae"""
+    if token is None:
+        return None
+    try:
+        role = token[ROLE_CLAIM]
+    except (KeyError, TypeError):
+        return None
+    professional_id = token.get(PROFESSIONAL_ID_CLAIM)
+    return Principal(user.pk, role=role, professional_id=professional_id, is_superuser=user.is_superuser)
+
+
+def load_principal(user):
+    """Principal leído de la base de datos con una sola consulta"""
+    row = User.objects.filter(pk=user.pk).values_list('profile__role', 'professional_profile__id').first()
+    role, professional_id = row if row else (None, None)
+    return Principal(
+        user.pk,
+        role=role,
+        professional_id=str(professional_id) if professional_id else None,
+        is_superuser=user.is_superuser,
+    )
+
+
+def principal_claims(user):
+    """
+    Claims de autorización que se embeben en los tokens al emitirlos. La
+    respuesta de login_view usa el mismo rol y professional_id.
+
+    Incluye los datos que usa TokenUser (username, is_staff, is_superuser)
+    para poder atender lecturas sin cargar el usuario de la base de datos.
+    """
+    principal = get_principal(user)
+    return {
+        ROLE_CLAIM: principal.role,
+        PROFESSIONAL_ID_CLAIM: principal.professional_id,
+        'username': user.username,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+    }
+
+
+def get_principal(user, token=None):
+    """
+    Principal del usuario, resuelto una vez y guardado en el objeto user.
+
+    Args:
+        user: request.user
+        token: request.auth (token JWT validado), opcional
+    """
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    principal = getattr(user, '_principal', None)
+    if principal is None:
+        principal = principal_from_claims(user, token) or load_principal(user)
+        user._principal = principal
+    return principal
+
+
+def request_principal(request):
+    """Principal del usuario de una petición DRF"""
+    return get_principal(request.user, getattr(request, 'auth', None))
@@ -13,17 +13,141 @@ import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
+from payments.exports import Column, MONEY_FORMAT, local_datetime, settlement_rows, write_workbook
 
-def generate_settlement_pdf(settlement, filename=None):
+
+# Estilos del PDF de liquidación, creados una sola vez por proceso
+STYLES = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=STYLES['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#1e3a8a'),
+    spaceAfter=30,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+
+FOOTER_STYLE = ParagraphStyle(
+    'Footer',
+    parent=STYLES['Normal'],
+    fontSize=8,
+    textColor=colors.grey,
+    alignment=TA_CENTER
+)
+
+INFO_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 10),
+    ('FONT', (1, 0), (1, -1), 'Helvetica', 10),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+])
+
+LINE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+])
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 10),
+    ('FONT', (1, 0), (1, -1), 'Helvetica', 10),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#dcfce7')),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 11),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+DISCOUNTS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+])
+
+
+def prefetch_settlements_for_pdf(settlements):
     """
-    Genera un PDF con los detalles de una liquidación
+    Agrega al QuerySet lo que usa settlement_pdf_data: profesional y usuario
+    unidos, ítems y descuentos (con su Discount) precargados en bloque.
+    """
+    from django.db.models import Prefetch
+    from payments.models import SettlementDiscount
     
-    Args:
-        settlement: Objeto Settlement
-        filename: Nombre del archivo (opcional)
+    return settlements.select_related('professional__user').prefetch_related(
+        'line_items',
+        Prefetch('discounts_applied', queryset=SettlementDiscount.objects.select_related('discount')),
+    )
+
+
+def settlement_pdf_data(settlement):
+    """
+    Extrae de una liquidación los datos del PDF como estructuras simples
+    (serializables con pickle), para poder renderizar en otro proceso sin
+    acceso a la base de datos.
+    
+    Usa .all() sobre las relaciones, así aprovecha prefetch_settlements_for_pdf.
+    """
+    professional = settlement.professional
+    professional_name = professional.user.get_full_name()
+    
+    return {
+        'id': str(settlement.id),
+        'professional_name': professional_name,
+        'period': f"{settlement.period_start.strftime('%d/%m/%Y')} - {settlement.period_end.strftime('%d/%m/%Y')}",
+        'license_number': professional.license_number,
+        'specialization': professional.specialization,
+        'line_items': [
+            [
+                item.attendance_date.strftime('%d/%m/%Y'),
+                item.service_name[:20],
+                professional_name[:15],
+                f"${item.amount_charged:,.2f}",
+                f"{item.commission_percentage}%",
+                f"${item.commission_amount:,.2f}"
+            ]
+            for item in settlement.line_items.all()
+        ],
+        'summary': [
+            ['Total Atenciones', f"${settlement.total_attended:,.2f}"],
+            ['Total Comisión', f"${settlement.total_commission:,.2f}"],
+            ['Descuentos', f"-${settlement.total_discounts:,.2f}"],
+            ['Retenciones', f"-${settlement.total_retentions:,.2f}"],
+            ['NETO A PAGAR', f"${settlement.net_amount:,.2f}"],
+        ],
+        'discounts': [
+            [
+                discount.discount.name[:25],
+                discount.discount_type,
+                f"{discount.discount_value}{'%' if discount.discount_type == 'percentage' else '$'}",
+                f"${discount.discount_amount:,.2f}"
+            ]
+            for discount in settlement.discounts_applied.all()
+        ],
+        'generated_at': datetime.now().strftime('%d/%m/%Y %H:%M'),
+    }
+
+
+def render_settlement_pdf(data):
+    """
+    Renderiza el PDF de una liquidación a partir de settlement_pdf_data.
+    
+    No toca la base de datos ni crea estilos, por lo que puede ejecutarse en
+    un pool de procesos.
     
     Returns:
-        BytesIO con el contenido del PDF
+        bytes con el contenido del PDF
     """
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter,
@@ -31,147 +155,168 @@ def generate_settlement_pdf(settlement, filename=None):
                            leftMargin=0.5*inch, rightMargin=0.5*inch)
     
     elements = []
-    styles = getSampleStyleSheet()
     
     # Título
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1e3a8a'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    elements.append(Paragraph("OdontAll", title_style))
-    elements.append(Paragraph("Liquidación de Pago", styles['Heading2']))
+    elements.append(Paragraph("OdontAll", TITLE_STYLE))
+    elements.append(Paragraph("Liquidación de Pago", STYLES['Heading2']))
     elements.append(Spacer(1, 0.2*inch))
     
     # Información general
     info_data = [
-        ['Profesional:', settlement.professional.user.get_full_name()],
-        ['Período:', f"{settlement.period_start.strftime('%d/%m/%Y')} - {settlement.period_end.strftime('%d/%m/%Y')}"],
-        ['Licencia:', settlement.professional.license_number],
-        ['Especialidad:', settlement.professional.specialization],
+        ['Profesional:', data['professional_name']],
+        ['Período:', data['period']],
+        ['Licencia:', data['license_number']],
+        ['Especialidad:', data['specialization']],
     ]
     
     info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 10),
-        ('FONT', (1, 0), (1, -1), 'Helvetica', 10),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
+    info_table.setStyle(INFO_TABLE_STYLE)
     elements.append(info_table)
     elements.append(Spacer(1, 0.3*inch))
     
     # Detalles de atenciones
-    elements.append(Paragraph("Detalle de Atenciones", styles['Heading3']))
+    elements.append(Paragraph("Detalle de Atenciones", STYLES['Heading3']))
     
     line_items_data = [['Fecha', 'Servicio', 'Paciente', 'Monto', 'Comisión %', 'Comisión $']]
-    
-    for item in settlement.line_items.all():
-        line_items_data.append([
-            item.attendance_date.strftime('%d/%m/%Y'),
-            item.service_name[:20],
-            item.settlement.professional.user.get_full_name()[:15],
-            f"${item.amount_charged:,.2f}",
-            f"{item.commission_percentage}%",
-            f"${item.commission_amount:,.2f}"
-        ])
+    line_items_data.extend(data['line_items'])
     
     line_table = Table(line_items_data, colWidths=[1.2*inch, 1.5*inch, 1.5*inch, 1*inch, 1*inch, 1*inch])
-    line_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
+    line_table.setStyle(LINE_TABLE_STYLE)
     elements.append(line_table)
     elements.append(Spacer(1, 0.2*inch))
     
     # Resumen de liquidación
-    elements.append(Paragraph("Resumen de Liquidación", styles['Heading3']))
+    elements.append(Paragraph("Resumen de Liquidación", STYLES['Heading3']))
     
-    summary_data = [
-        ['Concepto', 'Monto'],
-        ['Total Atenciones', f"${settlement.total_attended:,.2f}"],
-        ['Total Comisión', f"${settlement.total_commission:,.2f}"],
-        ['Descuentos', f"-${settlement.total_discounts:,.2f}"],
-        ['Retenciones', f"-${settlement.total_retentions:,.2f}"],
-        ['NETO A PAGAR', f"${settlement.net_amount:,.2f}"],
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('FONT', (0, 0), (0, -1), 'Helvetica-Bold', 10),
-        ('FONT', (1, 0), (1, -1), 'Helvetica', 10),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#dcfce7')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 11),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
+    summary_table = Table([['Concepto', 'Monto']] + data['summary'], colWidths=[3*inch, 2*inch])
+    summary_table.setStyle(SUMMARY_TABLE_STYLE)
     elements.append(summary_table)
     elements.append(Spacer(1, 0.3*inch))
     
     # Descuentos y retenciones aplicados
-    if settlement.discounts_applied.exists():
-        elements.append(Paragraph("Descuentos y Retenciones", styles['Heading3']))
+    if data['discounts']:
+        elements.append(Paragraph("Descuentos y Retenciones", STYLES['Heading3']))
         
         discounts_data = [['Concepto', 'Tipo', 'Valor', 'Monto']]
-        
-        for discount in settlement.discounts_applied.all():
-            discounts_data.append([
-                discount.discount.name[:25],
-                discount.discount_type,
-                f"{discount.discount_value}{'%' if discount.discount_type == 'percentage' else '$'}",
-                f"${discount.discount_amount:,.2f}"
-            ])
+        discounts_data.extend(data['discounts'])
         
         discounts_table = Table(discounts_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        discounts_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ]))
+        discounts_table.setStyle(DISCOUNTS_TABLE_STYLE)
         elements.append(discounts_table)
     
     elements.append(Spacer(1, 0.5*inch))
     
     # Pie de página
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.grey,
-        alignment=TA_CENTER
-    )
-    
     elements.append(Paragraph(
-        f"Generado el {datetime.now().strftime('%d/%m/%Y %H:%M')} - Sistema OdontAll",
-        footer_style
+        f"Generado el {data['generated_at']} - Sistema OdontAll",
+        FOOTER_STYLE
     ))
     
     doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+
+def generate_settlement_pdf(settlement, filename=None):
+    """
+    Genera un PDF con los detalles de una liquidación
+    
+    Args:
+        settlement: Objeto Settlement
+        filename: Nombre del archivo (opcional)
+    
+    Returns:
+        BytesIO con el contenido del PDF
+    """
+    return BytesIO(render_settlement_pdf(settlement_pdf_data(settlement)))
+
+
+# Estilos del resumen de liquidación (SettlementViewSet.export_pdf)
+SUMMARY_PDF_TITLE_STYLE = ParagraphStyle(
+    'SummaryTitle',
+    parent=STYLES['Heading1'],
+    fontSize=16,
+    textColor=colors.HexColor('#333333'),
+    spaceAfter=30,
+    alignment=1
+)
+
+SUMMARY_PDF_INFO_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#333333')),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+SUMMARY_PDF_AMOUNTS_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5b6ef5')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+def render_settlement_summary_pdf(settlement):
+    """
+    Renderiza el resumen de una liquidación (datos básicos y montos).
+    
+    Returns:
+        bytes con el contenido del PDF
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, title=f"Liquidacion_{settlement.id}")
+    
+    story = []
+    
+    # Título
+    story.append(Paragraph(f"Liquidación #{settlement.id}", SUMMARY_PDF_TITLE_STYLE))
+    story.append(Spacer(1, 0.2*inch))
+    
+    # Información básica
+    professional_name = settlement.professional.user.get_full_name() or settlement.professional.user.username
+    info_data = [
+        ['Profesional:', professional_name],
+        ['Período:', f"{settlement.period_start.strftime('%d/%m/%Y')} - {settlement.period_end.strftime('%d/%m/%Y')}"],
+        ['Estado:', settlement.status.upper()],
+        ['Fecha de Generación:', settlement.created_at.strftime('%d/%m/%Y %H:%M')],
+    ]
+    
+    info_table = Table(info_data, colWidths=[2*inch, 4*inch])
+    info_table.setStyle(SUMMARY_PDF_INFO_STYLE)
+    story.append(info_table)
+    story.append(Spacer(1, 0.3*inch))
+    
+    # Tabla de montos
+    amounts_data = [
+        ['Concepto', 'Monto'],
+        ['Comisión Total', f"${settlement.total_commission:,.2f}"],
+        ['Descuentos', f"${settlement.total_discounts or 0:,.2f}"],
+        ['Monto Neto', f"${settlement.net_amount:,.2f}"],
+    ]
+    
+    amounts_table = Table(amounts_data, colWidths=[3*inch, 3*inch])
+    amounts_table.setStyle(SUMMARY_PDF_AMOUNTS_STYLE)
+    story.append(amounts_table)
+    
+    # Generar PDF
+    doc.build(story)
+    return buffer.getvalue()
 
 
 def generate_settlements_excel(settlements, filename=None):
     """
     Genera un archivo Excel con resumen de múltiples liquidaciones
     
+    Usa el motor write-only de payments.exports: una sola consulta y estilos
+    compartidos entre celdas.
+    
     Args:
         settlements: QuerySet de Settlement
         filename: Nombre del archivo (opcional)
@@ -179,76 +324,37 @@ def generate_settlements_excel(settlements, filename=None):
     Returns:
         BytesIO con el contenido del Excel
     """
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Liquidaciones"
-    
-    # Estilos
-    header_fill = PatternFill(start_color="1e3a8a", end_color="1e3a8a", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF", size=11)
-    total_fill = PatternFill(start_color="dcfce7", end_color="dcfce7", fill_type="solid")
-    total_font = Font(bold=True, size=10)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    from payments.models import Settlement
+    
+    status_labels = dict(Settlement.STATUS_CHOICES)
+    paid_style = {
+        'fill': PatternFill(start_color="dcfce7", end_color="dcfce7", fill_type="solid"),
+        'font': Font(bold=True, size=10),
+    }
+    
+    def money(header, width, field):
+        return Column(header, width, lambda row: row[field], number_format=MONEY_FORMAT)
+    
+    columns = [
+        Column('Profesional', 25, lambda row: f"{row['professional__user__first_name']} {row['professional__user__last_name']}".strip(), alignment=None),
+        Column('Período Inicio', 15, lambda row: row['period_start'], alignment=None),
+        Column('Período Fin', 15, lambda row: row['period_end'], alignment=None),
+        money('Total Atenciones', 15, 'total_attended'),
+        money('Total Comisión', 15, 'total_commission'),
+        money('Descuentos', 12, 'total_discounts'),
+        money('Retenciones', 12, 'total_retentions'),
+        money('Neto a Pagar', 15, 'net_amount'),
+        Column('Estado', 12, lambda row: status_labels.get(row['status'], row['status']), alignment=None),
+        Column('Fecha Pago', 15, lambda row: local_datetime(row['payment_date']), alignment=None),
+    ]
     
-    # Encabezado
-    headers = ['Profesional', 'Período Inicio', 'Período Fin', 'Total Atenciones', 
-               'Total Comisión', 'Descuentos', 'Retenciones', 'Neto a Pagar', 'Estado', 'Fecha Pago']
-    
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border
-    
-    # Datos
-    for row, settlement in enumerate(settlements, 2):
-        ws.cell(row=row, column=1).value = settlement.professional.user.get_full_name()
-        ws.cell(row=row, column=2).value = settlement.period_start
-        ws.cell(row=row, column=3).value = settlement.period_end
-        ws.cell(row=row, column=4).value = float(settlement.total_attended)
-        ws.cell(row=row, column=5).value = float(settlement.total_commission)
-        ws.cell(row=row, column=6).value = float(settlement.total_discounts)
-        ws.cell(row=row, column=7).value = float(settlement.total_retentions)
-        ws.cell(row=row, column=8).value = float(settlement.net_amount)
-        ws.cell(row=row, column=9).value = settlement.get_status_display()
-        ws.cell(row=row, column=10).value = settlement.payment_date
-        
-        # Aplicar estilos
-        for col in range(1, len(headers) + 1):
-            cell = ws.cell(row=row, column=col)
-            cell.border = border
-            
-            # Formato de moneda para columnas de dinero
-            if col in [4, 5, 6, 7, 8]:
-                cell.number_format = '$#,##0.00'
-                cell.alignment = Alignment(horizontal='right')
-            
-            # Fondo para total
-            if settlement.status == 'paid':
-                cell.fill = total_fill
-                cell.font = total_font
-    
-    # Ajustar ancho de columnas
-    ws.column_dimensions['A'].width = 25
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 15
-    ws.column_dimensions['E'].width = 15
-    ws.column_dimensions['F'].width = 12
-    ws.column_dimensions['G'].width = 12
-    ws.column_dimensions['H'].width = 15
-    ws.column_dimensions['I'].width = 12
-    ws.column_dimensions['J'].width = 15
-    
-    # Guardar en BytesIO
     buffer = BytesIO()
-    wb.save(buffer)
+    write_workbook(
+        settlement_rows(settlements),
+        columns,
+        buffer,
+        header_color="1e3a8a",
+        row_style=lambda row: paid_style if row['status'] == 'paid' else None
+    )
     buffer.seek(0)
     return buffer
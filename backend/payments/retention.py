@@ -0,0 +1,117 @@
+"""
+Retención de la tabla de auditoría por lotes
+
+Elimina los AuditLog anteriores a una fecha de corte en lotes acotados por
+clave primaria (cada DELETE bloquea solo ese lote), con un presupuesto de
+tiempo por ejecución. Opcionalmente archiva las filas eliminadas en un
+JSONL comprimido antes de borrarlas.
+"""
+import gzip
+import json
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from payments.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_RETENTION_BATCH_SIZE = getattr(settings, 'AUDIT_RETENTION_BATCH_SIZE', 5000)
+AUDIT_RETENTION_TIME_BUDGET = getattr(settings, 'AUDIT_RETENTION_TIME_BUDGET', 300)
+AUDIT_ARCHIVE_DIR = getattr(settings, 'AUDIT_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive', 'audit'))
+
+AUDIT_ARCHIVE_FIELDS = [
+    'id', 'user_id', 'action', 'model_name', 'object_id', 'object_description',
+    'changes', 'old_values', 'new_values', 'ip_address', 'user_agent', 'created_at',
+]
+
+
+def archive_path(cutoff, archive_dir=None):
+    """Archivo JSONL comprimido para una ejecución de limpieza"""
+    archive_dir = archive_dir or AUDIT_ARCHIVE_DIR
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(archive_dir, f"audit_before_{cutoff:%Y%m%d}_{stamp}.jsonl.gz")
+
+
+def purge_audit_logs(cutoff, batch_size=None, time_budget=None, archive=False, archive_dir=None, progress=None,
+                     since=None):
+    """
+    Elimina los registros de auditoría anteriores a cutoff, por lotes.
+
+    Cada lote toma las PKs más antiguas con el índice de created_at y las
+    elimina con un DELETE ... WHERE id IN (...). AuditLog no tiene relaciones
+    inversas ni señales de borrado, así que Django lo resuelve sin cargar los
+    objetos. Al agotarse time_budget la ejecución se detiene después del lote
+    en curso y el resultado indica que quedan registros.
+
+    Args:
+        cutoff: Fecha/hora de corte (se eliminan los anteriores)
+        batch_size: Filas por lote (AUDIT_RETENTION_BATCH_SIZE)
+        time_budget: Segundos máximos de la ejecución (AUDIT_RETENTION_TIME_BUDGET; 0 = sin límite)
+        archive: Si True, escribe las filas en un .jsonl.gz antes de eliminarlas
+        archive_dir: Directorio del archivo (AUDIT_ARCHIVE_DIR)
+        progress: Función opcional progress(deleted, batches) llamada después de cada lote
+        since: Si se indica, solo se eliminan los registros desde esta fecha (rango [since, cutoff))
+
+    Returns:
+        dict con 'deleted', 'batches', 'complete', 'elapsed' y 'archive' (ruta o None)
+    """
+    batch_size = batch_size or AUDIT_RETENTION_BATCH_SIZE
+    time_budget = AUDIT_RETENTION_TIME_BUDGET if time_budget is None else time_budget
+
+    started = time.monotonic()
+    expired = AuditLog.objects.filter(created_at__lt=cutoff)
+    if since is not None:
+        expired = expired.filter(created_at__gte=since)
+    expired = expired.order_by('created_at', 'id')
+
+    archive_file = None
+    path = None
+    deleted = 0
+    batches = 0
+    complete = False
+
+    try:
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                complete = True
+                break
+
+            if archive:
+                if archive_file is None:
+                    path = archive_path(cutoff, archive_dir)
+                    archive_file = gzip.open(path, 'wt', encoding='utf-8')
+                for row in AuditLog.objects.filter(id__in=ids).values(*AUDIT_ARCHIVE_FIELDS).iterator():
+                    archive_file.write(json.dumps(row, cls=DjangoJSONEncoder))
+                    archive_file.write('\n')
+                # El archivo queda en disco antes de borrar el lote
+                archive_file.flush()
+
+            batch_deleted, _ = AuditLog.objects.filter(id__in=ids).delete()
+            deleted += batch_deleted
+            batches += 1
+
+            logger.info(f"Limpieza de auditoría: lote {batches}, {deleted} registros eliminados")
+            if progress:
+                progress(deleted, batches)
+
+            # Siempre se procesa al menos un lote, así cada ejecución avanza
+            if time_budget and time.monotonic() - started >= time_budget:
+                break
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+
+    return {
+        'deleted': deleted,
+        'batches': batches,
+        'complete': complete,
+        'elapsed': round(time.monotonic() - started, 3),
+        'archive': path,
+    }
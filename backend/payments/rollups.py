@@ -0,0 +1,236 @@
+"""
+Totales diarios de atenciones precalculados (AttentionDailyRollup)
+
+Cada fila acumula las atenciones de un día (zona horaria local) por
+profesional, servicio, aseguradora y estado: cantidad, monto cobrado,
+descuento por aseguradora y comisión. Al guardar o eliminar una atención
+(signals) se aplica la diferencia entre su aporte anterior y el nuevo; las
+filas pueden reconstruirse desde las atenciones con
+manage.py rebuild_attention_rollups.
+
+Los montos se redondean a centavos por atención antes de acumular, igual
+que en las liquidaciones (payments.money.sum_money), por lo que los totales
+coinciden exactamente con los calculados atención por atención. La comisión
+es la guardada en la atención (Attention.commission_amount).
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from payments.models import Attention, AttentionDailyRollup
+from payments.money import ZERO, percentage_of, quantize_money
+
+ROLLUP_KEY_FIELDS = ('date', 'professional_id', 'service_id', 'health_insurance', 'status')
+
+# Columnas de una atención que determinan su aporte
+CONTRIBUTION_FIELDS = (
+    'date', 'professional_id', 'service_id', 'health_insurance', 'status', 'amount_charged',
+    'insurance_discount_percentage', 'commission_amount',
+)
+
+MONEY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+ROLLUP_GROUPS = {
+    'date': ('date',),
+    'professional': ('professional_id', 'professional__user__first_name', 'professional__user__last_name'),
+    'service': ('service_id', 'service__name', 'service__code'),
+    'health_insurance': ('health_insurance',),
+    'status': ('status',),
+}
+
+
+def attention_day(value):
+    """Día local de la fecha/hora de una atención"""
+    if timezone.is_aware(value):
+        return timezone.localdate(value)
+    return value.date()
+
+
+def contribution(date, professional_id, service_id, health_insurance, status,
+                 amount_charged, insurance_discount_percentage, commission):
+    """
+    Aporte de una atención a su fila diaria.
+
+    Returns:
+        (clave, [cantidad, cobrado, descuento aseguradora, comisión])
+    """
+    key = (attention_day(date), professional_id, service_id, health_insurance or '', status)
+    return key, [
+        1,
+        quantize_money(amount_charged),
+        quantize_money(percentage_of(amount_charged, insurance_discount_percentage or 0)),
+        quantize_money(commission),
+    ]
+
+
+def row_contribution(row):
+    """Aporte a partir de una fila con CONTRIBUTION_FIELDS"""
+    return contribution(*row)
+
+
+def instance_contribution(attention):
+    """Aporte de una atención en memoria (con su comisión ya sellada)"""
+    return contribution(
+        attention.date, attention.professional_id, attention.service_id, attention.health_insurance,
+        attention.status, attention.amount_charged, attention.insurance_discount_percentage,
+        attention.commission_amount
+    )
+
+
+def stored_contribution(attention_id):
+    """Aporte de la atención tal como está guardada, o None si no existe"""
+    row = Attention.objects.filter(pk=attention_id).values_list(*CONTRIBUTION_FIELDS).first()
+    return row_contribution(row) if row else None
+
+
+def add_contribution(deltas, entry, sign=1):
+    """Suma (sign=1) o resta (sign=-1) un aporte al acumulado deltas"""
+    key, values = entry
+    totals = deltas[key]
+    for index, value in enumerate(values):
+        totals[index] += sign * value
+
+
+def new_deltas():
+    return defaultdict(lambda: [0, ZERO, ZERO, ZERO])
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Aplica diferencias a las filas diarias con una actualización F() por
+    fila; si la fila no existe se crea, y si otro proceso la creó en
+    paralelo se actualiza. Las filas que quedan sin atenciones se eliminan.
+    """
+    for key, (count, charged, discount, commission) in deltas.items():
+        if not count and not charged and not discount and not commission:
+            continue
+        lookup = dict(zip(ROLLUP_KEY_FIELDS, key))
+        pk = AttentionDailyRollup.objects.filter(**lookup).values_list('pk', flat=True).first()
+        if pk is None:
+            if count <= 0:
+                # Nada que descontar (por ejemplo, la fila ya se eliminó en cascada)
+                continue
+            try:
+                with transaction.atomic():
+                    AttentionDailyRollup.objects.create(
+                        attention_count=count, amount_charged=charged,
+                        insurance_discount_amount=discount, commission_amount=commission, **lookup
+                    )
+                continue
+            except IntegrityError:
+                pk = AttentionDailyRollup.objects.filter(**lookup).values_list('pk', flat=True).first()
+
+        AttentionDailyRollup.objects.filter(pk=pk).update(
+            attention_count=F('attention_count') + count,
+            amount_charged=F('amount_charged') + charged,
+            insurance_discount_amount=F('insurance_discount_amount') + discount,
+            commission_amount=F('commission_amount') + commission,
+            updated_at=timezone.now(),
+        )
+        if count < 0:
+            AttentionDailyRollup.objects.filter(pk=pk, attention_count__lte=0).delete()
+
+
+def record_attention_change(previous=None, current=None):
+    """Mueve el aporte de una atención de previous a current (cualquiera puede ser None)"""
+    deltas = new_deltas()
+    if previous is not None:
+        add_contribution(deltas, previous, -1)
+    if current is not None:
+        add_contribution(deltas, current)
+    with transaction.atomic():
+        apply_rollup_deltas(deltas)
+
+
+def record_created_attentions(attentions):
+    """
+    Suma a los totales diarios atenciones insertadas sin save() (bulk_create,
+    que no dispara las señales). Debe llamarse en la misma transacción.
+    """
+    deltas = new_deltas()
+    for attention in attentions:
+        add_contribution(deltas, instance_contribution(attention))
+    apply_rollup_deltas(deltas)
+
+
+def rebuild_attention_rollups(start=None, end=None, service_id=None, professional_id=None):
+    """
+    Reconstruye las filas diarias desde las atenciones (una consulta
+    recorrida con iterator), opcionalmente limitadas a un rango de días, un
+    servicio o un profesional.
+
+    Returns:
+        int: Filas generadas
+    """
+    attentions = Attention.objects.all()
+    rollups = AttentionDailyRollup.objects.all()
+    if start:
+        attentions = attentions.filter(date__date__gte=start)
+        rollups = rollups.filter(date__gte=start)
+    if end:
+        attentions = attentions.filter(date__date__lte=end)
+        rollups = rollups.filter(date__lte=end)
+    if service_id:
+        attentions = attentions.filter(service_id=service_id)
+        rollups = rollups.filter(service_id=service_id)
+    if professional_id:
+        attentions = attentions.filter(professional_id=professional_id)
+        rollups = rollups.filter(professional_id=professional_id)
+
+    totals = new_deltas()
+    for row in attentions.values_list(*CONTRIBUTION_FIELDS).iterator(chunk_size=2000):
+        add_contribution(totals, row_contribution(row))
+
+    rows = [
+        AttentionDailyRollup(
+            attention_count=count, amount_charged=charged, insurance_discount_amount=discount,
+            commission_amount=commission, **dict(zip(ROLLUP_KEY_FIELDS, key))
+        )
+        for key, (count, charged, discount, commission) in totals.items()
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        AttentionDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def money_sum(field, **extra):
+    """Sum de un campo monetario que retorna 0 en lugar de None"""
+    return Coalesce(Sum(field, **extra), Value(ZERO), output_field=MONEY_FIELD)
+
+
+def rollup_sums():
+    return {
+        'count': Coalesce(Sum('attention_count'), 0),
+        'total_charged': money_sum('amount_charged'),
+        'total_insurance_discount': money_sum('insurance_discount_amount'),
+        'total_commission': money_sum('commission_amount'),
+    }
+
+
+def rounded_totals(row):
+    """Montos de un resultado agregado redondeados a centavos (SQLite suma en coma flotante)"""
+    for field in ('total_charged', 'total_insurance_discount', 'total_commission'):
+        row[field] = quantize_money(row[field])
+    return row
+
+
+def rollup_totals(rollups):
+    """Totales (cantidad y montos) de un conjunto de filas diarias"""
+    return rounded_totals(rollups.order_by().aggregate(**rollup_sums()))
+
+
+def rollup_breakdown(rollups, group_by):
+    """
+    Totales agrupados por una dimensión de ROLLUP_GROUPS, con una consulta.
+
+    Returns:
+        list de dicts con las columnas del grupo y los totales
+    """
+    rows = rollups.order_by().values(*ROLLUP_GROUPS[group_by]).annotate(
+        **rollup_sums()
+    ).order_by(*ROLLUP_GROUPS[group_by][:1])
+    return [rounded_totals(row) for row in rows]
@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.urls import reverse
 from payments.models import (
-    Professional, Service, Attention, Discount, InsuranceDiscount,
-    Settlement, SettlementLineItem, SettlementDiscount, UserProfile, AuditLog
+    Professional, Service, Attention, Discount, InsuranceDiscount, ExportJob,
+    Settlement, SettlementBatch, SettlementLineItem, SettlementDiscount, UserProfile, AuditLog, AuditArchiveSegment
 )
 
 
@@ -188,13 +189,14 @@ class AttentionSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'professional', 'professional_name', 'service', 'service_name',
             'patient_name', 'patient_id', 'health_insurance', 'date', 'amount_charged',
-            'insurance_discount_percentage', 'commission_percentage', 'calculated_commission', 
-            'notes', 'status', 'created_at', 'updated_at'
+            'insurance_discount_percentage', 'commission_percentage', 'effective_commission_percentage',
+            'calculated_commission', 'notes', 'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'effective_commission_percentage', 'created_at', 'updated_at']
     
     def get_calculated_commission(self, obj):
-        return float(obj.calculate_commission())
+        # Comisión guardada en la atención (Attention.stamp_commission)
+        return float(obj.commission_amount)
 
 
 class DiscountSerializer(serializers.ModelSerializer):
@@ -267,6 +269,44 @@ class SettlementCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class SettlementBatchSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = SettlementBatch
+        fields = [
+            'id', 'period_start', 'period_end', 'status', 'total', 'done', 'failed',
+            'progress', 'errors', 'created_by', 'created_at', 'updated_at', 'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_progress(self, obj):
+        """Porcentaje de liquidaciones procesadas (calculadas o fallidas)"""
+        if not obj.total:
+            return 100.0
+        return round((obj.done + obj.failed) * 100 / obj.total, 2)
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'format', 'filters', 'status', 'row_count', 'file_size', 'error',
+            'download_url', 'created_by', 'created_at', 'updated_at', 'finished_at', 'expires_at'
+        ]
+        read_only_fields = fields
+    
+    def get_download_url(self, obj):
+        """URL de descarga, solo disponible cuando el archivo está generado"""
+        if obj.status != 'completed' or not obj.file:
+            return None
+        url = reverse('export-job-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
 class InsuranceDiscountSerializer(serializers.ModelSerializer):
     class Meta:
         model = InsuranceDiscount
@@ -295,3 +335,23 @@ class AuditLogSerializer(serializers.ModelSerializer):
             'model_name', 'model_display', 'changes', 'old_values', 'new_values',
             'ip_address', 'user_agent', 'created_at'
         ]
+
+
+class AuditLogCompactSerializer(AuditLogSerializer):
+    """Registro de auditoría sin los valores anteriores y nuevos completos (listados)"""
+    
+    class Meta(AuditLogSerializer.Meta):
+        fields = [
+            field for field in AuditLogSerializer.Meta.fields if field not in ('old_values', 'new_values')
+        ]
+        read_only_fields = fields
+
+
+class AuditArchiveSegmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AuditArchiveSegment
+        fields = [
+            'id', 'month', 'row_count', 'file_size', 'first_created_at', 'last_created_at',
+            'actions', 'model_names', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,432 @@
+"""
+Motor de cálculo de liquidaciones basado en operaciones de conjunto
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from payments.models import (
+    Attention, Discount, Professional, Settlement, SettlementBatch,
+    SettlementLineItem, SettlementDiscount
+)
+from payments.money import percentage_of, quantize_money, sum_money
+from payments.pdf_cache import invalidate_settlement_pdf
+from payments.rollups import money_sum
+
+
+def settlement_attentions(settlement):
+    """Atenciones completadas del profesional dentro del período de la liquidación"""
+    return Attention.objects.filter(
+        professional_id=settlement.professional_id,
+        date__date__gte=settlement.period_start,
+        date__date__lte=settlement.period_end,
+        status='completed'
+    )
+
+
+def commission_rows(attentions):
+    """
+    Recorre las atenciones con una sola consulta y entrega, por fila, los datos
+    del ítem de liquidación con la comisión ya redondeada a centavos.
+
+    El porcentaje efectivo y la comisión son los guardados en la atención
+    (Attention.stamp_commission), sin consultar el servicio ni recalcular.
+
+    Yields:
+        tuple (attention_id, date, amount_charged, service_name, service_code,
+               commission_percentage, commission_amount, updated_at)
+    """
+    rows = attentions.values_list(
+        'id', 'date', 'amount_charged', 'service__name', 'service__code',
+        'effective_commission_percentage', 'commission_amount', 'updated_at'
+    ).order_by()
+    return rows.iterator(chunk_size=2000)
+
+
+def lock_settlement(settlement):
+    """
+    Bloquea la fila de la liquidación hasta el fin de la transacción y copia
+    en la instancia los valores confirmados: dos cálculos simultáneos de la
+    misma liquidación (p. ej. calculate desde la UI y el cierre de período)
+    se ejecutan uno detrás del otro y el segundo parte del resultado del
+    primero, no de una copia en memoria.
+    """
+    locked = Settlement.objects.select_for_update().get(pk=settlement.pk)
+    for field in Settlement._meta.concrete_fields:
+        setattr(settlement, field.attname, getattr(locked, field.attname))
+    return settlement
+
+
+def line_item_totals(settlement):
+    """
+    Total atendido y comisión total de los ítems guardados de una
+    liquidación, con una sola consulta agregada.
+
+    Returns:
+        tuple (total_atendido, total_comision)
+    """
+    totals = SettlementLineItem.objects.filter(settlement=settlement).order_by().aggregate(
+        total_attended=money_sum('amount_charged'),
+        total_commission=money_sum('commission_amount'),
+    )
+    return quantize_money(totals['total_attended']), quantize_money(totals['total_commission'])
+
+
+def fill_line_item(line_item, row):
+    """Copia en un SettlementLineItem los datos de una fila de commission_rows"""
+    (attention_id, date, amount_charged, service_name, service_code,
+     commission_percentage, commission, updated_at) = row
+    line_item.attention_id = attention_id
+    line_item.service_name = service_name
+    line_item.service_code = service_code
+    line_item.attendance_date = date.date()
+    line_item.amount_charged = amount_charged
+    line_item.commission_percentage = commission_percentage
+    line_item.commission_amount = commission
+    line_item.attention_updated_at = updated_at
+    return line_item
+
+
+def build_line_items(settlement, attentions):
+    """
+    Construye (sin guardar) los SettlementLineItem de una liquidación a
+    partir de una sola consulta con las comisiones ya calculadas.
+
+    Returns:
+        tuple (lista de SettlementLineItem, total_atendido, total_comision)
+    """
+    line_items = [
+        fill_line_item(SettlementLineItem(settlement=settlement), row)
+        for row in commission_rows(attentions)
+    ]
+    total_attended = sum_money(line_item.amount_charged for line_item in line_items)
+    total_commission = sum_money(line_item.commission_amount for line_item in line_items)
+    return line_items, total_attended, total_commission
+
+
+def build_discounts(settlement, total_commission):
+    """
+    Construye (sin guardar) los SettlementDiscount para los descuentos y
+    retenciones activos del sistema.
+
+    Returns:
+        tuple (lista de SettlementDiscount, total_descuentos, total_retenciones)
+    """
+    applied = []
+    amounts = {'discount': [], 'retention': []}
+
+    for discount in Discount.objects.filter(is_active=True, category__in=['discount', 'retention']):
+        if discount.discount_type == 'percentage':
+            discount_amount = quantize_money(percentage_of(total_commission, discount.value))
+        else:
+            discount_amount = quantize_money(discount.value)
+        amounts[discount.category].append(discount_amount)
+
+        applied.append(SettlementDiscount(
+            settlement=settlement,
+            discount=discount,
+            discount_type=discount.discount_type,
+            discount_value=discount.value,
+            discount_amount=discount_amount
+        ))
+
+    return applied, sum_money(amounts['discount']), sum_money(amounts['retention'])
+
+
+def sync_discounts(settlement, total_commission):
+    """
+    Actualiza los SettlementDiscount existentes escribiendo solo las
+    diferencias (descuentos nuevos, eliminados o con monto distinto).
+
+    Returns:
+        tuple (total_descuentos, total_retenciones)
+    """
+    wanted, total_discounts, total_retentions = build_discounts(settlement, total_commission)
+    existing = {
+        applied.discount_id: applied
+        for applied in SettlementDiscount.objects.filter(settlement=settlement)
+    }
+
+    to_create = []
+    to_update = []
+    for applied in wanted:
+        current = existing.pop(applied.discount_id, None)
+        if current is None:
+            to_create.append(applied)
+        elif (current.discount_amount != applied.discount_amount
+              or current.discount_value != applied.discount_value
+              or current.discount_type != applied.discount_type):
+            current.discount_type = applied.discount_type
+            current.discount_value = applied.discount_value
+            current.discount_amount = applied.discount_amount
+            to_update.append(current)
+
+    if existing:
+        SettlementDiscount.objects.filter(id__in=[d.id for d in existing.values()]).delete()
+    if to_update:
+        SettlementDiscount.objects.bulk_update(
+            to_update, ['discount_type', 'discount_value', 'discount_amount']
+        )
+    if to_create:
+        SettlementDiscount.objects.bulk_create(to_create)
+
+    return total_discounts, total_retentions
+
+
+def apply_totals(settlement, total_attended, total_commission, total_discounts, total_retentions):
+    """Asigna los totales y el monto neto a la liquidación (sin guardar)"""
+    settlement.total_attended = total_attended
+    settlement.total_commission = total_commission
+    settlement.total_discounts = total_discounts
+    settlement.total_retentions = total_retentions
+    settlement.net_amount = total_commission - total_discounts - total_retentions
+
+
+@transaction.atomic
+def calculate_settlement(settlement):
+    """
+    Calcula los montos de una liquidación con un número constante de consultas.
+
+    1. Obtiene en una sola consulta las atenciones con su porcentaje de
+       comisión efectivo y su comisión guardados (Attention.stamp_commission)
+    2. Inserta todos los SettlementLineItem con un único bulk_create
+    3. Acumula los totales en Decimal exacto (payments.money): la comisión
+       total es la suma de las comisiones de los ítems, sin desfase de redondeo
+    4. Aplica descuentos y retenciones activos con otro bulk_create
+
+    Args:
+        settlement (Settlement): La liquidación a calcular
+
+    Returns:
+        Settlement: La misma liquidación con sus totales actualizados
+    """
+    lock_settlement(settlement)
+    attentions = settlement_attentions(settlement)
+
+    # Limpiar ítems previos
+    SettlementLineItem.objects.filter(settlement=settlement).delete()
+    SettlementDiscount.objects.filter(settlement=settlement).delete()
+
+    line_items, total_attended, total_commission = build_line_items(settlement, attentions)
+    SettlementLineItem.objects.bulk_create(line_items, batch_size=1000)
+
+    discounts, total_discounts, total_retentions = build_discounts(settlement, total_commission)
+    SettlementDiscount.objects.bulk_create(discounts)
+
+    apply_totals(settlement, total_attended, total_commission, total_discounts, total_retentions)
+    settlement.save()
+
+    # Los PDF cacheados de la versión anterior ya no se van a servir
+    transaction.on_commit(lambda: invalidate_settlement_pdf(settlement.id))
+
+    return settlement
+
+
+@transaction.atomic
+def recalculate_settlement(settlement):
+    """
+    Recalcula una liquidación de forma incremental.
+
+    Compara las atenciones completadas del período (id, updated_at y
+    porcentaje de comisión efectivo) con los SettlementLineItem existentes e
+    inserta, actualiza o elimina solo las diferencias, por lo que recalcular
+    una liquidación grande después de una corrección solo escribe las filas
+    afectadas. Los totales se vuelven a agregar desde los ítems guardados.
+
+    La fila de la liquidación se bloquea (lock_settlement) antes de leer los
+    ítems, de modo que dos recálculos simultáneos no duplican ítems ni
+    ajustan totales sobre una base desactualizada.
+
+    Si la liquidación nunca se calculó o tiene ítems sin marca de versión
+    (calculados antes de existir attention_updated_at), hace un cálculo completo.
+
+    Args:
+        settlement (Settlement): La liquidación a recalcular
+
+    Returns:
+        dict con 'mode' ('full' o 'incremental') y los contadores
+        'inserted', 'updated' y 'deleted'
+    """
+    lock_settlement(settlement)
+
+    existing = {}
+    stale = []
+    for line_item in SettlementLineItem.objects.filter(settlement=settlement).only(
+        'id', 'attention_id', 'attention_updated_at', 'commission_percentage'
+    ):
+        if line_item.attention_id is None or line_item.attention_id in existing:
+            stale.append(line_item)
+        else:
+            existing[line_item.attention_id] = line_item
+
+    needs_full = settlement.status == 'draft' or any(
+        line_item.attention_updated_at is None for line_item in existing.values()
+    )
+    if needs_full:
+        calculate_settlement(settlement)
+        return {
+            'mode': 'full',
+            'inserted': settlement.line_items.count(),
+            'updated': 0,
+            'deleted': 0,
+        }
+
+    attentions = settlement_attentions(settlement)
+    current = {
+        attention_id: (updated_at, commission_percentage)
+        for attention_id, updated_at, commission_percentage in attentions.values_list(
+            'id', 'updated_at', 'effective_commission_percentage'
+        ).order_by()
+    }
+
+    # Ítems cuya atención salió del período, se canceló o se eliminó
+    to_delete = stale + [
+        line_item for attention_id, line_item in existing.items()
+        if attention_id not in current
+    ]
+
+    # Atenciones nuevas o modificadas desde el último cálculo
+    changed_ids = [
+        attention_id for attention_id, (updated_at, commission_percentage) in current.items()
+        if attention_id not in existing
+        or existing[attention_id].attention_updated_at != updated_at
+        or existing[attention_id].commission_percentage != commission_percentage
+    ]
+
+    to_create = []
+    to_update = []
+    if changed_ids:
+        for row in commission_rows(attentions.filter(id__in=changed_ids)):
+            line_item = existing.get(row[0])
+            if line_item is None:
+                to_create.append(fill_line_item(SettlementLineItem(settlement=settlement), row))
+            else:
+                to_update.append(fill_line_item(line_item, row))
+
+    if to_delete:
+        SettlementLineItem.objects.filter(id__in=[item.id for item in to_delete]).delete()
+    if to_update:
+        SettlementLineItem.objects.bulk_update(to_update, [
+            'service_name', 'service_code', 'attendance_date', 'amount_charged',
+            'commission_percentage', 'commission_amount', 'attention_updated_at'
+        ], batch_size=1000)
+    if to_create:
+        SettlementLineItem.objects.bulk_create(to_create, batch_size=1000)
+
+    total_attended, total_commission = line_item_totals(settlement)
+    total_discounts, total_retentions = sync_discounts(settlement, total_commission)
+
+    apply_totals(settlement, total_attended, total_commission, total_discounts, total_retentions)
+    settlement.save()
+
+    transaction.on_commit(lambda: invalidate_settlement_pdf(settlement.id))
+
+    return {
+        'mode': 'incremental',
+        'inserted': len(to_create),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+    }
+
+
+def ensure_period_drafts(period_start, period_end, created_by=None):
+    """
+    Crea en bloque las liquidaciones en borrador de un período para todos los
+    profesionales activos que aún no tienen una.
+
+    Usa una consulta para encontrar los pares (profesional, período) existentes
+    (respetando unique_together) y un único bulk_create con ignore_conflicts
+    para el resto, por lo que el costo no depende del número de profesionales.
+
+    Returns:
+        tuple (ids de liquidaciones creadas, ids de liquidaciones existentes)
+    """
+    professional_ids = Professional.objects.filter(status='active').values_list('id', flat=True)
+    existing = dict(
+        Settlement.objects.filter(
+            period_start=period_start,
+            period_end=period_end,
+            professional__status='active'
+        ).values_list('professional_id', 'id')
+    )
+
+    drafts = [
+        Settlement(
+            professional_id=professional_id,
+            period_start=period_start,
+            period_end=period_end,
+            status='draft',
+            created_by=created_by
+        )
+        for professional_id in professional_ids
+        if professional_id not in existing
+    ]
+    if not drafts:
+        return [], list(existing.values())
+
+    Settlement.objects.bulk_create(drafts, batch_size=500, ignore_conflicts=True)
+
+    # Con ignore_conflicts los borradores creados en paralelo por otra petición
+    # se descartan; se confirma qué ids quedaron realmente en la base de datos
+    created_ids = set(
+        Settlement.objects.filter(id__in=[draft.id for draft in drafts]).values_list('id', flat=True)
+    )
+    existing_ids = list(existing.values())
+    if len(created_ids) < len(drafts):
+        existing_ids += Settlement.objects.filter(
+            period_start=period_start,
+            period_end=period_end,
+            professional_id__in=[d.professional_id for d in drafts if d.id not in created_ids]
+        ).values_list('id', flat=True)
+
+    return list(created_ids), existing_ids
+
+
+def start_settlement_batch(period_start, period_end, created_by=None):
+    """
+    Prepara el cierre de un período: crea los borradores faltantes y registra
+    un SettlementBatch con las liquidaciones pendientes de cálculo.
+
+    Returns:
+        tuple (SettlementBatch, lista de ids de liquidaciones a calcular)
+    """
+    ensure_period_drafts(period_start, period_end, created_by=created_by)
+    settlement_ids = list(Settlement.objects.filter(
+        period_start=period_start,
+        period_end=period_end,
+        status__in=['draft', 'calculated']
+    ).values_list('id', flat=True))
+
+    batch = SettlementBatch.objects.create(
+        period_start=period_start,
+        period_end=period_end,
+        total=len(settlement_ids),
+        status='running' if settlement_ids else 'completed',
+        finished_at=None if settlement_ids else timezone.now(),
+        created_by=created_by
+    )
+    return batch, settlement_ids
+
+
+def record_batch_result(batch_id, settlement_id, error=None):
+    """Suma una liquidación calculada (o fallida) al progreso del lote de forma atómica"""
+    if error is None:
+        SettlementBatch.objects.filter(id=batch_id).update(
+            done=F('done') + 1, updated_at=timezone.now()
+        )
+        return
+
+    with transaction.atomic():
+        batch = SettlementBatch.objects.select_for_update().get(id=batch_id)
+        batch.failed += 1
+        batch.errors.append({'settlement_id': str(settlement_id), 'error': str(error)})
+        batch.save(update_fields=['failed', 'errors', 'updated_at'])
+
+
+def finish_settlement_batch(batch_id):
+    """Marca el lote como terminado (fallido si ninguna liquidación se pudo calcular)"""
+    batch = SettlementBatch.objects.get(id=batch_id)
+    batch.status = 'failed' if batch.total and batch.failed == batch.total else 'completed'
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['status', 'finished_at', 'updated_at'])
+    return batch
@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from payments.models import Service, AuditLog
-import json
+from django.utils import timezone
+from payments.models import Service, Attention, Discount, InsuranceDiscount, Professional
+from payments.audit import log_audit
+from payments.audit_summary import merge_user_daily_counts
+from payments.caching import bump_catalog_version
+from payments.rollups import instance_contribution, stored_contribution, record_attention_change
 
 # Signals loaded
 
@@ -13,23 +19,104 @@ def log_service_audit(sender, instance, created, **kwargs):
     if not created:
         return
     
-    try:
-        # Crear log de auditoría manualmente
-        AuditLog.objects.create(
-            user=None,
-            action='create',
-            model_name='Service',
-            object_id=str(instance.id),
-            object_description=f"Servicio: {instance.name}",
-            new_values={
-                'name': instance.name,
-                'base_price': str(instance.base_price),
-                'commission_percentage': str(instance.commission_percentage)
-            }
+    log_audit(
+        user=None,
+        action='create',
+        model_name='Service',
+        object_id=instance.id,
+        object_description=f"Servicio: {instance.name}",
+        new_values={
+            'name': instance.name,
+            'base_price': str(instance.base_price),
+            'commission_percentage': str(instance.commission_percentage)
+        }
+    )
+
+
+# Catálogos cacheados (payments.caching): cualquier cambio invalida sus lecturas
+CATALOG_NAMESPACES = {
+    Service: 'service',
+    Discount: 'discount',
+    InsuranceDiscount: 'insurance_discount',
+}
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Cambia la versión del catálogo para descartar sus respuestas cacheadas.
+
+    Se hace al confirmar la transacción: si se hiciera antes, una lectura
+    concurrente podría guardar las filas anteriores bajo la versión nueva.
+    """
+    namespace = CATALOG_NAMESPACES[sender]
+    transaction.on_commit(lambda: bump_catalog_version(namespace))
+
+
+for catalog_model, namespace in CATALOG_NAMESPACES.items():
+    post_save.connect(invalidate_catalog_cache, sender=catalog_model, dispatch_uid=f"{namespace}_cache_save")
+    post_delete.connect(invalidate_catalog_cache, sender=catalog_model, dispatch_uid=f"{namespace}_cache_delete")
+
+
+# Totales diarios de atenciones (payments.rollups)
+@receiver(pre_save, sender=Attention, dispatch_uid="attention_rollup_pre_save")
+def remember_attention_contribution(sender, instance, raw=False, **kwargs):
+    """Guarda el aporte de la versión anterior de la atención antes de sobrescribirla"""
+    if raw or instance._state.adding:
+        instance._rollup_previous = None
+    else:
+        instance._rollup_previous = stored_contribution(instance.pk)
+
+
+@receiver(post_save, sender=Attention, dispatch_uid="attention_rollup_post_save")
+def update_attention_rollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    record_attention_change(getattr(instance, '_rollup_previous', None), instance_contribution(instance))
+    instance._rollup_previous = None
+
+
+@receiver(post_delete, sender=Attention, dispatch_uid="attention_rollup_post_delete")
+def remove_attention_rollup(sender, instance, **kwargs):
+    record_attention_change(previous=instance_contribution(instance))
+
+
+@receiver(pre_save, sender=Service, dispatch_uid="service_commission_pre_save")
+def remember_service_commission(sender, instance, raw=False, **kwargs):
+    instance._previous_commission = None
+    if not raw and not instance._state.adding:
+        instance._previous_commission = (
+            Service.objects.filter(pk=instance.pk).values_list('commission_percentage', flat=True).first()
         )
-    except Exception as e:
-        import traceback
-        import sys
-        print(f"Error in service audit signal: {e}", file=sys.stderr)
-        traceback.print_exc()
 
+
+@receiver(post_save, sender=Service, dispatch_uid="service_commission_restamp")
+def restamp_service_attentions(sender, instance, created, raw=False, **kwargs):
+    """
+    La comisión guardada en las atenciones sin porcentaje propio (y sus
+    totales diarios) depende del servicio: se actualiza por lotes al confirmar
+    la transacción (payments.commissions.restamp_service_commissions).
+    """
+    previous = getattr(instance, '_previous_commission', None)
+    if created or raw or previous is None or previous == instance.commission_percentage:
+        return
+    from payments.tasks import dispatch_commission_restamp
+    service_id = instance.pk
+    transaction.on_commit(lambda: dispatch_commission_restamp(service_id))
+
+
+@receiver(pre_delete, sender=User, dispatch_uid="user_audit_counts_pre_delete")
+def merge_deleted_user_audit_counts(sender, instance, **kwargs):
+    """Pasa los contadores diarios de auditoría del usuario a los de sin usuario"""
+    merge_user_daily_counts(instance.pk)
+
+
+@receiver(post_save, sender=User, dispatch_uid="user_professional_touch")
+def touch_professional_on_user_change(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    ProfessionalSerializer muestra el nombre y el correo del usuario: al
+    modificarlo se actualiza Professional.updated_at para que cambie el ETag
+    de ProfessionalViewSet (payments.conditional).
+    """
+    if created or raw or (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        return
+    Professional.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
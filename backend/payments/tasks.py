@@ -1,14 +1,25 @@
 """
 Tareas asincrónicas con Celery para escalabilidad
 """
-from celery import shared_task
+from celery import shared_task, chord
+from django.conf import settings
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
+from django.utils import timezone
 from datetime import datetime, timedelta
-from io import BytesIO
-from openpyxl import Workbook
 from django.core.files.base import ContentFile
-from payments.models import Settlement, Attention, AuditLog
+from payments.models import Settlement, AttentionDailyRollup, AuditLog
+from payments.settlements import (
+    recalculate_settlement, record_batch_result, finish_settlement_batch
+)
+from payments.audit import write_audit_events
+from payments.retention import purge_audit_logs
+from payments.audit_storage import rotate_audit_storage
+from payments.rollups import rollup_totals
+from payments.commissions import restamp_service_commissions
+from payments.export_jobs import (
+    normalize_export_filters, enqueue_export, run_export_job, purge_expired_exports
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,75 +29,27 @@ logger = logging.getLogger(__name__)
 def export_settlements_to_excel(period_start, period_end):
     """
     Tarea asincrónica: Exportar liquidaciones a Excel
-    No bloquea al usuario mientras se genera el archivo
+    No bloquea al usuario mientras se genera el archivo; el archivo queda
+    guardado como ExportJob (descargable en /api/exports/{id}/download/)
     
     Args:
         period_start: Fecha inicio (YYYY-MM-DD)
         period_end: Fecha fin (YYYY-MM-DD)
     """
     try:
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        
-        # Obtener liquidaciones del período
-        settlements = Settlement.objects.filter(
-            period_start__gte=period_start,
-            period_end__lte=period_end
-        ).order_by('-period_end')
-        
-        # Crear workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Liquidaciones"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="5B6EF5", end_color="5B6EF5", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        filters = normalize_export_filters({'start_date': period_start, 'end_date': period_end})
+        job, _ = enqueue_export('xlsx', filters)
+        job = run_export_job(job.id) or job
+        
+        if job.status == 'failed':
+            raise Exception(job.error)
         
-        # Headers
-        headers = ['ID', 'Profesional', 'Período Inicio', 'Período Fin', 
-                  'Comisión Total', 'Descuentos', 'Monto Neto', 'Estado']
-        ws.append(headers)
-        
-        # Aplicar estilos a headers
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Datos
-        for settlement in settlements:
-            row = [
-                str(settlement.id),
-                settlement.professional.user.get_full_name() or settlement.professional.user.username,
-                settlement.period_start.strftime('%d/%m/%Y'),
-                settlement.period_end.strftime('%d/%m/%Y'),
-                float(settlement.total_commission),
-                float(settlement.total_discounts or 0),
-                float(settlement.net_amount),
-                settlement.status.upper(),
-            ]
-            ws.append(row)
-            
-            for cell in ws[ws.max_row]:
-                cell.border = border
-        
-        # Guardar en memoria
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        
-        logger.info(f"Excel exportado: {settlements.count()} liquidaciones")
+        logger.info(f"Excel exportado: {job.row_count} liquidaciones ({job.file.name})")
         return {
             'status': 'success',
-            'count': settlements.count(),
-            'filename': f"liquidaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            'job_id': str(job.id),
+            'count': job.row_count,
+            'filename': job.file.name
         }
     
     except Exception as e:
@@ -94,6 +57,49 @@ def export_settlements_to_excel(period_start, period_end):
         return {'status': 'error', 'message': str(e)}
 
 
+@shared_task
+def run_export_job_async(job_id):
+    """
+    Tarea asincrónica: Generar el archivo de una exportación (ExportJob)
+    
+    Args:
+        job_id: ID del ExportJob
+    """
+    job = run_export_job(job_id)
+    if job is None:
+        return {'status': 'skipped', 'job_id': str(job_id)}
+    
+    if job.status == 'failed':
+        logger.error(f"Error en exportación {job_id}: {job.error}")
+    else:
+        logger.info(f"Exportación {job_id} lista: {job.row_count} registros, {job.file_size} bytes")
+    return {'status': job.status, 'job_id': str(job_id), 'count': job.row_count}
+
+
+@shared_task
+def purge_expired_exports_async():
+    """
+    Tarea programada: Eliminar archivos de exportaciones expiradas
+    Se ejecuta automáticamente cada hora
+    """
+    expired = purge_expired_exports()
+    logger.info(f"Exportaciones expiradas: {expired}")
+    return {'status': 'success', 'expired': expired}
+
+
+def dispatch_export_job(job):
+    """
+    Envía la generación de una exportación a Celery. Sin Celery habilitado
+    la genera en el proceso actual.
+    
+    Args:
+        job: ExportJob creado con enqueue_export
+    """
+    if not getattr(settings, 'CELERY_ENABLED', False):
+        return run_export_job_async(str(job.id))
+    return run_export_job_async.delay(str(job.id))
+
+
 @shared_task
 def generate_daily_report():
     """
@@ -101,22 +107,17 @@ def generate_daily_report():
     Se ejecuta automáticamente cada día a las 6 PM
     """
     try:
-        today = datetime.now().date()
+        today = timezone.localdate()
         
-        # Atenciones del día
-        attentions = Attention.objects.filter(
-            date__date=today,
-            status='completed'
-        )
-        
-        total_amount = sum(float(a.amount_charged) for a in attentions)
-        total_commission = sum(float(a.calculate_commission()) for a in attentions)
+        # Atenciones completadas del día, desde los totales diarios (payments.rollups)
+        totals = rollup_totals(AttentionDailyRollup.objects.filter(date=today, status='completed'))
         
         report = {
             'date': today.isoformat(),
-            'total_attentions': attentions.count(),
-            'total_charged': float(total_amount),
-            'total_commission': float(total_commission),
+            'total_attentions': totals['count'],
+            'total_charged': str(totals['total_charged']),
+            'total_insurance_discount': str(totals['total_insurance_discount']),
+            'total_commission': str(totals['total_commission']),
         }
         
         logger.info(f"Reporte diario generado: {report}")
@@ -128,22 +129,51 @@ def generate_daily_report():
 
 
 @shared_task
-def cleanup_old_logs(days=30):
+def cleanup_old_logs(days=30, archive=None):
     """
     Tarea programada: Limpiar logs antiguos
     Se ejecuta automáticamente cada domingo a las 2 AM
     
+    Elimina por lotes con un presupuesto de tiempo (payments.retention). Si
+    el presupuesto se agota antes de terminar y Celery está habilitado, la
+    tarea se vuelve a encolar para continuar.
+    
+    Con AUDIT_STORAGE_TIERING los logs no se eliminan: los meses fuera de la
+    ventana en caliente (AUDIT_HOT_MONTHS) se mueven al archivo consultable
+    (payments.audit_storage) y days no se usa.
+    
     Args:
         days: Eliminar logs más antiguos que X días
+        archive: Archivar en .jsonl.gz antes de borrar (AUDIT_ARCHIVE_ENABLED por defecto)
     """
     try:
-        cutoff_date = datetime.now() - timedelta(days=days)
-        deleted_count, _ = AuditLog.objects.filter(created_at__lt=cutoff_date).delete()
+        if getattr(settings, 'AUDIT_STORAGE_TIERING', False):
+            segments = rotate_audit_storage()
+            logger.info(f"Auditoría rotada: {len(segments)} meses archivados")
+            return {
+                'status': 'success',
+                'archived_months': [segment.month.isoformat() for segment in segments],
+                'archived': sum(segment.row_count for segment in segments),
+            }
+        
+        if archive is None:
+            archive = getattr(settings, 'AUDIT_ARCHIVE_ENABLED', False)
+        cutoff_date = timezone.now() - timedelta(days=days)
+        result = purge_audit_logs(cutoff_date, archive=archive)
+        
+        logger.info(
+            f"Logs limpios: {result['deleted']} registros eliminados en {result['batches']} lotes "
+            f"(más antiguos de {days} días, {result['elapsed']}s)"
+        )
+        
+        if not result['complete'] and getattr(settings, 'CELERY_ENABLED', False):
+            cleanup_old_logs.apply_async(kwargs={'days': days, 'archive': archive}, countdown=60)
         
-        logger.info(f"Logs limpios: {deleted_count} registros eliminados (más antiguos de {days} días)")
         return {
-            'status': 'success',
-            'deleted': deleted_count,
+            'status': 'success' if result['complete'] else 'partial',
+            'deleted': result['deleted'],
+            'batches': result['batches'],
+            'archive': result['archive'],
             'days': days
         }
     
@@ -152,6 +182,18 @@ def cleanup_old_logs(days=30):
         return {'status': 'error', 'message': str(e)}
 
 
+@shared_task
+def write_audit_events_async(events):
+    """
+    Tarea asincrónica: Insertar un lote de eventos de auditoría
+    
+    Args:
+        events: Lista de dicts generados por payments.audit.log_audit
+    """
+    count = write_audit_events(events)
+    return {'status': 'success', 'count': count}
+
+
 @shared_task
 def send_settlement_notification(settlement_id):
     """
@@ -198,29 +240,96 @@ def send_settlement_notification(settlement_id):
 
 
 @shared_task
-def calculate_settlement_async(settlement_id):
+def calculate_settlement_async(settlement_id, batch_id=None):
     """
     Tarea asincrónica: Calcular liquidación sin bloquear la UI
     
     Args:
         settlement_id: ID de la liquidación
+        batch_id: ID del SettlementBatch al que se reporta el progreso (opcional)
     """
     try:
-        from payments.views import SettlementViewSet
-        
         settlement = Settlement.objects.get(id=settlement_id)
-        view = SettlementViewSet()
-        view._calculate_settlement(settlement)
+        if settlement.status not in ['draft', 'calculated']:
+            raise ValueError(f"La liquidación está en estado {settlement.status}")
+        
+        recalculate_settlement(settlement)
         settlement.status = 'calculated'
         settlement.save()
         
+        if batch_id:
+            record_batch_result(batch_id, settlement_id)
+        
         logger.info(f"Liquidación {settlement_id} calculada")
         return {'status': 'success', 'settlement_id': str(settlement_id)}
     
     except Settlement.DoesNotExist:
         logger.error(f"Liquidación {settlement_id} no encontrada")
+        if batch_id:
+            record_batch_result(batch_id, settlement_id, error='Settlement not found')
         return {'status': 'error', 'message': 'Settlement not found'}
     
     except Exception as e:
         logger.error(f"Error calculando liquidación: {str(e)}")
+        if batch_id:
+            record_batch_result(batch_id, settlement_id, error=e)
         return {'status': 'error', 'message': str(e)}
+
+
+@shared_task
+def finish_settlement_batch_async(results, batch_id):
+    """
+    Tarea asincrónica: Callback del chord que cierra un cálculo masivo
+    
+    Args:
+        results: Resultados de calculate_settlement_async (uno por liquidación)
+        batch_id: ID del SettlementBatch
+    """
+    batch = finish_settlement_batch(batch_id)
+    logger.info(f"Cierre de período {batch_id} terminado: {batch.done} calculadas, {batch.failed} fallidas")
+    return {'status': batch.status, 'done': batch.done, 'failed': batch.failed, 'total': batch.total}
+
+
+def dispatch_settlement_batch(batch, settlement_ids):
+    """
+    Reparte el cálculo de las liquidaciones de un lote entre los workers de
+    Celery (group + chord). Sin Celery habilitado las calcula en el proceso actual.
+    
+    Args:
+        batch: SettlementBatch creado con start_settlement_batch
+        settlement_ids: IDs de las liquidaciones a calcular
+    """
+    if not settlement_ids:
+        return batch
+    
+    if not getattr(settings, 'CELERY_ENABLED', False):
+        results = [calculate_settlement_async(settlement_id, str(batch.id)) for settlement_id in settlement_ids]
+        return finish_settlement_batch_async(results, str(batch.id))
+    
+    return chord(
+        calculate_settlement_async.s(str(settlement_id), str(batch.id))
+        for settlement_id in settlement_ids
+    )(finish_settlement_batch_async.s(str(batch.id)))
+
+
+@shared_task
+def restamp_service_commissions_async(service_id):
+    """
+    Tarea asincrónica: Propagar la comisión de un servicio a sus atenciones
+    
+    Args:
+        service_id: ID del Service cuya comisión cambió
+    """
+    updated = restamp_service_commissions(service_id)
+    logger.info(f"Comisión del servicio {service_id} propagada a {updated} atenciones")
+    return {'status': 'success', 'service_id': str(service_id), 'updated': updated}
+
+
+def dispatch_commission_restamp(service_id):
+    """
+    Envía a Celery la actualización de la comisión guardada en las atenciones
+    de un servicio. Sin Celery habilitado la ejecuta en el proceso actual.
+    """
+    if not getattr(settings, 'CELERY_ENABLED', False):
+        return restamp_service_commissions_async(str(service_id))
+    return restamp_service_commissions_async.delay(str(service_id))
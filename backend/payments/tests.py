@@ -0,0 +1,994 @@
+import base64
+import gzip
+import io
+import json
+import os
+import tempfile
+import uuid
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from openpyxl import Workbook, load_workbook
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from payments.attention_import import ImportFileError, import_attentions
+from payments.audit import audit_request_scope, log_audit
+from payments.audit_storage import archive_month, read_segment
+from payments.audit_summary import increment_daily_counts
+from payments.caching import get_catalog_version
+from payments.dashboard import build_dashboard_summary
+from payments.export_jobs import enqueue_export
+from payments.exports import SETTLEMENT_COLUMNS, write_pdf_bundle
+from payments.models import (
+    Attention, AttentionDailyRollup, AuditArchiveSegment, AuditDailyCount, AuditLog, Discount, Professional,
+    Service, Settlement, UserProfile
+)
+from payments.money import commission_amount, quantize_money, sum_money, to_decimal
+from payments.retention import purge_audit_logs
+from payments.rollups import rebuild_attention_rollups
+from payments.settlements import calculate_settlement, recalculate_settlement
+
+
+def completed_totals(attentions):
+    """Cantidad, total atendido y comisión total, sumando atención por atención"""
+    rows = list(attentions.values_list('amount_charged', 'commission_amount'))
+    return {
+        'count': len(rows),
+        'total_attended': sum_money(amount for amount, _ in rows),
+        'total_commission': sum_money(commission for _, commission in rows),
+    }
+
+
+def create_catalog(professionals=2, services=2):
+    """Profesionales (con usuario y perfil) y servicios para las pruebas"""
+    created = []
+    for index in range(professionals):
+        user = User.objects.create_user(f'prof{index}', password='secret', first_name=f'Nombre{index}')
+        UserProfile.objects.create(user=user, role='professional')
+        created.append(Professional.objects.create(user=user, license_number=f'LIC-{index}'))
+    catalog = [
+        Service.objects.create(
+            name=f'Servicio {index}', code=f'S{index}', base_price=Decimal('100.00'),
+            commission_percentage=Decimal('30.00') + index
+        )
+        for index in range(services)
+    ]
+    return created, catalog
+
+
+def create_attentions(professionals, services, count, start=datetime(2025, 1, 1, 9)):
+    """Atenciones repartidas entre profesionales, servicios, días y estados"""
+    statuses = ['completed', 'completed', 'pending', 'cancelled']
+    discounts = [Decimal('0'), Decimal('10'), Decimal('15.50'), Decimal('33.33')]
+    return [
+        Attention.objects.create(
+            professional=professionals[index % len(professionals)],
+            service=services[index % len(services)],
+            patient_name=f'Paciente {index}',
+            date=timezone.make_aware(start + timedelta(days=index % 20, hours=index % 7)),
+            amount_charged=Decimal(1000 + index * 37) / 100,
+            insurance_discount_percentage=discounts[index % len(discounts)],
+            commission_percentage=Decimal('17.25') if index % 5 == 0 else None,
+            health_insurance=['', 'Sura', 'Nueva EPS'][index % 3],
+            status=statuses[index % len(statuses)],
+        )
+        for index in range(count)
+    ]
+
+
+class TokenClaimsTests(TestCase):
+    """Lecturas atendidas desde los claims del token (ClaimsJWTAuthentication)"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=self.admin, role='admin')
+        self.client = APIClient()
+        response = self.client.post('/api/auth/login/', {'username': 'admin', 'password': 'secret'}, format='json')
+        self.tokens = response.json()
+
+    def get_users(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/api/users/')
+
+    def refresh(self):
+        self.client.credentials()
+        return self.client.post('/api/auth/refresh/', {'refresh': self.tokens['refresh']}, format='json')
+
+    def test_deactivated_user_is_rejected_on_reads_and_refresh(self):
+        self.assertEqual(self.get_users(self.tokens['access']).status_code, 200)
+
+        User.objects.filter(pk=self.admin.pk).update(is_active=False)
+
+        self.assertEqual(self.get_users(self.tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh().status_code, 401)
+
+    def test_refresh_reads_current_role(self):
+        UserProfile.objects.filter(user=self.admin).update(role='professional')
+
+        response = self.refresh()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_users(response.json()['access']).status_code, 403)
+
+    def test_login_role_matches_token_claims(self):
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        UserProfile.objects.create(user=staff, role='professional')
+        response = self.client.post('/api/auth/login/', {'username': 'staff', 'password': 'secret'}, format='json')
+        claims = AccessToken(response.json()['access'])
+        self.assertEqual(response.json()['user']['role'], 'professional')
+        self.assertEqual(response.json()['user']['role'], claims['role'])
+        self.assertEqual(self.tokens['user']['role'], 'admin')
+
+
+class AuditBufferTests(TestCase):
+    """Escritura de los eventos de auditoría acumulados (payments.audit)"""
+
+    def test_events_outside_a_request_are_written_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            log_audit(None, 'create', 'Service', 'svc-1', 'Servicio')
+        self.assertEqual(AuditLog.objects.filter(object_id='svc-1').count(), 1)
+
+    def test_events_inside_a_request_are_written_at_the_end_with_their_event_time(self):
+        with audit_request_scope():
+            with self.captureOnCommitCallbacks(execute=True):
+                event = log_audit(None, 'create', 'Service', 'svc-2', 'Servicio')
+            self.assertFalse(AuditLog.objects.filter(object_id='svc-2').exists())
+        log = AuditLog.objects.get(object_id='svc-2')
+        self.assertEqual(log.created_at, parse_datetime(event['created_at']))
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+class CursorPaginationTests(TestCase):
+    """Cursores inválidos en los listados keyset (payments.pagination)"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=self.admin, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_malformed_cursor_values_return_404(self):
+        for path in ('/api/attentions/', '/api/audit-logs/', '/api/audit-logs/?tier=archive'):
+            for values in (['notadate', 'x'], ['2025-01-01T00:00:00+00:00', 'x'], ['a'], {'a': 1}):
+                separator = '&' if '?' in path else '?'
+                response = self.client.get(f'{path}{separator}cursor={encode_cursor(values)}')
+                self.assertEqual(response.status_code, 404, (path, values))
+
+    def test_valid_cursor_is_accepted(self):
+        cursor = encode_cursor(['2025-01-01 00:00:00+00:00', str(uuid.uuid4())])
+        self.assertEqual(self.client.get(f'/api/attentions/?cursor={cursor}').status_code, 200)
+
+
+class AttentionListQueryTests(TestCase):
+    """El listado de atenciones no hace consultas por fila"""
+
+    def setUp(self):
+        professionals, services = create_catalog()
+        create_attentions(professionals, services, 60)
+        self.admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=self.admin, role='admin')
+        self.client = APIClient()
+
+    def get(self, path):
+        """GET con el usuario recién cargado (principal sin resolver), contando solo la petición"""
+        self.client.force_authenticate(User.objects.get(pk=self.admin.pk))
+        # Principal del usuario + página con profesional, usuario y servicio unidos
+        with self.assertNumQueries(2):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in (5, 50):
+            response = self.get(f'/api/attentions/?page_size={page_size}')
+            self.assertEqual(len(response.json()['results']), page_size)
+
+    def test_professional_attentions_and_date_range_use_the_same_joins(self):
+        professional = Professional.objects.first()
+        for path in (
+            f'/api/attentions/professional_attentions/?professional_id={professional.pk}&page_size=',
+            '/api/attentions/date_range/?start_date=2025-01-01&end_date=2025-02-01&page_size=',
+        ):
+            for page_size in (3, 25):
+                self.get(f'{path}{page_size}')
+
+
+class MoneyTests(TestCase):
+    """Aritmética exacta de payments.money"""
+
+    def test_to_decimal_does_not_carry_binary_digits(self):
+        self.assertEqual(to_decimal(0.1), Decimal('0.1'))
+        self.assertEqual(to_decimal(None), Decimal('0.00'))
+
+    def test_quantize_money_rounds_half_up(self):
+        self.assertEqual(quantize_money(Decimal('2.675')), Decimal('2.68'))
+        self.assertEqual(quantize_money(Decimal('2.665')), Decimal('2.67'))
+
+    def test_commission_applies_insurance_discount_first(self):
+        self.assertEqual(commission_amount(Decimal('100'), Decimal('20'), Decimal('30')), Decimal('24'))
+        self.assertEqual(commission_amount(Decimal('100'), 0, Decimal('30')), Decimal('30'))
+
+    def test_sum_money_rounds_each_value(self):
+        self.assertEqual(sum_money([Decimal('0.005')] * 3), Decimal('0.03'))
+
+
+class SettlementTotalsTests(TestCase):
+    """Los totales de una liquidación coinciden con la suma de sus ítems"""
+
+    def setUp(self):
+        professionals, services = create_catalog(professionals=1, services=3)
+        self.professional = professionals[0]
+        self.services = services
+        create_attentions(professionals, services, 40)
+        Discount.objects.create(name='Retención', discount_type='percentage', category='retention', value=Decimal('10.75'))
+        Discount.objects.create(name='Insumos', discount_type='fixed', category='discount', value=Decimal('12.34'))
+        self.settlement = Settlement.objects.create(
+            professional=self.professional, period_start=date(2025, 1, 1), period_end=date(2025, 1, 31)
+        )
+
+    def assert_totals_match_items(self, settlement):
+        settlement.refresh_from_db()
+        items = list(settlement.line_items.all())
+        completed = Attention.objects.filter(professional=self.professional, status='completed')
+        self.assertEqual(len(items), completed.count())
+        self.assertEqual(settlement.total_attended, sum(item.amount_charged for item in items))
+        self.assertEqual(settlement.total_commission, sum(item.commission_amount for item in items))
+        expected_commission = sum(quantize_money(attention.calculate_commission()) for attention in completed)
+        self.assertEqual(settlement.total_commission, expected_commission)
+        self.assertEqual(
+            settlement.total_retentions, quantize_money(settlement.total_commission * Decimal('10.75') / 100)
+        )
+        self.assertEqual(settlement.total_discounts, Decimal('12.34'))
+        self.assertEqual(
+            settlement.net_amount,
+            settlement.total_commission - settlement.total_discounts - settlement.total_retentions
+        )
+        summary = completed_totals(completed)
+        self.assertEqual(summary['total_commission'], settlement.total_commission)
+
+    def test_calculate_settlement(self):
+        calculate_settlement(self.settlement)
+        self.assert_totals_match_items(self.settlement)
+
+    def test_incremental_recalculation_matches_full_calculation(self):
+        calculate_settlement(self.settlement)
+        Settlement.objects.filter(pk=self.settlement.pk).update(status='calculated')
+        self.settlement.refresh_from_db()
+
+        changed = Attention.objects.filter(professional=self.professional, status='completed').first()
+        changed.amount_charged = Decimal('333.33')
+        changed.save()
+        Attention.objects.filter(professional=self.professional, status='completed').last().delete()
+        service = self.services[1]
+        service.commission_percentage = Decimal('41.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+
+        result = recalculate_settlement(self.settlement)
+        self.assertEqual(result['mode'], 'incremental')
+        self.assert_totals_match_items(self.settlement)
+
+    def test_repeated_recalculation_from_stale_copies(self):
+        calculate_settlement(self.settlement)
+        Settlement.objects.filter(pk=self.settlement.pk).update(status='calculated')
+        first = Settlement.objects.get(pk=self.settlement.pk)
+        second = Settlement.objects.get(pk=self.settlement.pk)
+
+        create_attentions([self.professional], self.services, 4, start=datetime(2025, 1, 3, 9))
+        Attention.objects.filter(professional=self.professional, status='completed').first().delete()
+
+        self.assertEqual(recalculate_settlement(first)['mode'], 'incremental')
+        result = recalculate_settlement(second)
+        self.assertEqual((result['inserted'], result['updated'], result['deleted']), (0, 0, 0))
+
+        attention_ids = list(self.settlement.line_items.values_list('attention_id', flat=True))
+        self.assertEqual(len(attention_ids), len(set(attention_ids)))
+        self.assert_totals_match_items(second)
+
+
+def rollup_snapshot():
+    return sorted(
+        AttentionDailyRollup.objects.values_list(
+            'date', 'professional_id', 'service_id', 'health_insurance', 'status', 'attention_count',
+            'amount_charged', 'insurance_discount_amount', 'commission_amount'
+        )
+    )
+
+
+class AttentionRollupTests(TestCase):
+    """Los totales diarios incrementales coinciden con una reconstrucción completa"""
+
+    def setUp(self):
+        self.professionals, self.services = create_catalog(professionals=3, services=3)
+        self.attentions = create_attentions(self.professionals, self.services, 60)
+
+    def assert_matches_rebuild(self):
+        incremental = rollup_snapshot()
+        rebuild_attention_rollups()
+        self.assertEqual(incremental, rollup_snapshot())
+
+    def test_created_attentions(self):
+        self.assert_matches_rebuild()
+
+    def test_edited_and_deleted_attentions(self):
+        moved = self.attentions[0]
+        moved.status = 'cancelled'
+        moved.amount_charged = Decimal('55.55')
+        moved.date += timedelta(days=3)
+        moved.save()
+        self.attentions[1].delete()
+        self.assert_matches_rebuild()
+
+    def test_service_commission_change(self):
+        service = self.services[0]
+        service.commission_percentage = Decimal('12.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        self.assert_matches_rebuild()
+        stale = [
+            attention for attention in Attention.objects.select_related('service')
+            if attention.commission_amount != quantize_money(attention.calculate_commission())
+        ]
+        self.assertEqual(stale, [])
+
+    def test_professional_cascade_delete(self):
+        professional = self.professionals[2]
+        professional.delete()
+        self.assertFalse(AttentionDailyRollup.objects.filter(professional_id=professional.pk).exists())
+        self.assert_matches_rebuild()
+
+    def test_rollup_endpoint_matches_attention_totals(self):
+        admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=admin, role='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get('/api/attentions/rollup/?start_date=2025-01-01&end_date=2025-01-31&group_by=professional')
+        self.assertEqual(response.status_code, 200)
+
+        summary = completed_totals(Attention.objects.filter(status='completed'))
+        totals = response.json()['totals']
+        self.assertEqual(totals['count'], summary['count'])
+        self.assertEqual(Decimal(str(totals['total_charged'])), summary['total_attended'])
+        self.assertEqual(Decimal(str(totals['total_commission'])), summary['total_commission'])
+        self.assertEqual(
+            sum(row['count'] for row in response.json()['results']), summary['count']
+        )
+
+    def test_dashboard_totals_are_rounded_to_cents(self):
+        admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=admin, role='admin')
+        summary = build_dashboard_summary(admin)
+        total_charged = summary['attentions']['total_charged']
+        completed = completed_totals(Attention.objects.filter(status='completed'))
+        self.assertEqual(total_charged, completed['total_attended'])
+        self.assertEqual(total_charged.as_tuple().exponent, -2)
+        self.assertEqual(len(summary['by_professional']), len(self.professionals))
+
+    def test_dashboard_scope_matches_attention_listing(self):
+        superuser = User.objects.create_superuser('root', password='secret')
+        summary = build_dashboard_summary(superuser)
+        self.assertEqual(summary['attentions']['total'], 0)
+        self.assertEqual(summary['by_professional'], [])
+
+
+class AttentionImportTests(TestCase):
+    """Importación masiva de atenciones (payments.attention_import)"""
+
+    def setUp(self):
+        self.professionals, self.services = create_catalog()
+
+    def csv_file(self, rows, delimiter=';'):
+        header = ['professional', 'service', 'patient_name', 'date', 'amount_charged',
+                  'insurance_discount_percentage', 'commission_percentage', 'status']
+        lines = [delimiter.join(header)] + [delimiter.join(row) for row in rows]
+        return io.BytesIO(('\n'.join(lines) + '\n').encode('utf-8-sig'))
+
+    def test_valid_rows_are_created_with_commission_and_rollups(self):
+        service = self.services[0]
+        report = import_attentions(self.csv_file([
+            ['LIC-0', service.code, 'Ana', '2025-03-01 10:00', '100.50', '10', '', 'Completado'],
+            [str(self.professionals[1].pk).upper(), str(self.services[1].pk), 'Luis', '15/03/2025', '200', '', '25', 'pending'],
+        ]), 'csv', batch_size=1)
+
+        self.assertEqual((report['created'], report['failed']), (2, 0))
+        ana = Attention.objects.get(patient_name='Ana')
+        self.assertEqual(ana.status, 'completed')
+        self.assertEqual(ana.effective_commission_percentage, service.commission_percentage)
+        self.assertEqual(ana.commission_amount, quantize_money(ana.calculate_commission()))
+        self.assertEqual(Attention.objects.get(patient_name='Luis').commission_amount, Decimal('50.00'))
+
+        incremental = rollup_snapshot()
+        rebuild_attention_rollups()
+        self.assertEqual(incremental, rollup_snapshot())
+
+    def test_invalid_rows_are_reported_by_row_number(self):
+        report = import_attentions(self.csv_file([
+            ['LIC-0', 'S0', 'Ana', '2025-03-01', '10', '', '', ''],
+            ['NOPE', 'S0', '', '2025-13-01', '-5', '120', '1.234', 'raro'],
+            [';;;;;;;'],
+            ['LIC-0', 'XXX', 'Eva', '2025-03-02', 'abc', '', '', ''],
+        ]), 'csv')
+
+        self.assertEqual((report['total_rows'], report['created'], report['failed']), (3, 1, 2))
+        errors = {error['row']: error['errors'] for error in report['errors']}
+        self.assertEqual(set(errors), {3, 5})
+        self.assertEqual(
+            set(errors[3]),
+            {'professional', 'patient_name', 'date', 'amount_charged',
+             'insurance_discount_percentage', 'commission_percentage', 'status'}
+        )
+        self.assertEqual(set(errors[5]), {'service', 'amount_charged'})
+
+    def test_dry_run_does_not_insert(self):
+        report = import_attentions(
+            self.csv_file([['LIC-0', 'S0', 'Ana', '2025-03-01', '10', '', '', '']], delimiter=','),
+            'csv', dry_run=True
+        )
+        self.assertEqual((report['valid'], report['created']), (1, 0))
+        self.assertFalse(Attention.objects.exists())
+
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaises(ImportFileError):
+            import_attentions(io.BytesIO(b'foo,bar\n1,2\n'), 'csv')
+
+    def test_xlsx_with_native_cell_types(self):
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Professional', 'Service', 'patient_name', 'date', 'amount_charged', 'patient_id'])
+        ws.append(['LIC-0', 'S0', 'X', datetime(2025, 4, 1, 9, 30), 50.25, 12345678.0])
+        ws.append([None] * 6)
+        ws.append(['LIC-1', 'S1', 'Y', date(2025, 4, 2), 80, None])
+        fileobj = io.BytesIO()
+        wb.save(fileobj)
+        fileobj.seek(0)
+
+        report = import_attentions(fileobj, 'xlsx')
+        self.assertEqual((report['total_rows'], report['created']), (2, 2))
+        self.assertEqual(Attention.objects.get(patient_name='X').patient_id, '12345678')
+        self.assertEqual(Attention.objects.get(patient_name='X').amount_charged, Decimal('50.25'))
+
+    def test_endpoint_is_admin_only(self):
+        content = self.csv_file([['LIC-0', 'S0', 'Ana', '2025-03-01', '10', '', '', '']]).getvalue()
+        client = APIClient()
+        client.force_authenticate(self.professionals[0].user)
+        response = client.post(
+            '/api/attentions/bulk_import/', {'file': SimpleUploadedFile('a.csv', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=admin, role='admin')
+        client.force_authenticate(admin)
+        response = client.post(
+            '/api/attentions/bulk_import/', {'file': SimpleUploadedFile('a.txt', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = client.post(
+            '/api/attentions/bulk_import/', {'file': SimpleUploadedFile('a.csv', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogCacheTests(TestCase):
+    """Invalidación de las lecturas cacheadas de catálogos"""
+
+    def test_version_changes_only_after_commit(self):
+        service = Service.objects.create(name='Limpieza', code='LIM', base_price=Decimal('50'))
+        before = get_catalog_version('service')
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                service.base_price = Decimal('60')
+                service.save()
+                self.assertEqual(get_catalog_version('service'), before)
+        self.assertNotEqual(get_catalog_version('service'), before)
+
+    def test_cached_list_is_refreshed_after_a_change(self):
+        admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=admin, role='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        service = Service.objects.create(name='Limpieza', code='LIM', base_price=Decimal('50'))
+        self.assertEqual(client.get('/api/services/').json()['results'][0]['name'], 'Limpieza')
+
+        service.name = 'Profilaxis'
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        self.assertEqual(client.get('/api/services/').json()['results'][0]['name'], 'Profilaxis')
+
+    def test_catalog_etag_needs_no_database_query(self):
+        admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=admin, role='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        service = Service.objects.create(name='Limpieza', code='LIM', base_price=Decimal('50'))
+
+        response = client.get('/api/services/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/services/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(client.get('/api/services/').status_code, 200)
+
+        service.name = 'Profilaxis'
+        with self.captureOnCommitCallbacks(execute=True):
+            service.save()
+        response = client.get('/api/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ExportJobDedupTests(TestCase):
+    """Deduplicación de exportaciones en curso por solicitante"""
+
+    def setUp(self):
+        self.professionals, _ = create_catalog(professionals=1, services=1)
+        self.admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=self.admin, role='admin')
+
+    def test_same_filters_from_another_user_get_their_own_job(self):
+        professional = self.professionals[0]
+        filters = {'professional': str(professional.pk)}
+        admin_job, created = enqueue_export('csv', filters, created_by=self.admin)
+        self.assertTrue(created)
+
+        job, created = enqueue_export('csv', filters, created_by=professional.user)
+        self.assertTrue(created)
+        self.assertNotEqual(job.pk, admin_job.pk)
+        self.assertEqual(enqueue_export('csv', filters, created_by=professional.user), (job, False))
+
+        client = APIClient()
+        client.force_authenticate(professional.user)
+        self.assertEqual(client.get(f'/api/exports/{job.pk}/').status_code, 200)
+        self.assertEqual(client.get(f'/api/exports/{admin_job.pk}/').status_code, 404)
+
+
+class AuditArchiveTests(TestCase):
+    """Archivo mensual de auditoría"""
+
+    def create_logs(self, count, start):
+        return [
+            AuditLog.objects.create(
+                action='update', model_name='Service', object_id=str(index),
+                created_at=start + timedelta(minutes=index, microseconds=index * 137)
+            )
+            for index in range(count)
+        ]
+
+    def test_merge_with_existing_segment_does_not_duplicate(self):
+        month = date(2024, 1, 1)
+        start = datetime(2024, 1, 10, tzinfo=dt_timezone.utc)
+        with tempfile.TemporaryDirectory() as archive_dir:
+            first = self.create_logs(5, start)
+            segment = archive_month(month, archive_dir)
+            self.assertEqual(segment.row_count, 5)
+            self.assertFalse(AuditLog.objects.exists())
+
+            # Ejecución interrumpida: filas ya archivadas siguen en la tabla
+            for log in first[:3]:
+                log.save(force_insert=True)
+            later = self.create_logs(4, start + timedelta(days=5))
+            segment = archive_month(month, archive_dir)
+
+            events = list(read_segment(segment))
+            ids = [event['id'] for event in events]
+            self.assertEqual(segment.row_count, 9)
+            self.assertEqual(sorted(ids), sorted(str(log.id) for log in first + later))
+            keys = [(parse_datetime(event['created_at']), event['id']) for event in events]
+            self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_late_event_is_kept_for_the_next_rotation(self):
+        month = date(2024, 1, 1)
+        start = datetime(2024, 1, 10, tzinfo=dt_timezone.utc)
+        self.create_logs(3, start)
+        late = []
+        update_or_create = AuditArchiveSegment.objects.update_or_create
+
+        def register_segment(*args, **kwargs):
+            # Evento del mes que llega (buffer, Celery) mientras se archiva
+            late.extend(self.create_logs(1, start + timedelta(days=2)))
+            return update_or_create(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with mock.patch.object(AuditArchiveSegment.objects, 'update_or_create', side_effect=register_segment):
+                segment = archive_month(month, archive_dir)
+            self.assertEqual(segment.row_count, 3)
+            self.assertEqual(list(AuditLog.objects.values_list('id', flat=True)), [late[0].id])
+
+            segment = archive_month(month, archive_dir)
+            self.assertEqual(segment.row_count, 4)
+            self.assertFalse(AuditLog.objects.exists())
+
+
+class AuditDailyCountTests(TestCase):
+    """Contadores diarios de auditoría"""
+
+    def test_events_without_user_share_one_counter(self):
+        day = date(2025, 3, 1)
+        increment_daily_counts({(day, None, 'create', 'Service'): 2})
+        increment_daily_counts({(day, None, 'create', 'Service'): 3})
+        self.assertEqual(list(AuditDailyCount.objects.values_list('user_id', 'count')), [(None, 5)])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AuditDailyCount.objects.create(date=day, action='create', model_name='Service', count=1)
+
+    def test_deleting_a_user_merges_counts_into_anonymous(self):
+        day = date(2025, 3, 1)
+        user = User.objects.create_user('prof', password='secret')
+        increment_daily_counts({
+            (day, None, 'update', 'Attention'): 1,
+            (day, user.pk, 'update', 'Attention'): 4,
+            (day, user.pk, 'create', 'Attention'): 2,
+        })
+        user.delete()
+        self.assertEqual(
+            sorted(AuditDailyCount.objects.values_list('user_id', 'action', 'count')),
+            [(None, 'create', 2), (None, 'update', 5)]
+        )
+
+    def test_summary_states_that_purged_events_are_counted(self):
+        admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=admin, role='admin')
+        client = APIClient()
+        client.force_authenticate(admin)
+        self.assertTrue(client.get('/api/audit-logs/summary/').json()['includes_purged'])
+
+
+class ConditionalGetTests(TestCase):
+    """ETag, 304 y Cache-Control de las respuestas de la API"""
+
+    def setUp(self):
+        self.professionals, _ = create_catalog(professionals=2, services=1)
+        self.admin = User.objects.create_user('admin', password='secret')
+        UserProfile.objects.create(user=self.admin, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_etag_and_not_modified(self):
+        response = self.client.get('/api/professionals/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.client.get('/api/professionals/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get('/api/professionals/')['ETag']
+        professional = self.professionals[0]
+        professional.specialization = 'Ortodoncia'
+        professional.save()
+        response = self.client.get('/api/professionals/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_user_change_refreshes_professional(self):
+        professional = self.professionals[0]
+        url = f'/api/professionals/{professional.pk}/'
+        etag = self.client.get(url)['ETag']
+
+        # Edición del usuario sin pasar por ProfessionalSerializer (p. ej. el admin de Django)
+        user = professional.user
+        user.first_name = 'Renombrado'
+        user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_full_name'], 'Renombrado')
+
+    def test_auth_responses_are_never_stored(self):
+        response = self.client.post('/api/auth/login/', {'username': 'admin', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertFalse(self.client.get('/api/attentions/').has_header('Cache-Control'))
+
+
+def admin_client():
+    """APIClient autenticado como un administrador nuevo"""
+    admin = User.objects.create_user('admin', password='secret')
+    UserProfile.objects.create(user=admin, role='admin')
+    client = APIClient()
+    client.force_authenticate(admin)
+    return client
+
+
+class PeriodCloseTests(TestCase):
+    """Cierre de período con cálculo masivo (close_period y SettlementBatch)"""
+
+    def setUp(self):
+        self.professionals, services = create_catalog(professionals=3, services=2)
+        create_attentions(self.professionals, services, 30)
+        self.client = admin_client()
+
+    def test_close_period_calculates_every_settlement(self):
+        response = self.client.post(
+            '/api/settlements/close_period/', {'period_start': '2025-01-01', 'period_end': '2025-01-31'}, format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        batch = response.json()
+        self.assertEqual((batch['total'], batch['done'], batch['failed']), (3, 3, 0))
+        self.assertEqual(batch['status'], 'completed')
+        self.assertEqual(batch['progress'], 100.0)
+
+        settlements = Settlement.objects.filter(period_start=date(2025, 1, 1), period_end=date(2025, 1, 31))
+        self.assertEqual(sorted(settlements.values_list('status', flat=True)), ['calculated'] * 3)
+        for settlement in settlements:
+            self.assertEqual(settlement.total_commission, sum_money(
+                settlement.line_items.values_list('commission_amount', flat=True)
+            ))
+        self.assertEqual(self.client.get(f"/api/settlement-batches/{batch['id']}/").json()['done'], 3)
+
+    def test_failed_settlement_is_reported_in_the_batch(self):
+        Settlement.objects.create(
+            professional=self.professionals[0], period_start=date(2025, 1, 1), period_end=date(2025, 1, 31),
+            status='calculated'
+        )
+        with mock.patch('payments.tasks.recalculate_settlement', side_effect=ValueError('sin datos')):
+            batch = self.client.post(
+                '/api/settlements/close_period/', {'period_start': '2025-01-01', 'period_end': '2025-01-31'},
+                format='json'
+            ).json()
+        self.assertEqual((batch['total'], batch['done'], batch['failed']), (3, 0, 3))
+        self.assertEqual(batch['status'], 'failed')
+        self.assertEqual(batch['errors'][0]['error'], 'sin datos')
+
+
+class GenerateForPeriodTests(TestCase):
+    """Creación en bloque de los borradores de un período (generate_for_period)"""
+
+    def setUp(self):
+        self.client = admin_client()
+
+    def generate(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/api/settlements/generate_for_period/', {'period_start': '2025-02-01', 'period_end': '2025-02-28'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_created_and_existing_counts(self):
+        professionals, _ = create_catalog(professionals=4, services=1)
+        professionals[3].status = 'inactive'
+        professionals[3].save()
+        Settlement.objects.create(
+            professional=professionals[0], period_start=date(2025, 2, 1), period_end=date(2025, 2, 28)
+        )
+
+        result, _ = self.generate()
+        self.assertEqual((result['created_count'], result['existing_count']), (2, 1))
+        self.assertEqual(len(result['settlements']), 3)
+
+        result, _ = self.generate()
+        self.assertEqual((result['created_count'], result['existing_count']), (0, 3))
+        self.assertEqual(Settlement.objects.count(), 3)
+
+    def test_query_count_does_not_grow_with_professionals(self):
+        create_catalog(professionals=2, services=1)
+        _, few = self.generate()
+        Settlement.objects.all().delete()
+        for index in range(2, 12):
+            user = User.objects.create_user(f'extra{index}', password='secret')
+            Professional.objects.create(user=user, license_number=f'LIC-X{index}')
+        _, many = self.generate()
+        self.assertEqual(few, many)
+
+
+def create_settlements(professionals):
+    """Liquidaciones de enero a marzo de 2025 con estados y montos netos distintos"""
+    statuses = ['draft', 'calculated', 'approved', 'paid']
+    settlements = []
+    for index, professional in enumerate(professionals):
+        for month in range(1, 4):
+            settlements.append(Settlement.objects.create(
+                professional=professional,
+                period_start=date(2025, month, 1),
+                period_end=date(2025, month, 28),
+                status=statuses[(index + month) % len(statuses)],
+                total_commission=Decimal(100 * month + index),
+                net_amount=Decimal(90 * month + index) + Decimal('0.25'),
+            ))
+    return settlements
+
+
+class SettlementReportTests(TestCase):
+    """Reporte de liquidaciones agrupado (report) y su detalle paginado (report_details)"""
+
+    def setUp(self):
+        self.professionals, _ = create_catalog(professionals=2, services=1)
+        self.settlements = create_settlements(self.professionals)
+        self.client = admin_client()
+
+    def test_status_buckets_match_settlements(self):
+        with self.assertNumQueries(1):
+            report = self.client.get('/api/settlements/report/?start_date=2025-02-01').json()
+        included = [s for s in self.settlements if s.period_start >= date(2025, 2, 1)]
+        self.assertEqual(report['total_settlements'], len(included))
+        self.assertEqual(Decimal(str(report['total_amount'])), sum(s.net_amount for s in included))
+        labels = dict(Settlement.STATUS_CHOICES)
+        for key, label in Settlement.STATUS_CHOICES:
+            matching = [s for s in included if s.status == key]
+            self.assertEqual(report['by_status'][label]['count'], len(matching))
+        self.assertEqual(report['by_status'][labels['cancelled']], {'count': 0, 'total': 0.0})
+
+    def test_group_by_professional_and_month(self):
+        report = self.client.get('/api/settlements/report/?group_by=professional,month').json()
+        self.assertEqual(report['group_by'], ['professional', 'month'])
+        self.assertEqual(len(report['groups']), 6)
+        first = report['groups'][0]
+        self.assertEqual(first['count'], 1)
+        self.assertIn(first['month'], ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual(
+            self.client.get('/api/settlements/report/?group_by=service').status_code, 400
+        )
+
+    def test_details_are_paginated_filtered_and_ordered(self):
+        response = self.client.get('/api/settlements/report_details/?status=paid').json()
+        paid = [s for s in self.settlements if s.status == 'paid']
+        self.assertEqual(response['count'], len(paid))
+        self.assertEqual({row['status'] for row in response['results']}, {'paid'})
+
+        rows = self.client.get('/api/settlements/report_details/').json()['results']
+        self.assertEqual(len(rows), 6)
+        ends = [row['period_end'] for row in rows]
+        self.assertEqual(ends, sorted(ends, reverse=True))
+
+
+class SettlementExcelExportTests(TestCase):
+    """Exportación de liquidaciones a Excel en streaming (export_excel)"""
+
+    def test_streamed_workbook_has_headers_and_one_row_per_settlement(self):
+        professionals, _ = create_catalog(professionals=2, services=1)
+        settlements = create_settlements(professionals)
+        client = admin_client()
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/settlements/export_excel/')
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(int(response['Content-Length']), len(content))
+
+        rows = list(load_workbook(io.BytesIO(content), read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), [column.header for column in SETTLEMENT_COLUMNS])
+        self.assertEqual(len(rows) - 1, len(settlements))
+        newest = max(settlements, key=lambda settlement: settlement.period_end)
+        self.assertEqual(rows[1][3], newest.period_end.strftime('%d/%m/%Y'))
+        self.assertEqual(
+            {row[0] for row in rows[1:]}, {str(settlement.id) for settlement in settlements}
+        )
+
+
+class SettlementPdfBundleTests(TestCase):
+    """ZIP con el PDF de cada liquidación (write_pdf_bundle)"""
+
+    def setUp(self):
+        self.professionals, services = create_catalog(professionals=3, services=2)
+        create_attentions(self.professionals, services, 30)
+        Discount.objects.create(name='Retención', discount_type='percentage', category='retention', value=Decimal('10'))
+        for professional in self.professionals:
+            calculate_settlement(Settlement.objects.create(
+                professional=professional, period_start=date(2025, 1, 1), period_end=date(2025, 1, 31)
+            ))
+
+    def bundle(self, settlements, workers):
+        buffer = io.BytesIO()
+        with CaptureQueriesContext(connection) as queries:
+            count = write_pdf_bundle(settlements, buffer, workers=workers)
+        with zipfile.ZipFile(buffer) as bundle:
+            pdfs = {name: bundle.read(name) for name in bundle.namelist()}
+        self.assertEqual(count, len(pdfs))
+        return pdfs, len(queries)
+
+    def test_one_pdf_per_settlement_with_constant_queries(self):
+        one, few_queries = self.bundle(Settlement.objects.filter(professional=self.professionals[0]), workers=1)
+        pdfs, many_queries = self.bundle(Settlement.objects.order_by('id'), workers=1)
+        self.assertEqual(len(one), 1)
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(set(pdfs), {f'liquidacion_{settlement.id}.pdf' for settlement in Settlement.objects.all()})
+        self.assertTrue(all(pdf.startswith(b'%PDF') for pdf in pdfs.values()))
+
+    def test_process_pool_renders_the_same_files(self):
+        pdfs, _ = self.bundle(Settlement.objects.order_by('id'), workers=2)
+        self.assertEqual(len(pdfs), 3)
+        self.assertTrue(all(pdf.startswith(b'%PDF') for pdf in pdfs.values()))
+
+
+class SettlementPdfCacheTests(TestCase):
+    """Caché en disco del PDF de una liquidación (export_pdf)"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = mock.patch('payments.pdf_cache.PDF_CACHE_DIR', self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        professionals, self.services = create_catalog(professionals=1, services=2)
+        self.professional = professionals[0]
+        create_attentions(professionals, self.services, 4)
+        self.settlement = Settlement.objects.create(
+            professional=self.professional, period_start=date(2025, 1, 1), period_end=date(2025, 1, 31)
+        )
+        calculate_settlement(self.settlement)
+        self.client = admin_client()
+        self.url = f'/api/settlements/{self.settlement.id}/export_pdf/'
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        response.close()
+        return response, content
+
+    def test_hit_reuses_the_file_and_recalculation_changes_the_fingerprint(self):
+        first, content = self.download()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(content.startswith(b'%PDF'))
+        etag = first['ETag']
+
+        with mock.patch('payments.views.render_settlement_summary_pdf') as render:
+            second, cached = self.download()
+        render.assert_not_called()
+        self.assertEqual(cached, content)
+        self.assertEqual(second['ETag'], etag)
+
+        not_modified, _ = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+        create_attentions([self.professional], self.services, 2, start=datetime(2025, 1, 20, 9))
+        with self.captureOnCommitCallbacks(execute=True):
+            calculate_settlement(Settlement.objects.get(pk=self.settlement.pk))
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+        third, _ = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
+
+
+class AuditRetentionTests(TestCase):
+    """Limpieza por lotes de la auditoría (purge_audit_logs)"""
+
+    def setUp(self):
+        self.cutoff = datetime(2024, 6, 1, tzinfo=dt_timezone.utc)
+        self.expired = [
+            AuditLog.objects.create(
+                action='update', model_name='Service', object_id=str(index),
+                created_at=self.cutoff - timedelta(days=index + 1)
+            )
+            for index in range(5)
+        ]
+        self.kept = AuditLog.objects.create(
+            action='update', model_name='Service', object_id='kept', created_at=self.cutoff
+        )
+
+    def test_batches_archive_only_expired_rows(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            result = purge_audit_logs(self.cutoff, batch_size=2, time_budget=0, archive=True, archive_dir=archive_dir)
+            with gzip.open(result['archive'], 'rt', encoding='utf-8') as archive:
+                archived = [json.loads(line)['id'] for line in archive]
+
+        self.assertEqual(result['deleted'], 5)
+        self.assertEqual(result['batches'], 3)
+        self.assertTrue(result['complete'])
+        self.assertEqual(sorted(archived), sorted(str(log.id) for log in self.expired))
+        self.assertEqual(list(AuditLog.objects.values_list('id', flat=True)), [self.kept.id])
+
+    def test_time_budget_stops_after_one_batch(self):
+        result = purge_audit_logs(self.cutoff, batch_size=2, time_budget=1e-9)
+
+        self.assertEqual(result['batches'], 1)
+        self.assertEqual(result['deleted'], 2)
+        self.assertFalse(result['complete'])
+        self.assertEqual(AuditLog.objects.count(), 4)
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from payments.views import (
     UserViewSet, ProfessionalViewSet, ServiceViewSet, AttentionViewSet,
-    DiscountViewSet, InsuranceDiscountViewSet, SettlementViewSet, AuditLogViewSet
+    DiscountViewSet, InsuranceDiscountViewSet, SettlementViewSet, SettlementBatchViewSet,
+    DashboardViewSet, ExportJobViewSet, AuditLogViewSet
 )
 from payments.auth_views import login_view, refresh_token_view, api_root
 
@@ -14,7 +15,10 @@ router.register(r'attentions', AttentionViewSet, basename='attention')
 router.register(r'discounts', DiscountViewSet, basename='discount')
 router.register(r'insurance-discounts', InsuranceDiscountViewSet, basename='insurance-discount')
 router.register(r'settlements', SettlementViewSet, basename='settlement')
+router.register(r'settlement-batches', SettlementBatchViewSet, basename='settlement-batch')
+router.register(r'exports', ExportJobViewSet, basename='export-job')
 router.register(r'audit-logs', AuditLogViewSet, basename='audit-log')
+router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 
 urlpatterns = [
     path('', api_root, name='api-root'),
@@ -1,29 +1,52 @@
+import os
+import uuid
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.http import FileResponse
-from django.db.models import Sum, Q, F
+from django.db.models import Count, Sum, Q, F
+from django.db.models.functions import TruncMonth
+from django.urls import reverse
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.contrib.auth.models import User
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.db import transaction
 
 from payments.models import (
-    Professional, Service, Attention, Discount, InsuranceDiscount,
-    Settlement, SettlementLineItem, SettlementDiscount, UserProfile, AuditLog
+    Professional, Service, Attention, AttentionDailyRollup, Discount, InsuranceDiscount, ExportJob,
+    Settlement, SettlementBatch, SettlementLineItem, SettlementDiscount, UserProfile, AuditLog,
+    AuditArchiveSegment
 )
 from payments.serializers import (
     ProfessionalSerializer, ServiceSerializer, AttentionSerializer,
-    DiscountSerializer, InsuranceDiscountSerializer, AuditLogSerializer,
+    DiscountSerializer, InsuranceDiscountSerializer, AuditLogSerializer, AuditLogCompactSerializer,
     SettlementDetailSerializer, SettlementListSerializer,
     SettlementCreateSerializer, SettlementLineItemSerializer,
-    SettlementDiscountSerializer, UserSerializer
+    SettlementDiscountSerializer, SettlementBatchSerializer, ExportJobSerializer, UserSerializer,
+    AuditArchiveSegmentSerializer
 )
 from payments.permissions import IsAdmin, IsProfessional, IsAdminOrOwnAttention
+from payments.principal import request_principal
+from payments.pagination import AttentionPagination, AuditLogPagination, AuditArchivePagination
+from payments.dashboard import get_dashboard_summary
+from payments.money import ZERO
+from payments.exports import settlements_excel_response
+from payments.export_jobs import normalize_export_filters, enqueue_export
+from payments.caching import CatalogCacheMixin
+from payments.conditional import CatalogConditionalGetMixin, ConditionalGetMixin
+from payments.pdf_cache import settlement_pdf_fingerprint, get_cached_pdf, store_pdf
+from payments.reports import render_settlement_summary_pdf
 from payments.audit import log_audit, get_changed_fields
+from payments.attention_import import ImportFileError, import_attentions, import_format
+from payments.audit_storage import archive_filters
+from payments.audit_summary import audit_summary
+from payments.rollups import ROLLUP_GROUPS, rollup_totals, rollup_breakdown
+from payments.settlements import (
+    calculate_settlement, recalculate_settlement, ensure_period_drafts, start_settlement_batch
+)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -149,7 +172,7 @@ class UserViewSet(viewsets.ModelViewSet):
         })
 
 
-class ProfessionalViewSet(viewsets.ModelViewSet):
+class ProfessionalViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar profesionales"""
     queryset = Professional.objects.all()
     serializer_class = ProfessionalSerializer
@@ -162,17 +185,12 @@ class ProfessionalViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def active_professionals(self, request):
         """Obtiene solo los profesionales activos, filtrado por rol"""
-        user = request.user
-        
         # Si es admin, puede ver todos los profesionales
-        if hasattr(user, 'profile') and user.profile.role == 'admin':
+        if request_principal(request).is_admin:
             active = Professional.objects.filter(status='active')
         else:
             # Si no es admin, solo puede ver su propio perfil profesional
-            try:
-                active = Professional.objects.filter(user=user, status='active')
-            except:
-                active = Professional.objects.none()
+            active = Professional.objects.filter(user_id=request.user.pk, status='active')
         
         serializer = self.get_serializer(active, many=True)
         return Response(serializer.data)
@@ -186,8 +204,8 @@ class ProfessionalViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
-    """ViewSet para gestionar servicios/prestaciones"""
+class ServiceViewSet(CatalogConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    """ViewSet para gestionar servicios/prestaciones (lecturas cacheadas si ENABLE_CACHE=True)"""
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     permission_classes = [IsAuthenticated]
@@ -195,18 +213,16 @@ class ServiceViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'code']
     ordering_fields = ['name', 'base_price']
     ordering = ['name']
-    
-    @method_decorator(cache_page(60 * 5))  # Cache 5 minutos si ENABLE_CACHE=True
-    def list(self, request, *args, **kwargs):
-        """Obtiene lista de servicios - Cacheado si se habilita"""
-        return super().list(request, *args, **kwargs)
+    cache_namespace = 'service'
     
     @action(detail=False, methods=['get'])
     def active_services(self, request):
         """Obtiene solo los servicios activos"""
-        active = Service.objects.filter(is_active=True)
-        serializer = self.get_serializer(active, many=True)
-        return Response(serializer.data)
+        def build():
+            active = Service.objects.filter(is_active=True)
+            serializer = self.get_serializer(active, many=True)
+            return Response(serializer.data)
+        return self.cached_response(request, build)
 
 
 class AttentionViewSet(viewsets.ModelViewSet):
@@ -214,35 +230,41 @@ class AttentionViewSet(viewsets.ModelViewSet):
     queryset = Attention.objects.all()
     serializer_class = AttentionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AttentionPagination
     filterset_fields = ['professional', 'service', 'status']
     search_fields = ['patient_name', 'patient_id']
     ordering_fields = ['date', 'amount_charged']
-    ordering = ['-date']
+    ordering = ['-date', '-id']
     
     def get_queryset(self):
         """Filtrar atenciones según el rol del usuario"""
-        user = self.request.user
+        principal = request_principal(self.request)
+        queryset = Attention.objects.select_related('professional__user', 'service')
         
         # Si es admin, puede ver todas las atenciones
-        if hasattr(user, 'profile') and user.profile.role == 'admin':
-            return Attention.objects.all()
+        if principal.is_admin:
+            return queryset
         
         # Si no es admin, solo puede ver sus propias atenciones
-        try:
-            professional = user.professional_profile
-            return Attention.objects.filter(professional=professional)
-        except:
-            # Si no tiene perfil de profesional, no puede ver ninguna atención
-            return Attention.objects.none()
+        if principal.professional_id:
+            return queryset.filter(professional_id=principal.professional_id)
+        
+        # Si no tiene perfil de profesional, no puede ver ninguna atención
+        return Attention.objects.none()
+    
+    def _paginated_response(self, queryset):
+        """Serializa un queryset paginado (cursor por defecto) con los filtros de la vista"""
+        page = self.paginate_queryset(self.filter_queryset(queryset))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def professional_attentions(self, request):
         """Obtiene atenciones de un profesional específico"""
         professional_id = request.query_params.get('professional_id')
         if professional_id:
-            attentions = Attention.objects.filter(professional_id=professional_id)
-            serializer = self.get_serializer(attentions, many=True)
-            return Response(serializer.data)
+            attentions = self.get_queryset().filter(professional_id=professional_id)
+            return self._paginated_response(attentions)
         return Response({'error': 'professional_id is required'}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
@@ -255,16 +277,110 @@ class AttentionViewSet(viewsets.ModelViewSet):
             try:
                 start = datetime.fromisoformat(start_date)
                 end = datetime.fromisoformat(end_date)
-                attentions = Attention.objects.filter(date__range=[start, end])
-                serializer = self.get_serializer(attentions, many=True)
-                return Response(serializer.data)
+                attentions = self.get_queryset().filter(date__range=[start, end])
+                return self._paginated_response(attentions)
             except ValueError:
                 return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'error': 'start_date and end_date are required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'])
+    def rollup(self, request):
+        """
+        Totales de atenciones en un rango de días, leídos de los totales
+        diarios precalculados (payments.rollups).
+        
+        Parámetros:
+        - start_date, end_date (AAAA-MM-DD, obligatorios)
+        - group_by: date, professional, service, health_insurance o status (por defecto date)
+        - status: estado de las atenciones (por defecto completed; 'all' para todos)
+        - professional, service: filtros opcionales
+        """
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        group_by = request.query_params.get('group_by', 'date')
+        status_filter = request.query_params.get('status', 'completed')
+        
+        if not start_date or not end_date:
+            return Response({'error': 'start_date and end_date are required'}, status=status.HTTP_400_BAD_REQUEST)
+        if group_by not in ROLLUP_GROUPS:
+            return Response(
+                {'error': f"group_by debe ser uno de: {', '.join(ROLLUP_GROUPS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = datetime.fromisoformat(start_date).date()
+            end = datetime.fromisoformat(end_date).date()
+        except ValueError:
+            return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            professional = request.query_params.get('professional')
+            service = request.query_params.get('service')
+            professional_id = uuid.UUID(professional) if professional else None
+            service_id = uuid.UUID(service) if service else None
+        except ValueError:
+            return Response({'error': 'Invalid professional or service id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Mismo alcance que get_queryset: admin todo, profesional lo suyo
+        principal = request_principal(request)
+        rollups = AttentionDailyRollup.objects.filter(date__gte=start, date__lte=end)
+        if not principal.is_admin:
+            if not principal.professional_id:
+                rollups = rollups.none()
+            else:
+                rollups = rollups.filter(professional_id=principal.professional_id)
+        
+        if status_filter != 'all':
+            rollups = rollups.filter(status=status_filter)
+        if professional_id:
+            rollups = rollups.filter(professional_id=professional_id)
+        if service_id:
+            rollups = rollups.filter(service_id=service_id)
+        
+        return Response({
+            'start_date': start,
+            'end_date': end,
+            'group_by': group_by,
+            'totals': rollup_totals(rollups),
+            'results': rollup_breakdown(rollups, group_by),
+        })
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdmin])
+    def bulk_import(self, request):
+        """
+        Importación masiva de atenciones desde un archivo CSV o XLSX
+        (multipart, campo 'file'); ver payments.attention_import para las
+        columnas aceptadas.
+        
+        Parámetros:
+        - dry_run: 'true' para solo validar sin insertar
+        
+        Retorna el reporte con las filas creadas y los errores por fila.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        
+        try:
+            report = import_attentions(upload, import_format(upload.name), dry_run=dry_run)
+        except ImportFileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if report['created']:
+            log_audit(
+                user=request.user,
+                action='create',
+                model_name='Attention',
+                object_id='bulk_import',
+                object_description=f"Importación de {upload.name}: {report['created']} atenciones",
+                new_values={key: report[key] for key in ('total_rows', 'created', 'failed')},
+                request=request
+            )
+        return Response(report)
 
 
-class DiscountViewSet(viewsets.ModelViewSet):
-    """ViewSet para gestionar descuentos y retenciones"""
+class DiscountViewSet(CatalogConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    """ViewSet para gestionar descuentos y retenciones (lecturas cacheadas si ENABLE_CACHE=True)"""
     queryset = Discount.objects.all()
     serializer_class = DiscountSerializer
     permission_classes = [IsAuthenticated]
@@ -272,26 +388,31 @@ class DiscountViewSet(viewsets.ModelViewSet):
     search_fields = ['name']
     ordering_fields = ['name', 'value']
     ordering = ['name']
+    cache_namespace = 'discount'
     
     @action(detail=False, methods=['get'])
     def active_discounts(self, request):
         """Obtiene solo los descuentos activos"""
-        active = Discount.objects.filter(is_active=True)
-        serializer = self.get_serializer(active, many=True)
-        return Response(serializer.data)
+        def build():
+            active = Discount.objects.filter(is_active=True)
+            serializer = self.get_serializer(active, many=True)
+            return Response(serializer.data)
+        return self.cached_response(request, build)
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """Obtiene descuentos por categoría"""
         category = request.query_params.get('category')
         if category:
-            discounts = Discount.objects.filter(category=category)
-            serializer = self.get_serializer(discounts, many=True)
-            return Response(serializer.data)
+            def build():
+                discounts = Discount.objects.filter(category=category)
+                serializer = self.get_serializer(discounts, many=True)
+                return Response(serializer.data)
+            return self.cached_response(request, build)
         return Response({'error': 'category is required'}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SettlementViewSet(viewsets.ModelViewSet):
+class SettlementViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ViewSet para gestionar liquidaciones"""
     queryset = Settlement.objects.all()
     permission_classes = [IsAuthenticated]
@@ -310,7 +431,14 @@ class SettlementViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def calculate(self, request, pk=None):
-        """Calcula o recalcula una liquidación"""
+        """
+        Calcula o recalcula una liquidación.
+        
+        Parámetros (body):
+        - mode: 'incremental' (por defecto) solo reescribe los ítems de las
+          atenciones que cambiaron desde el último cálculo; 'full' reconstruye
+          todos los ítems desde cero
+        """
         settlement = self.get_object()
         
         # Permitir cálculo en draft y calculated, pero no en approved o paid
@@ -320,13 +448,25 @@ class SettlementViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        mode = request.data.get('mode', 'incremental')
+        if mode not in ['incremental', 'full']:
+            return Response(
+                {'error': "mode debe ser 'incremental' o 'full'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         try:
-            self._calculate_settlement(settlement)
+            if mode == 'full':
+                self._calculate_settlement(settlement)
+                recalculation = {'mode': 'full'}
+            else:
+                recalculation = recalculate_settlement(settlement)
             settlement.status = 'calculated'
             settlement.save()
             
-            serializer = SettlementDetailSerializer(settlement)
-            return Response(serializer.data)
+            data = SettlementDetailSerializer(settlement).data
+            data['recalculation'] = recalculation
+            return Response(data)
         except Exception as e:
             return Response(
                 {'error': str(e)},
@@ -352,89 +492,38 @@ class SettlementViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def export_pdf(self, request, pk=None):
-        """Exporta una liquidación como PDF"""
+        """
+        Exporta una liquidación como PDF.
+        
+        El PDF se cachea en disco por contenido (totales, ítems y updated_at),
+        así las descargas repetidas leen el archivo en lugar de renderizarlo.
+        Soporta If-None-Match / If-Modified-Since (304).
+        """
         settlement = self.get_object()
         
         try:
-            from io import BytesIO
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib import colors
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter, title=f"Liquidacion_{settlement.id}")
-            
-            styles = getSampleStyleSheet()
-            story = []
+            fingerprint = settlement_pdf_fingerprint(settlement)
+            etag = f'"{fingerprint}"'
+            last_modified = int(settlement.updated_at.timestamp())
             
-            # Título
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                textColor=colors.HexColor('#333333'),
-                spaceAfter=30,
-                alignment=1
-            )
-            story.append(Paragraph(f"Liquidación #{settlement.id}", title_style))
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Información básica
-            professional_name = settlement.professional.user.get_full_name() or settlement.professional.user.username
-            info_data = [
-                ['Profesional:', professional_name],
-                ['Período:', f"{settlement.period_start.strftime('%d/%m/%Y')} - {settlement.period_end.strftime('%d/%m/%Y')}"],
-                ['Estado:', settlement.status.upper()],
-                ['Fecha de Generación:', settlement.created_at.strftime('%d/%m/%Y %H:%M')],
-            ]
-            
-            info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-            info_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#333333')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            story.append(info_table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Tabla de montos
-            amounts_data = [
-                ['Concepto', 'Monto'],
-                ['Comisión Total', f"${settlement.total_commission:,.2f}"],
-                ['Descuentos', f"${settlement.total_discounts or 0:,.2f}"],
-                ['Monto Neto', f"${settlement.net_amount:,.2f}"],
-            ]
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return not_modified
             
-            amounts_table = Table(amounts_data, colWidths=[3*inch, 3*inch])
-            amounts_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5b6ef5')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#f0f0f0')),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            story.append(amounts_table)
+            path = get_cached_pdf(settlement.id, fingerprint)
+            if path is None:
+                path = store_pdf(settlement.id, fingerprint, render_settlement_summary_pdf(settlement))
             
-            # Generar PDF
-            doc.build(story)
-            buffer.seek(0)
-            
-            return FileResponse(
-                buffer,
+            response = FileResponse(
+                open(path, 'rb'),
                 as_attachment=True,
                 filename=f"liquidacion_{settlement.id}.pdf",
                 content_type='application/pdf'
             )
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            return response
         except Exception as e:
             return Response({
                 'error': f'Error generando PDF: {str(e)}'
@@ -442,82 +531,18 @@ class SettlementViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def export_excel(self, request):
-        """Exporta liquidaciones como Excel"""
+        """
+        Exporta liquidaciones como Excel.
+        
+        El archivo se genera con una hoja write-only alimentada por una sola
+        consulta y se envía en streaming (memoria constante).
+        """
         try:
-            from io import BytesIO
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            
-            # Obtener todas las liquidaciones
             settlements = Settlement.objects.all().order_by('-period_end')
             
-            # Crear workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Liquidaciones"
-            
-            # Estilos
-            header_fill = PatternFill(start_color="5B6EF5", end_color="5B6EF5", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF", size=11)
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            # Headers
-            headers = ['ID', 'Profesional', 'Período Inicio', 'Período Fin', 'Comisión Total', 'Descuentos', 'Monto Neto', 'Estado', 'Fecha Creación']
-            ws.append(headers)
-            
-            # Aplicar estilos a headers
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border
-            
-            # Ancho de columnas
-            ws.column_dimensions['A'].width = 10
-            ws.column_dimensions['B'].width = 20
-            ws.column_dimensions['C'].width = 15
-            ws.column_dimensions['D'].width = 15
-            ws.column_dimensions['E'].width = 15
-            ws.column_dimensions['F'].width = 12
-            ws.column_dimensions['G'].width = 15
-            ws.column_dimensions['H'].width = 12
-            ws.column_dimensions['I'].width = 15
-            
-            # Datos
-            for settlement in settlements:
-                row = [
-                    str(settlement.id),
-                    settlement.professional.user.get_full_name() or settlement.professional.user.username,
-                    settlement.period_start.strftime('%d/%m/%Y'),
-                    settlement.period_end.strftime('%d/%m/%Y'),
-                    settlement.total_commission,
-                    settlement.total_discounts or 0,
-                    settlement.net_amount,
-                    settlement.status.upper(),
-                    settlement.created_at.strftime('%d/%m/%Y %H:%M')
-                ]
-                ws.append(row)
-                
-                # Aplicar bordes a datos
-                for cell in ws[ws.max_row]:
-                    cell.border = border
-                    cell.alignment = Alignment(horizontal='right' if cell.column > 1 else 'left')
-            
-            # Guardar en buffer
-            buffer = BytesIO()
-            wb.save(buffer)
-            buffer.seek(0)
-            
-            return FileResponse(
-                buffer,
-                as_attachment=True,
-                filename=f"liquidaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            return settlements_excel_response(
+                settlements,
+                filename=f"liquidaciones_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
             )
         except Exception as e:
             return Response({
@@ -547,7 +572,13 @@ class SettlementViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def generate_for_period(self, request):
-        """Genera liquidaciones para un período específico para todos los profesionales"""
+        """
+        Genera liquidaciones para un período específico para todos los profesionales.
+        
+        Los borradores faltantes se crean en bloque; la respuesta distingue
+        las liquidaciones creadas (created_count) de las que ya existían
+        (existing_count).
+        """
         period_start = request.data.get('period_start')
         period_end = request.data.get('period_end')
         
@@ -566,27 +597,60 @@ class SettlementViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        professionals = Professional.objects.filter(status='active')
-        settlements = []
-        
-        for professional in professionals:
-            settlement, created = Settlement.objects.get_or_create(
-                professional=professional,
-                period_start=start_date,
-                period_end=end_date,
-                defaults={'status': 'draft'}
-            )
-            settlements.append(settlement)
+        created_ids, existing_ids = ensure_period_drafts(start_date, end_date, created_by=request.user)
+        settlements = Settlement.objects.filter(
+            id__in=created_ids + existing_ids
+        ).select_related('professional__user')
         
         serializer = SettlementListSerializer(settlements, many=True)
         return Response({
-            'created_count': len([s for s in settlements if s.status == 'draft']),
+            'created_count': len(created_ids),
+            'existing_count': len(existing_ids),
             'settlements': serializer.data
         })
     
-    @action(detail=False, methods=['get'])
-    def report(self, request):
-        """Genera un reporte de liquidaciones"""
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdmin])
+    def close_period(self, request):
+        """
+        Cierre de período: crea los borradores faltantes y calcula todas las
+        liquidaciones del período en paralelo (Celery group/chord).
+        
+        Retorna de inmediato el lote creado; el progreso se consulta en
+        /api/settlement-batches/{id}/
+        """
+        period_start = request.data.get('period_start')
+        period_end = request.data.get('period_end')
+        
+        if not period_start or not period_end:
+            return Response(
+                {'error': 'period_start and period_end are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            start_date = datetime.fromisoformat(period_start).date()
+            end_date = datetime.fromisoformat(period_end).date()
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        from payments.tasks import dispatch_settlement_batch
+        
+        batch, settlement_ids = start_settlement_batch(start_date, end_date, created_by=request.user)
+        dispatch_settlement_batch(batch, settlement_ids)
+        batch.refresh_from_db()
+        
+        return Response(SettlementBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+    
+    REPORT_GROUP_BY = {
+        'professional': ['professional_id', 'professional__user__first_name', 'professional__user__last_name'],
+        'month': ['month'],
+    }
+    
+    def _report_queryset(self, request):
+        """Liquidaciones filtradas por start_date, end_date y status (parámetros del reporte)"""
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         status_filter = request.query_params.get('status')
@@ -610,47 +674,117 @@ class SettlementViewSet(viewsets.ModelViewSet):
         if status_filter:
             filters &= Q(status=status_filter)
         
-        settlements = Settlement.objects.filter(filters)
+        return Settlement.objects.filter(filters)
+    
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        Genera un reporte de liquidaciones.
+        
+        Todos los estados se calculan con una sola consulta GROUP BY status.
+        
+        Parámetros:
+        - start_date, end_date, status: filtros del reporte
+        - group_by: 'professional', 'month' o 'professional,month' para
+          agregar además por profesional y/o mes de fin de período
+        
+        El detalle de liquidaciones se obtiene paginado en report_details
+        con los mismos filtros (ver details_url).
+        """
+        settlements = self._report_queryset(request)
+        
+        group_by = [
+            key.strip() for key in request.query_params.get('group_by', '').split(',') if key.strip()
+        ]
+        invalid = [key for key in group_by if key not in self.REPORT_GROUP_BY]
+        if invalid:
+            return Response(
+                {'error': f"group_by inválido: {', '.join(invalid)}. Opciones: professional, month"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        by_status = {label: {'count': 0, 'total': 0.0} for _, label in Settlement.STATUS_CHOICES}
+        status_labels = dict(Settlement.STATUS_CHOICES)
+        total_settlements = 0
+        total_amount = ZERO
+        for row in settlements.order_by().values('status').annotate(
+            count=Count('id'), total=Sum('net_amount')
+        ):
+            total = row['total'] or ZERO
+            total_settlements += row['count']
+            total_amount += total
+            by_status[status_labels.get(row['status'], row['status'])] = {
+                'count': row['count'],
+                'total': float(total)
+            }
+        
+        details_url = request.build_absolute_uri(
+            reverse('settlement-report-details')
+        )
+        if request.query_params:
+            details_url += '?' + request.query_params.urlencode()
         
         report_data = {
-            'total_settlements': settlements.count(),
-            'total_amount': float(settlements.aggregate(Sum('net_amount'))['net_amount__sum'] or 0),
-            'by_status': {},
-            'settlements': SettlementListSerializer(settlements, many=True).data
+            'total_settlements': total_settlements,
+            'total_amount': float(total_amount),
+            'by_status': by_status,
+            'details_url': details_url,
         }
         
-        for status_choice in Settlement.STATUS_CHOICES:
-            status_key = status_choice[0]
-            count = settlements.filter(status=status_key).count()
-            total = float(settlements.filter(status=status_key).aggregate(Sum('net_amount'))['net_amount__sum'] or 0)
-            report_data['by_status'][status_choice[1]] = {
-                'count': count,
-                'total': total
-            }
+        if group_by:
+            fields = [field for key in group_by for field in self.REPORT_GROUP_BY[key]]
+            grouped = settlements.order_by()
+            if 'month' in group_by:
+                grouped = grouped.annotate(month=TruncMonth('period_end'))
+            groups = []
+            for row in grouped.values(*fields).annotate(
+                count=Count('id'),
+                total_commission=Sum('total_commission'),
+                total_amount=Sum('net_amount'),
+            ).order_by(*fields):
+                group = {}
+                if 'professional' in group_by:
+                    group['professional'] = str(row['professional_id'])
+                    group['professional_name'] = f"{row['professional__user__first_name']} {row['professional__user__last_name']}".strip()
+                if 'month' in group_by:
+                    group['month'] = row['month'].strftime('%Y-%m') if row['month'] else None
+                group['count'] = row['count']
+                group['total_commission'] = float(row['total_commission'] or 0)
+                group['total_amount'] = float(row['total_amount'] or 0)
+                groups.append(group)
+            report_data['group_by'] = group_by
+            report_data['groups'] = groups
         
         return Response(report_data)
     
+    @action(detail=False, methods=['get'])
+    def report_details(self, request):
+        """Detalle paginado de las liquidaciones del reporte (mismos filtros que report)"""
+        settlements = self._report_queryset(request).select_related(
+            'professional__user'
+        ).order_by('-period_end', '-id')
+        page = self.paginate_queryset(settlements)
+        serializer = SettlementListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
     @transaction.atomic  # ACID: Si falla algo, TODO se revierte
     def _calculate_settlement(self, settlement):
         """
         Calcula los montos de una liquidación (con garantía ACID).
         
         Descripción Detallada:
-        1. Obtiene todas las atenciones completadas en el período de la liquidación
-        2. Itera cada atención y calcula su comisión (considerando descuentos por aseguradora)
-        3. Crea SettlementLineItem para cada atención (auditoría histórica)
+        Delega en payments.settlements.calculate_settlement, que resuelve el
+        cálculo con operaciones de conjunto en lugar de iterar cada atención:
+        1. Usa la comisión guardada en cada atención (Attention.commission_amount)
+        2. Crea todos los SettlementLineItem con un único bulk_create
+        3. Acumula total atendido y comisión total en Decimal exacto
         4. Aplica descuentos y retenciones obligatorias del sistema
         5. Registra cada descuento en SettlementDiscount (para trazabilidad)
         6. Calcula el monto neto final
         
         Garantía ACID (Atomicidad):
-        Si falla en cualquier punto durante la ejecución:
-        - Validación de datos
-        - Cálculo de comisiones
-        - Creación de ítems o descuentos
-        - Guardado de liquidación
-        TODAS las operaciones se revierten (rollback automático)
-        No queda estado inconsistente en la BD
+        Si falla en cualquier punto durante la ejecución TODAS las operaciones
+        se revierten (rollback automático). No queda estado inconsistente en la BD
         
         Args:
             settlement (Settlement): La liquidación a calcular
@@ -659,96 +793,128 @@ class SettlementViewSet(viewsets.ModelViewSet):
             Exception: Si hay error (se revierte todo automáticamente)
             
         Side Effects:
-        - Limpia SettlementLineItem previos de esta liquidación
-        - Limpia SettlementDiscount previos de esta liquidación
-        - Crea nuevos registros de línea para cada atención
-        - Crea nuevos registros de descuento para cada descuento aplicado
+        - Reemplaza SettlementLineItem y SettlementDiscount previos de esta liquidación
         - Actualiza todos los campos totales de la liquidación
         """
-        # Obtener todas las atenciones en el período que ya fueron completadas
-        attentions = Attention.objects.filter(
-            professional=settlement.professional,
-            date__date__gte=settlement.period_start,
-            date__date__lte=settlement.period_end,
-            status='completed'  # Solo atenciones completadas
-        )
+        return calculate_settlement(settlement)
+
+
+class SettlementBatchViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet para consultar el progreso de los cierres de período (solo lectura)"""
+    queryset = SettlementBatch.objects.all()
+    serializer_class = SettlementBatchSerializer
+    permission_classes = [IsAuthenticated, IsAdmin]
+    filterset_fields = ['status']
+    ordering_fields = ['created_at', 'period_end']
+    ordering = ['-created_at']
+
+
+class ExportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet para exportaciones en segundo plano.
+    
+    POST crea (o reutiliza, si hay una idéntica en curso) una exportación de
+    liquidaciones; GET consulta su estado y download descarga el archivo.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_fields = ['status', 'format']
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
+    
+    def _is_admin(self):
+        return request_principal(self.request).is_admin_or_superuser
+    
+    def get_queryset(self):
+        """Admin ve todas las exportaciones, el resto solo las propias"""
+        if self._is_admin():
+            return ExportJob.objects.all()
+        return ExportJob.objects.filter(created_by_id=self.request.user.pk)
+    
+    def create(self, request):
+        """
+        Encola una exportación de liquidaciones.
         
-        # Limpiar ítems previos
-        SettlementLineItem.objects.filter(settlement=settlement).delete()
-        SettlementDiscount.objects.filter(settlement=settlement).delete()
+        Parámetros (body):
+        - format: 'xlsx', 'csv' o 'pdf_zip'
+        - start_date, end_date, status, professional: filtros opcionales
         
-        # Calcular comisiones
-        total_attended = 0
-        total_commission = 0
+        Un profesional solo puede exportar sus propias liquidaciones.
+        Retorna 202 con el job creado, o 200 con el job idéntico en curso.
+        """
+        export_format = request.data.get('format', 'xlsx')
+        if export_format not in dict(ExportJob.FORMAT_CHOICES):
+            return Response(
+                {'error': f"format must be one of: {', '.join(dict(ExportJob.FORMAT_CHOICES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        for attention in attentions:
-            amount_charged = float(attention.amount_charged)
-            total_attended += amount_charged
-            
-            commission = float(attention.calculate_commission())
-            total_commission += commission
-            
-            SettlementLineItem.objects.create(
-                settlement=settlement,
-                attention=attention,
-                service_name=attention.service.name,
-                service_code=attention.service.code,
-                attendance_date=attention.date.date(),
-                amount_charged=attention.amount_charged,
-                commission_percentage=attention.commission_percentage or attention.service.commission_percentage,
-                commission_amount=commission
+        try:
+            filters = normalize_export_filters(request.data)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format'},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        settlement.total_attended = total_attended
-        settlement.total_commission = total_commission
-        
-        # Aplicar descuentos y retenciones
-        total_discounts = 0
-        total_retentions = 0
-        
-        discounts = Discount.objects.filter(is_active=True)
-        
-        for discount in discounts:
-            if discount.category == 'discount':
-                if discount.discount_type == 'percentage':
-                    discount_amount = (total_commission * discount.value) / 100
-                else:
-                    discount_amount = float(discount.value)
-                
-                total_discounts += discount_amount
-                
-                SettlementDiscount.objects.create(
-                    settlement=settlement,
-                    discount=discount,
-                    discount_type=discount.discount_type,
-                    discount_value=discount.value,
-                    discount_amount=discount_amount
-                )
-            
-            elif discount.category == 'retention':
-                if discount.discount_type == 'percentage':
-                    discount_amount = (total_commission * discount.value) / 100
-                else:
-                    discount_amount = float(discount.value)
-                
-                total_retentions += discount_amount
-                
-                SettlementDiscount.objects.create(
-                    settlement=settlement,
-                    discount=discount,
-                    discount_type=discount.discount_type,
-                    discount_value=discount.value,
-                    discount_amount=discount_amount
+        if not self._is_admin():
+            professional_id = request_principal(request).professional_id
+            if professional_id:
+                filters['professional'] = professional_id
+            else:
+                return Response(
+                    {'error': 'Solo administradores y profesionales pueden exportar liquidaciones'},
+                    status=status.HTTP_403_FORBIDDEN
                 )
         
-        settlement.total_discounts = total_discounts
-        settlement.total_retentions = total_retentions
-        settlement.net_amount = total_commission - total_discounts - total_retentions
-        settlement.save()
+        job, created = enqueue_export(export_format, filters, created_by=request.user)
+        if created:
+            from payments.tasks import dispatch_export_job
+            dispatch_export_job(job)
+            job.refresh_from_db()
+        
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Descarga el archivo de una exportación completada"""
+        job = self.get_object()
+        
+        if job.status == 'expired':
+            return Response({'error': 'La exportación expiró'}, status=status.HTTP_410_GONE)
+        if job.status != 'completed' or not job.file:
+            return Response(
+                {'error': 'La exportación aún no está lista', 'status': job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.file.name)
+        )
 
 
-class InsuranceDiscountViewSet(viewsets.ModelViewSet):
-    """ViewSet para gestionar descuentos por aseguradora"""
+class DashboardViewSet(viewsets.ViewSet):
+    """ViewSet con los indicadores agregados del dashboard"""
+    permission_classes = [IsAuthenticated]
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Resumen del dashboard calculado con agregaciones SQL agrupadas.
+        
+        El alcance depende del rol (admin ve todo, profesional solo lo suyo)
+        y el resultado se cachea por usuario.
+        """
+        return Response(get_dashboard_summary(request.user, request.auth))
+
+
+class InsuranceDiscountViewSet(CatalogConditionalGetMixin, CatalogCacheMixin, viewsets.ModelViewSet):
+    """ViewSet para gestionar descuentos por aseguradora (lecturas cacheadas si ENABLE_CACHE=True)"""
     queryset = InsuranceDiscount.objects.all()
     serializer_class = InsuranceDiscountSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
@@ -756,33 +922,92 @@ class InsuranceDiscountViewSet(viewsets.ModelViewSet):
     search_fields = ['insurance_name']
     ordering_fields = ['insurance_name', 'discount_value']
     ordering = ['insurance_name']
+    cache_namespace = 'insurance_discount'
     
     @action(detail=False, methods=['get'])
     def active_discounts(self, request):
         """Obtiene solo los descuentos por aseguradora activos"""
-        active = InsuranceDiscount.objects.filter(is_active=True)
-        serializer = self.get_serializer(active, many=True)
-        return Response(serializer.data)
+        def build():
+            active = InsuranceDiscount.objects.filter(is_active=True)
+            serializer = self.get_serializer(active, many=True)
+            return Response(serializer.data)
+        return self.cached_response(request, build)
 
 
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet para consultar logs de auditoría (solo lectura)"""
-    queryset = AuditLog.objects.all()
+    """
+    ViewSet para consultar logs de auditoría (solo lectura)
+    
+    Los listados se paginan por cursor sobre (created_at, id) y omiten
+    old_values y new_values salvo que se pida ?include_values=true; el
+    detalle siempre los incluye.
+    """
+    queryset = AuditLog.objects.select_related('user')
     serializer_class = AuditLogSerializer
     permission_classes = [IsAuthenticated, IsAdmin]
+    pagination_class = AuditLogPagination
     filterset_fields = ['user', 'action', 'model_name']
     search_fields = ['object_id', 'object_description', 'user__username']
     ordering_fields = ['created_at', 'user', 'action', 'model_name']
-    ordering = ['-created_at']
+    ordering = ['-created_at', '-id']
+    
+    def include_values(self):
+        if self.action == 'retrieve':
+            return True
+        return self.request.query_params.get('include_values', '').lower() in ('1', 'true', 'yes')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.include_values():
+            queryset = queryset.defer('old_values', 'new_values')
+        return queryset
+    
+    def get_serializer_class(self):
+        if not self.include_values():
+            return AuditLogCompactSerializer
+        return AuditLogSerializer
+    
+    def _paginated_response(self, queryset):
+        """Serializa un queryset paginado (cursor por defecto) con los filtros de la vista"""
+        page = self.paginate_queryset(self.filter_queryset(queryset))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Listado de auditoría. Con ?tier=archive consulta los meses archivados
+        (payments.audit_storage) con los mismos filtros y paginación por cursor;
+        admite además ?month=AAAA-MM para limitar la búsqueda a un mes.
+        """
+        if request.query_params.get('tier') != 'archive':
+            return super().list(request, *args, **kwargs)
+        
+        try:
+            filters = archive_filters(request.query_params)
+        except ValueError:
+            return Response(
+                {'error': 'user debe ser un id numérico y month tener formato AAAA-MM'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        paginator = AuditArchivePagination()
+        page = paginator.paginate_archive(request, filters)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def archive(self, request):
+        """Meses de auditoría archivados"""
+        segments = AuditArchiveSegment.objects.all()
+        serializer = AuditArchiveSegmentSerializer(segments, many=True)
+        return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def by_model(self, request):
         """Obtiene logs filtrados por modelo"""
         model_name = request.query_params.get('model_name')
         if model_name:
-            logs = AuditLog.objects.filter(model_name=model_name)
-            serializer = self.get_serializer(logs, many=True)
-            return Response(serializer.data)
+            return self._paginated_response(self.get_queryset().filter(model_name=model_name))
         return Response({'error': 'model_name is required'}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
@@ -790,33 +1015,30 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
         """Obtiene logs de cambios realizados por un usuario específico"""
         user_id = request.query_params.get('user_id')
         if user_id:
-            logs = AuditLog.objects.filter(user_id=user_id)
-            serializer = self.get_serializer(logs, many=True)
-            return Response(serializer.data)
+            return self._paginated_response(self.get_queryset().filter(user_id=user_id))
         return Response({'error': 'user_id is required'}, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Resumen de auditoría"""
-        total_logs = AuditLog.objects.count()
-        by_action = {}
-        by_model = {}
+        """
+        Resumen de auditoría por acción, modelo, día y usuario, leído de los
+        contadores diarios (payments.audit_summary).
         
-        for action_choice in AuditLog.ACTION_CHOICES:
-            action_key = action_choice[0]
-            count = AuditLog.objects.filter(action=action_key).count()
-            by_action[action_choice[1]] = count
+        Los contadores no se descuentan al purgar o archivar, por lo que los
+        totales incluyen eventos que ya no están en la tabla (la respuesta lo
+        indica con includes_purged y note).
         
-        for model_choice in AuditLog.MODEL_CHOICES:
-            model_key = model_choice[0]
-            count = AuditLog.objects.filter(model_name=model_key).count()
-            by_model[model_choice[1]] = count
+        Parámetros opcionales: start_date y end_date (AAAA-MM-DD)
+        """
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        try:
+            start = datetime.fromisoformat(start_date).date() if start_date else None
+            end = datetime.fromisoformat(end_date).date() if end_date else None
+        except ValueError:
+            return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'total_logs': total_logs,
-            'by_action': by_action,
-            'by_model': by_model
-        })
+        return Response(audit_summary(start, end))
         
         settlement.total_discounts = total_discounts
         settlement.total_retentions = total_retentions
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { settlementService, professionalService, attentionService } from '../services/api';
+import { settlementService, dashboardService } from '../services/api';
 import { formatCurrency, formatDate, showNotification } from '../utils/helpers';
 import { 
     LineChart, Line, BarChart, Bar, PieChart, Pie, Cell,
@@ -53,109 +53,39 @@ export default function Dashboard() {
         const fetchData = async () => {
             try {
                 setLoading(true);
-                
-                if (userRole === 'admin') {
-                    const [settlementsRes, professionalsRes] = await Promise.all([
-                        settlementService.getAll({ limit: 100 }),
-                        professionalService.getActive(),
-                    ]);
 
-                    const settlements = settlementsRes.data.results || settlementsRes.data;
-                    const professionals = professionalsRes.data;
+                // Un solo request: el backend agrega estados, totales y cifras por profesional
+                const { data: summary } = await dashboardService.getSummary();
 
-                    // Preparar datos para gráfico
-                    const chartData = settlements.slice(-10).map(s => ({
-                        name: formatDate(s.period_end).substring(0, 5),
-                        amount: parseFloat(s.net_amount) || 0
-                    }));
-
-                    // Datos de estados
-                    const statusCounts = {
-                        paid: settlements.filter(s => s.status === 'paid').length,
-                        approved: settlements.filter(s => s.status === 'approved').length,
-                        calculated: settlements.filter(s => s.status === 'calculated').length,
-                        pending: settlements.filter(s => s.status === 'pending').length,
-                    };
-
-                    const statusChartData = Object.entries(statusCounts)
-                        .filter(([_, value]) => value > 0)
-                        .map(([status, count]) => ({
-                            name: status.charAt(0).toUpperCase() + status.slice(1),
-                            value: count
-                        }));
-
-                    setChartData(chartData);
-                    setStatusData(statusChartData);
+                const recent = summary.recent_settlements || [];
 
-                    setStats({
-                        totalSettlements: settlements.length,
-                        totalAmount: settlements.reduce((sum, s) => sum + (parseFloat(s.net_amount) || 0), 0),
-                        pendingSettlements: settlements.filter(s => s.status !== 'paid').length,
-                        professionals: professionals.length,
-                        patientsAttended: 0,
-                    });
+                // Preparar datos para gráfico (orden cronológico)
+                const chartData = [...recent].reverse().map(s => ({
+                    name: formatDate(s.period_end).substring(0, 5),
+                    amount: parseFloat(s.net_amount) || 0
+                }));
 
-                    setRecentSettlements(settlements.slice(0, 5));
-                } else {
-                    const userInfo = localStorage.getItem('user_info');
-                    const user = JSON.parse(userInfo);
-                    const professionalId = user.professional_id;
-                    
-                    if (!professionalId) {
-                        setStats({
-                            totalSettlements: 0,
-                            totalAmount: 0,
-                            pendingSettlements: 0,
-                            professionals: 0,
-                            patientsAttended: 0,
-                        });
-                        setLoading(false);
-                        return;
-                    }
-                    
-                    const [attentionsRes, settlementsRes] = await Promise.all([
-                        attentionService.getAll({ limit: 100 }),
-                        settlementService.getAll({ limit: 100 }),
-                    ]);
-
-                    let attentions = attentionsRes.data.results || attentionsRes.data || [];
-                    let settlements = settlementsRes.data.results || settlementsRes.data || [];
-                    
-                    attentions = attentions.filter(a => a.professional === professionalId);
-                    settlements = settlements.filter(s => s.professional === professionalId);
-
-                    const chartData = settlements.slice(-10).map(s => ({
-                        name: formatDate(s.period_end).substring(0, 5),
-                        amount: parseFloat(s.net_amount) || 0
+                // Datos de estados
+                const statusChartData = Object.entries(summary.settlements.by_status)
+                    .filter(([status, bucket]) => status !== 'cancelled' && bucket.count > 0)
+                    .map(([status, bucket]) => ({
+                        name: status.charAt(0).toUpperCase() + status.slice(1),
+                        value: bucket.count
                     }));
 
-                    const statusCounts = {
-                        paid: settlements.filter(s => s.status === 'paid').length,
-                        approved: settlements.filter(s => s.status === 'approved').length,
-                        calculated: settlements.filter(s => s.status === 'calculated').length,
-                    };
-
-                    const statusChartData = Object.entries(statusCounts)
-                        .filter(([_, value]) => value > 0)
-                        .map(([status, count]) => ({
-                            name: status.charAt(0).toUpperCase() + status.slice(1),
-                            value: count
-                        }));
+                setChartData(chartData);
+                setStatusData(statusChartData);
 
-                    setChartData(chartData);
-                    setStatusData(statusChartData);
-                    
-                    setStats({
-                        totalSettlements: settlements.length,
-                        totalAmount: settlements.reduce((sum, s) => sum + (parseFloat(s.net_amount) || 0), 0),
-                        pendingSettlements: settlements.filter(s => s.status !== 'paid').length,
-                        professionals: 0,
-                        patientsAttended: attentions.length,
-                    });
+                setStats({
+                    totalSettlements: summary.settlements.total,
+                    totalAmount: parseFloat(summary.settlements.total_amount) || 0,
+                    pendingSettlements: summary.settlements.pending,
+                    professionals: summary.professionals.active,
+                    patientsAttended: summary.attentions.total,
+                });
 
-                    setRecentAttentions(attentions.slice(0, 5));
-                    setRecentSettlements(settlements.slice(0, 5));
-                }
+                setRecentSettlements(recent.slice(0, 5));
+                setRecentAttentions(summary.recent_attentions || []);
             } catch (error) {
                 console.error('Error fetching dashboard data:', error);
             } finally {
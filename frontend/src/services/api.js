@@ -94,6 +94,17 @@ export const attentionService = {
     getByDateRange: (startDate, endDate) => api.get('/attentions/date_range/', { 
         params: { start_date: startDate, end_date: endDate } 
     }),
+    getRollup: (startDate, endDate, params) => api.get('/attentions/rollup/', { 
+        params: { start_date: startDate, end_date: endDate, ...params } 
+    }),
+    bulkImport: (file, dryRun = false) => {
+        const formData = new FormData();
+        formData.append('file', file);
+        formData.append('dry_run', dryRun);
+        return api.post('/attentions/bulk_import/', formData, {
+            headers: { 'Content-Type': 'multipart/form-data' }
+        });
+    },
 };
 
 // Servicios de Descuentos
@@ -120,6 +131,8 @@ export const settlementService = {
     approve: (id) => api.post(`/settlements/${id}/approve/`),
     markAsPaid: (id, data) => api.post(`/settlements/${id}/mark_as_paid/`, data),
     generateForPeriod: (data) => api.post('/settlements/generate_for_period/', data),
+    closePeriod: (data) => api.post('/settlements/close_period/', data),
+    getBatch: (id) => api.get(`/settlement-batches/${id}/`),
     getReport: (params) => api.get('/settlements/report/', { params }),
     exportPDF: (id) => api.get(`/settlements/${id}/export_pdf/`, { 
         responseType: 'arraybuffer'
@@ -129,3 +142,17 @@ export const settlementService = {
     }),
 };
 
+// Servicios del Dashboard
+export const dashboardService = {
+    getSummary: () => api.get('/dashboard/summary/'),
+};
+
+// Servicios de Exportaciones en segundo plano
+export const exportService = {
+    create: (data) => api.post('/exports/', data),
+    getById: (id) => api.get(`/exports/${id}/`),
+    getAll: (params) => api.get('/exports/', { params }),
+    download: (id) => api.get(`/exports/${id}/download/`, {
+        responseType: 'arraybuffer'
+    }),
+};